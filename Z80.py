@@ -1,9 +1,13 @@
-import struct
-import video
+import os
+import glob
+import heapq
+import itertools
+import inspect
+import hashlib
 import memory
 import ports
+import opgen
 
-show_debug_info = False
 tstatesPerInterrupt = 0
 
 def Z80(clockFrequencyInMHz):
@@ -36,17 +40,117 @@ for i in range(256):
     p = True
     int_type = i
     while (int_type):
-        p = not p_
+        p = not p
         int_type = int_type & (int_type - 1)
     parity[i] = p
 
 
-# **Main registers
-_AF_b = bytearray(2)
-_A_F = memoryview(_AF_b)
-_F = _A_F[0:1]
-_A = _A_F[1:2]
-_AF = _A_F.cast('H')
+# ** Flag tables
+# S Z 5 3 and parity of a byte, and complete F after INC/DEC (but C) by result
+sz53p = bytes((v & (F_S | F_5 | F_3)) | (0 if v else F_Z) | (F_PV if parity[v] else 0) for v in range(256))
+incflags = bytes((sz53p[v] & ~F_PV) | (0 if v % 16 else F_H) | (F_PV if v == 0x80 else 0) for v in range(256))
+decflags = bytes((sz53p[v] & ~F_PV) | F_N | (F_H if v % 16 == 0x0f else 0) | (F_PV if v == 0x7f else 0) for v in range(256))
+
+
+"""
+The algorithm for calculating P/V flag for ADD instruction is: 
+if (((reg_a ^ operand) & 0x80) == 0 /* Same sign */
+&& ((reg_a ^ result) & 0x80) != 0) /* Not same sign */
+overflow = 1;
+else
+overflow = 0;
+
+While for SUB instruction is:
+
+if (((reg_a ^ operand) & 0x80) != 0 /* Not same sign */
+&& ((operand ^ result) & 0x80) == 0) /* Same sign */
+overflow = 1;
+else
+overflow = 0; 
+"""
+# Complete F after ADD/ADC and SUB/SBC indexed by (carry << 16) | (a << 8) | b,
+# and after CP by (a << 8) | b. CP takes the undocumented 3 and 5 flags from
+# the operand, not the result.
+def build_flag_tables():
+    sz53 = bytes(v & ~F_PV for v in sz53p)
+    add = bytes(
+        sz53[(a + b + c) % 256] |
+        (F_H if (a % 16) + (b % 16) + c > 0x0f else 0) |
+        (F_PV if ((a ^ b) < 0x80) and ((a ^ (a + b + c)) & 0x80) else 0) |
+        (F_C if a + b + c > 0xff else 0)
+        for c in (0, 1) for a in range(256) for b in range(256))
+    sub = bytes(
+        sz53[(a - b - c) % 256] | F_N |
+        (F_H if (a % 16) - (b % 16) - c < 0 else 0) |
+        (F_PV if ((a ^ b) > 0x7f) and not ((b ^ (a - b - c)) & 0x80) else 0) |
+        (F_C if a - b - c < 0 else 0)
+        for c in (0, 1) for a in range(256) for b in range(256))
+    cp = bytes((sub[i] & ~(F_5 | F_3)) | (i & (F_5 | F_3)) for i in range(65536))
+    return add, sub, cp
+
+
+# The big tables take a noticeable part of startup to build, so they are
+# cached next to the compiled modules, under a digest of the code building
+# them and what it reads: a change to either builds and caches them again
+FLAG_TABLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+
+def flag_tables_cache():
+    digest = hashlib.sha1(inspect.getsource(build_flag_tables).encode())
+    digest.update(sz53p)
+    digest.update(bytes((F_C, F_N, F_PV, F_3, F_H, F_5, F_Z, F_S)))
+    return os.path.join(FLAG_TABLES_DIR, f'z80flags.{digest.hexdigest()[:12]}.bin')
+
+
+def load_flag_tables():
+    try:
+        path = flag_tables_cache()
+    except OSError:
+        return build_flag_tables()  # no source to tell the cache by
+    try:
+        with open(path, 'rb') as cache:
+            data = cache.read()
+        if len(data) == 5 * 65536:
+            return data[:131072], data[131072:262144], data[262144:]
+    except OSError:
+        pass
+
+    tables = build_flag_tables()
+    try:
+        os.makedirs(FLAG_TABLES_DIR, exist_ok=True)
+        with open(path, 'wb') as cache:
+            cache.write(b''.join(tables))
+        for stale in glob.glob(os.path.join(FLAG_TABLES_DIR, 'z80flags.*')):
+            if stale != path:
+                os.remove(stale)
+    except OSError:
+        pass
+    return tables
+
+
+addflags, subflags, cpflags = load_flag_tables()
+
+
+# ** Register file
+# Every register lives at a fixed offset of one buffer: bytes through regs,
+# pairs through regw indexed by offset // 2, low byte first as on the Z80.
+# The alternate set sits ALT bytes above the main one, EXX and EX AF,AF'
+# swap the two banks in place, and saving or restoring every register is
+# a copy of regs
+F, A, C, B, E, D, L, H = range(8)
+AF, BC, DE, HL = range(4)
+ALT = 8
+IXL, IXH, IYL, IYH = range(16, 20)
+IX, IY, SP, PC = range(8, 12)
+R, I = 24, 25
+regs = bytearray(26)
+regw = memoryview(regs).cast('H')
+# BC DE HL of each bank, for EXX
+_BCDEHL = slice(C, H + 1)
+_BCDEHL_ = slice(C + ALT, H + ALT + 1)
+
+
+# ** Flags
 _fS = False
 _fZ = False
 _f5 = False
@@ -56,117 +160,85 @@ _fPV = False
 _fN = False
 _fC = False
 
+# Lazy flags: Z and C are tested by most conditional instructions, so ALU
+# helpers always keep _fZ and _fC up to date. S 5 H 3 PV N are rarely read,
+# so the helpers only record a resolver with what it needs - the F byte
+# from the flag tables, or operands and result - and resolve_flags() works
+# them out when something actually needs them.
+_lf = None
+_lf_f = 0
+_lf_a = 0
+_lf_b = 0
+_lf_ans = 0
+
+
+def resolve_flags():
+    global _lf
+    if _lf is not None:
+        _lf()
+        _lf = None
+
+
+# Materialise flags into the F register (PUSH AF, EX AF,AF', snapshots)
+def getflags():
+    resolve_flags()
+    regs[F] = (F_S if _fS else 0) + \
+        (F_Z if _fZ else 0) + \
+        (F_5 if _f5 else 0) + \
+        (F_H if _fH else 0) + \
+        (F_3 if _f3 else 0) + \
+        (F_PV if _fPV else 0) + \
+        (F_N if _fN else 0) + \
+        (F_C if _fC else 0)
+    return regs[F]
+
 
 def setflags():
-    global _f3, _f5, _fC, _fH, _fN, _fPV, _fS, _fZ
-    _fS = (_F[0] & F_S) != 0
-    _fZ = (_F[0] & F_Z) != 0
-    _f5 = (_F[0] & F_5) != 0
-    _fH = (_F[0] & F_H) != 0
-    _f3 = (_F[0] & F_3) != 0
-    _fPV = (_F[0] & F_PV) != 0
-    _fN = (_F[0] & F_N) != 0
-    _fC = (_F[0] & F_C) != 0
-
-
-_HL_b = bytearray(2)
-_H_L = memoryview(_HL_b)
-_L = _H_L[0:1]
-_H = _H_L[1:2]
-_HL = _H_L.cast('H')
-
-_BC_b = bytearray(2)
-_B_C = memoryview(_BC_b)
-_C = _B_C[0:1]
-_B = _B_C[1:2]
-_BC = _B_C.cast('H')
-
-_DE_b = bytearray(2)
-_D_E = memoryview(_DE_b)
-_E = _D_E[0:1]
-_D = _D_E[1:2]
-_DE = _D_E.cast('H')
-
-
-# ** Alternate registers
-_AF_b_ = bytearray(2)
-_A_F_ = memoryview(_AF_b_)
-_F_ = _A_F_[0:1]
-_A_ = _A_F_[1:2]
-_AF_ = _A_F_.cast('H')
-
-_HL_b_ = bytearray(2)
-_H_L_ = memoryview(_HL_b_)
-_L_ = _H_L_[0:1]
-_H_ = _H_L_[1:2]
-_HL_ = _H_L_.cast('H')
-
-_BC_b_ = bytearray(2)
-_B_C_ = memoryview(_BC_b_)
-_C_ = _B_C_[0:1]
-_B_ = _B_C_[1:2]
-_BC_ = _B_C_.cast('H')
-
-_DE_b_ = bytearray(2)
-_D_E_ = memoryview(_DE_b_)
-_E_ = _D_E_[0:1]
-_D_ = _D_E_[1:2]
-_DE_ = _D_E_.cast('H')
-
-
-# ** Index registers - ID used as temporary for ix/iy
-_IX_b = bytearray(2)
-_IXH_IXL = memoryview(_IX_b)
-_IXL = _IXH_IXL[0:1]
-_IXH = _IXH_IXL[1:2]
-_IX = _IXH_IXL.cast('H')
-
-_IY_b = bytearray(2)
-_IYH_IYL = memoryview(_IY_b)
-_IYL = _IYH_IYL[0:1]
-_IYH = _IYH_IYL[1:2]
-_IY = _IYH_IYL.cast('H')
-
-_IDH = None
-_IDL = None
-_ID = None
-
-
-# ** Stack Pointer and Program Counter
-_SP_b = bytearray(2)
-_SP = memoryview(_SP_b).cast('H')
-
-_PC_b = bytearray(2)
-_PC = memoryview(_PC_b).cast('H')
-
-
-# ** Interrupt and Refresh registers
-_I_b = bytearray(2)
-_IH_IL = memoryview(_I_b)
-_I = _IH_IL[1:2]
-#_Ifull = _IH_IL.cast('H')
-
-
-# Memory refresh register
-_R_b = _IH_IL[0:1]
+    global _f3, _f5, _fC, _fH, _fN, _fPV, _fS, _fZ, _lf
+    _lf = None
+    _fS = (regs[F] & F_S) != 0
+    _fZ = (regs[F] & F_Z) != 0
+    _f5 = (regs[F] & F_5) != 0
+    _fH = (regs[F] & F_H) != 0
+    _f3 = (regs[F] & F_3) != 0
+    _fPV = (regs[F] & F_PV) != 0
+    _fN = (regs[F] & F_N) != 0
+    _fC = (regs[F] & F_C) != 0
+
+
+# ** Refresh register - R goes up on every M1 cycle. Rather than updating
+# it on each fetch, m1_cycles counts M1 cycles and R is worked out from the
+# count when read: _R_start is the count R was last 0 at, modulo 128, set
+# by LD R,A and snapshot loads. Bit 7 is only changed by LD R,A
+m1_cycles = 0
+_R_start = 0
 _R7_b = 0
 
 
-def _Rget():
-    global _R7_b
-    return _R_b[0]
+# Materialise R into the register file (LD A,R, snapshots)
+def getr():
+    regs[R] = ((m1_cycles - _R_start) % 128) + _R7_b
+    return regs[R]
+
+
+# Restart the count from R as set in the register file
+def setr():
+    global _R_start, _R7_b
+    _R_start = m1_cycles - regs[R]
+    _R7_b = regs[R] & 0x80
 
 
-def _Rset(r):
-    global _R7_b
-    _R_b[0] = r
-    _R7_b = 0x80 if r > 0x7F else 0
-_R = property(_Rget, _Rset)
+# All registers as bytes and back, flags and R included
+def save_registers():
+    getflags()
+    getr()
+    return bytes(regs)
 
 
-def inc_r(r = 1):
-    global _R7_b
-    _R_b[0] = ((_R_b[0] + r) % 128) + _R7_b
+def load_registers(state):
+    regs[:] = state
+    setr()
+    setflags()
 
 
 # ** Interrupt flip-flops
@@ -175,61 +247,61 @@ _IFF2 = True
 _IM = IM2
 
 
-# Stack access
+# Stack access - SP and PC are read once into a local and written back once
 def pushw(word):
-    global _SP
-    _SP[0] = (_SP[0] - 2) % 65536
-    memory.pokew(_SP[0], word)
+    sp = (regw[SP] - 2) % 65536
+    regw[SP] = sp
+    memory.pokew(sp, word)
 
 
 def popw():
-    t = memory.peekw(_SP[0])
-    _SP[0] = (_SP[0] + 2) % 65536
-    return t
+    sp = regw[SP]
+    regw[SP] = (sp + 2) % 65536
+    return memory.peekw(sp)
 
 
 # Call stack
 def pushpc():
-    pushw(_PC[0])
+    pushw(regw[PC])
 
 
 def poppc():
-    _PC[0] = popw()
+    regw[PC] = popw()
 
 
+# Operand fetch, reading the buffer directly
 def nxtpcb():
-    t = memory.peekb(_PC[0])
-    _PC[0] = (_PC[0] + 1) % 65536
-    return t
+    pc = regw[PC]
+    regw[PC] = (pc + 1) % 65536
+    return memory.mem[pc]
 
 
 def nxtpcsb():
-    global show_debug_info
-    t = memory.peeksb(_PC[0])
-    _PC[0] = (_PC[0] + 1) % 65536
-    if show_debug_info:
-        print(f'signedbyte: {t}, PC: 0x{_PC[0]:4x}')
+    pc = regw[PC]
+    t = memory.smem[pc]
+    regw[PC] = (pc + 1) % 65536
     return t
 
 
 def incpcsb():
     t = nxtpcsb()
-    _PC[0] = (_PC[0] + t) % 65536
+    regw[PC] = (regw[PC] + t) % 65536
 
 
 def nxtpcw():
-    t = memory.peekw(_PC[0])
-    _PC[0] = (_PC[0] + 2) % 65536
-    return t
+    pc = regw[PC]
+    regw[PC] = (pc + 2) % 65536
+    return memory.peekw(pc)
 
 
 # Reset all registers to power on state
 def reset():
-    global _R, _IFF1, _IFF2
-    global _fS, _fZ, _f5, _fH, _f3, _fPV, _fN, _fC
-    _PC[0] = 0
-    _SP[0] = 0
+    global _IFF1, _IFF2, _halted
+    global _fS, _fZ, _f5, _fH, _f3, _fPV, _fN, _fC, _lf
+    regs[:] = bytes(len(regs))
+    setr()
 
+    _lf = None
     _fS = False
     _fZ = False
     _f5 = False
@@ -238,31 +310,20 @@ def reset():
     _fPV = False
     _fN = False
     _fC = False
-    _AF[0] = 0
-    _BC[0] = 0
-    _DE[0] = 0
-    _HL[0] = 0
-
-    _AF_[0] = 0
-    _BC_[0] = 0
-    _DE_[0] = 0
-    _HL_[0] = 0
-
-    _IX[0] = 0
-    _IY[0] = 0
-    _R = 0
-    #_Ifull[0] = 0
     _IFF1 = 0
     _IFF2 = 0
     _IM = IM0
+    _halted = False  # not leave_halt(), that would move PC on from 0
+    reset_events()
 
 
 def show_registers():
-    global show_debug_info
-    if show_debug_info:
-        print(f'PC: 0x{_PC[0]:04x}\tOPCODE: {memory.peekb(_PC[0]):03d}\tA: 0x{_A[0]:02x}\tHL: 0x{_HL[0]:04x}\tBC: 0x{_BC[0]:04x}\tDE: 0x{_DE[0]:04x}')
-        print(f'FLAGS 0x{_F[0]:02x}\tC: {_fC}\tN: {_fN}\tPV: {_fPV}\t3: {_f3}\tH: {_fH}\t5: {_f5}\tZ: {_fZ}\tS: {_fS}')
-        print(f'IFF1 {_IFF1}, IFF2 {_IFF2}')
+    resolve_flags()
+    print(f'PC: 0x{regw[PC]:04x}\tOPCODE: {memory.peekb(regw[PC]):03d}\tA: 0x{regs[A]:02x}\tHL: 0x{regw[HL]:04x}\tBC: 0x{regw[BC]:04x}\tDE: 0x{regw[DE]:04x}')
+    # the lazily worked out flags may hold their bit mask rather than True
+    print(f'FLAGS 0x{regs[F]:02x}\tC: {bool(_fC)}\tN: {bool(_fN)}\tPV: {bool(_fPV)}\t3: {bool(_f3)}'
+          f'\tH: {bool(_fH)}\t5: {bool(_f5)}\tZ: {bool(_fZ)}\tS: {bool(_fS)}')
+    print(f'IFF1 {_IFF1}, IFF2 {_IFF2}')
 
 
 # Interrupt handlers
@@ -271,28 +332,29 @@ def show_registers():
 
 
 video_update_time = 0
+# Display and input, called with the frame number on every interrupt:
+# video.frame for the pygame window, headless.frame for batch runs
+frontend = None
 
 
 def interrupt():
     global video_update_time
-    Hz = 25
 
     video_update_time += 1
-    ports.keyboard.do_keys()
-    if not (video_update_time % int(50 / Hz)):
-        video.update()
+    if frontend is not None:
+        frontend(video_update_time)
     return interruptCPU()
 
 
 def interruptCPU():
-    global _IM, _IFF1, show_debug_info
+    global _IM, _IFF1
     # If not a non-maskable interrupt
     def im0im1():
         global _IFF1, _IFF2
         pushpc()
         _IFF1 = False
         _IFF2 = False
-        _PC[0] = 56
+        regw[PC] = 56
         return 13
 
     def im2():
@@ -300,105 +362,204 @@ def interruptCPU():
         pushpc()
         _IFF1 = False
         _IFF2 = False
-        #_PC[0] = memory.peekw(_Ifull[0])
-        _PC[0] = memory.peekw(_I[0]*256+255)
+        #regw[PC] = memory.peekw(_Ifull[0])
+        regw[PC] = memory.peekw(regs[I]*256+255)
         return 19
 
     if not _IFF1:
         #if show_debug_info:
         #    print('NO interrupt')
         return 0
-    if show_debug_info:
-        print(f'Interrupt: {_IM}, PC: 0x{_PC[0]:4x}, IFF1: {_IFF1}')
+    if _halted:
+        leave_halt()
     return {IM0: im0im1, IM1: im0im1, IM2: im2}.get(_IM)()
 
 
-# Z80 fetch/execute loop
+# ** Event scheduler
+# Timed events (the frame interrupt, and any peripheral) sit in a heap of
+# (deadline, sequence, callback) with deadlines in absolute T-states.
+# local_tstates counts from minus the time left to the earliest deadline
+# up to 0, so the execute loop only has to compare it with 0.
+events = []
+_event_order = itertools.count()
+tstates_base = 0  # deadline of events[0]
 local_tstates = -tstatesPerInterrupt  # -70000
-def check_tstates():
-    global local_tstates
-    if local_tstates >= 0:
-        #print(f'LTS: {local_tstates} _PC: {_PC[0]:4x}')
-        local_tstates -= tstatesPerInterrupt - interrupt()
 
 
-def execute():
-    global _R, main_cmds, local_tstates
+def tstates_now():
+    return tstates_base + local_tstates
+
+
+# Call callback(deadline) at given absolute T-state, the callback returns
+# the T-states it used up
+def schedule_at(deadline, callback):
+    global local_tstates, tstates_base
+    now = tstates_base + local_tstates
+    heapq.heappush(events, (deadline, next(_event_order), callback))
+    tstates_base = events[0][0]
+    local_tstates = now - tstates_base
+
+
+def schedule(tstates, callback):
+    schedule_at(tstates_now() + tstates, callback)
+
+
+# Run every event that is due, the frame interrupt always keeps one queued
+def run_events():
+    global local_tstates, tstates_base
+    while local_tstates >= 0:
+        now = tstates_base + local_tstates
+        deadline, _, callback = heapq.heappop(events)
+        now += callback(deadline)
+        tstates_base = events[0][0]
+        local_tstates = now - tstates_base
 
-    while True:
-        check_tstates()
-        inc_r()
-        show_registers()
-        opcode = nxtpcb()
-        if opcode == 118:  # HALT
-            haltsToInterrupt = int(((-local_tstates - 1) / 4) + 1)
-            local_tstates += (haltsToInterrupt * 4)
-            inc_r(haltsToInterrupt - 1)
-            continue
-        else:
-            local_tstates += main_cmds.get(opcode)()
 
+def frame_event(deadline):
+    schedule_at(deadline + tstatesPerInterrupt, frame_event)
+    return interrupt()
 
-def execute_id():
-    global _ixiydict
-    inc_r()
-    opcode = nxtpcb()
-    return _ixiydict.get(opcode, nop)()
 
+# Start the clock at 0 with the first frame interrupt one frame away
+def reset_events():
+    global local_tstates, tstates_base
+    events.clear()
+    tstates_base = tstatesPerInterrupt
+    local_tstates = -tstatesPerInterrupt
+    heapq.heappush(events, (tstates_base, next(_event_order), frame_event))
 
-def execute_id_cb(opcode, z):
-    global _idcbdict
-    return _idcbdict.get(opcode)(z)
+
+# ** Run loops
+# execute() runs the loop run_loop is set to: run_fast, run_traced showing
+# the registers before every instruction, or run_breakpoints calling
+# on_breakpoint() before the instructions at the addresses in breakpoints.
+# A loop returns once run_loop changes, so a frontend hook, an event or
+# on_breakpoint() can switch loops while running. run_fast only looks at
+# run_loop between events and carries no debugging code at all.
+breakpoints = set()
+on_breakpoint = show_registers
+
+
+def execute():
+    while True:
+        run_loop()
+
+
+# Z80 fetch/execute loop. Block instructions move local_tstates and run
+# events themselves, so it is only read back after the handler returns.
+# The opcode fetch is inlined, with PC, the memory buffer and the opcode
+# table in locals: handlers see PC already past the opcode
+def run_fast():
+    global local_tstates, m1_cycles
+    mem = memory.mem
+    cmds = main_cmds
+
+    while run_loop is run_fast:
+        while local_tstates < 0:
+            m1_cycles += 1
+            pc = regw[PC]
+            regw[PC] = (pc + 1) % 65536
+            t = cmds[mem[pc]]()
+            local_tstates += t
+        run_events()
+
+
+def run_traced():
+    global local_tstates, m1_cycles
+    while run_loop is run_traced:
+        while local_tstates < 0 and run_loop is run_traced:
+            show_registers()
+            m1_cycles += 1
+            pc = regw[PC]
+            regw[PC] = (pc + 1) % 65536
+            t = main_cmds[memory.mem[pc]]()
+            local_tstates += t
+        run_events()
+
+
+def run_breakpoints():
+    global local_tstates, m1_cycles
+    while run_loop is run_breakpoints:
+        while local_tstates < 0 and run_loop is run_breakpoints:
+            pc = regw[PC]
+            if pc in breakpoints:
+                on_breakpoint()
+                if run_loop is not run_breakpoints:
+                    break  # the next loop runs this instruction
+            m1_cycles += 1
+            regw[PC] = (pc + 1) % 65536
+            t = main_cmds[memory.mem[pc]]()
+            local_tstates += t
+        run_events()
+
+
+run_loop = run_fast
+
+
+# One instruction of the loop above, without the interrupt check
+def step():
+    global local_tstates, m1_cycles
+    m1_cycles += 1
+    pc = regw[PC]
+    regw[PC] = (pc + 1) % 65536
+    t = main_cmds[memory.mem[pc]]()
+    local_tstates += t
+
+
+# Dispatch tables are dense 256-slot lists indexed directly by the opcode,
+# every slot not named in the opcode map is filled with the default handler
+def optable(cmds, default=None):
+    table = [default] * 256
+    for opcode, cmd in cmds.items():
+        table[opcode] = cmd
+    return table
 
 
 def nop():
     return 4
 
 
+# HALT - burn NOPs up to the next event, staying on the HALT until an
+# interrupt is accepted
+_halted = False
+
+
+def halt():
+    global _halted, m1_cycles
+    haltsToInterrupt = int(((-local_tstates - 1) / 4) + 1)
+    m1_cycles += haltsToInterrupt - 1
+    _halted = True
+    regw[PC] = (regw[PC] - 1) % 65536
+    return haltsToInterrupt * 4
+
+
+def leave_halt():
+    global _halted
+    _halted = False
+    regw[PC] = (regw[PC] + 1) % 65536
+
+
 # EXX
 def exx():
-    global _HL, _HL_, _H, _H_, _L, _L_
-    global _DE, _DE_, _D, _D_, _E, _E_
-    global _BC, _BC_, _B, _B_, _C, _C_
-    _HL, _HL_ = _HL_, _HL
-    _H, _H_ = _H_, _H
-    _L, _L_ = _L_, _L
-
-    _DE, _DE_ = _DE_, _DE
-    _D, _D_ = _D_, _D
-    _E, _E_ = _E_, _E
-
-    _BC, _BC_ = _BC_, _BC
-    _B, _B_ = _B_, _B
-    _C, _C_ = _C_, _C
+    regs[_BCDEHL], regs[_BCDEHL_] = regs[_BCDEHL_], regs[_BCDEHL]
     return 4
 
 
 # EX AF,AF'
 def ex_af_af():
-    global _AF, _AF_, _A, _A_, _F, _F_
-    _F[0] = (F_S if _fS else 0) + \
-        (F_Z if _fZ else 0) + \
-        (F_5 if _f5 else 0) + \
-        (F_H if _fH else 0) + \
-        (F_3 if _f3 else 0) + \
-        (F_PV if _fPV else 0) + \
-        (F_N if _fN else 0) + \
-        (F_C if _fC else 0)
-    _AF, _AF_ = _AF_, _AF
-    _A, _A_ = _A_, _A
-    _F, _F_ = _F_, _F
+    getflags()
+    regw[AF], regw[AF+ALT//2] = regw[AF+ALT//2], regw[AF]
     setflags()
     return 4
 
 
 def djnz():
-    _B[0] = qdec8(_B[0])
-    if _B[0] != 0:
+    regs[B] = qdec8(regs[B])
+    if regs[B] != 0:
         incpcsb()
         return 13
     else:
-        _PC[0] = inc16(_PC[0])
+        regw[PC] = inc16(regw[PC])
         return 8
 
 
@@ -413,7 +574,7 @@ def jrnz():
         incpcsb()
         return 12
     else:
-        _PC[0] = inc16(_PC[0])
+        regw[PC] = inc16(regw[PC])
         return 7
 
 
@@ -423,7 +584,7 @@ def jrz():
         incpcsb()
         return 12
     else:
-        _PC[0] = inc16(_PC[0])
+        regw[PC] = inc16(regw[PC])
         return 7
 
 
@@ -433,7 +594,7 @@ def jrnc():
         incpcsb()
         return 12
     else:
-        _PC[0] = inc16(_PC[0])
+        regw[PC] = inc16(regw[PC])
         return 7
 
 
@@ -443,260 +604,138 @@ def jrc():
         incpcsb()
         return 12
     else:
-        _PC[0] = inc16(_PC[0])
+        regw[PC] = inc16(regw[PC])
         return 7
 
 
 # LD rr,nn / ADD HL,rr
 def ldbcnn():
-    _BC[0] = nxtpcw()
+    regw[BC] = nxtpcw()
     return 10
 
 
 def addhlbc():
-    _HL[0] = add16(_HL[0], _BC[0])
+    regw[HL] = add16(regw[HL], regw[BC])
     return 11
 
 
 def lddenn():
-    _DE[0] = nxtpcw()
+    regw[DE] = nxtpcw()
     return 10
 
 
 def addhlde():
-    _HL[0] = add16(_HL[0], _DE[0])
+    regw[HL] = add16(regw[HL], regw[DE])
     return 11
 
 
 def ldhlnn():
-    _HL[0] = nxtpcw()
+    regw[HL] = nxtpcw()
     return 10
 
 
 def addhlhl():
-    hl = _HL[0]
-    _HL[0] = add16(hl, hl)
+    hl = regw[HL]
+    regw[HL] = add16(hl, hl)
     return 11
 
 
 def ldspnn():
-    _SP[0] = nxtpcw()
+    regw[SP] = nxtpcw()
     return 10
 
 
 def addhlsp():
-    _HL[0] = add16(_HL[0], _SP[0])
+    regw[HL] = add16(regw[HL], regw[SP])
     return 11
 
 
 # LD (**),A/A,(**)
 def ldtobca():
-    memory.pokeb(_BC[0], _A[0])
+    memory.pokeb(regw[BC], regs[A])
     return 7
 
 
 def ldafrombc():
-    _A[0] = memory.peekb(_BC[0])
+    regs[A] = memory.peekb(regw[BC])
     return 7
 
 
 def ldtodea():
-    memory.pokeb(_DE[0], _A[0])
+    memory.pokeb(regw[DE], regs[A])
     return 7
 
 
 def ldafromde():
-    _A[0] = memory.peekb(_DE[0])
+    regs[A] = memory.peekb(regw[DE])
     return 7
 
 def ldtonnhl():
-    memory.pokew(nxtpcw(), _HL[0])
+    memory.pokew(nxtpcw(), regw[HL])
     return 16
 
 
 def ldhlfromnn():
-    _HL[0] = memory.peekw(nxtpcw())
+    regw[HL] = memory.peekw(nxtpcw())
     return 16
 
 
 def ldtonna():
-    memory.pokeb(nxtpcw(), _A[0])
+    memory.pokeb(nxtpcw(), regs[A])
     return 13
 
 
 def ldafromnn():
-    _A[0] = memory.peekb(nxtpcw())
+    regs[A] = memory.peekb(nxtpcw())
     return 13
 
 
 # INC/DEC *
 def incbc():
-    _BC[0] = inc16(_BC[0])
+    regw[BC] = inc16(regw[BC])
     return 6
 
 
 def decbc():
-    _BC[0] = dec16(_BC[0])
+    regw[BC] = dec16(regw[BC])
     return 6
 
 
 def incde():
-    _DE[0] = inc16(_DE[0])
+    regw[DE] = inc16(regw[DE])
     return 6
 
 
 def decde():
-    _DE[0] = dec16(_DE[0])
+    regw[DE] = dec16(regw[DE])
     return 6
 
 
 def inchl():
-    _HL[0] = inc16(_HL[0])
+    regw[HL] = inc16(regw[HL])
     return 6
 
 
 def dechl():
-    _HL[0] = dec16(_HL[0])
+    regw[HL] = dec16(regw[HL])
     return 6
 
 
 def incsp():
-    _SP[0] = inc16(_SP[0])
+    regw[SP] = inc16(regw[SP])
     return 6
 
 
 def decsp():
-    _SP[0] = dec16(_SP[0])
+    regw[SP] = dec16(regw[SP])
     return 6
 
 
-# INC *
-def incb():
-    _B[0] = inc8(_B[0])
-    return 4
-
-
-def incc():
-    _C[0] = inc8(_C[0])
-    return 4
-
-
-def incd():
-    _D[0] = inc8(_D[0])
-    return 4
-
-
-def ince():
-    _E[0] = inc8(_E[0])
-    return 4
-
-
-def inch():
-    _H[0] = inc8(_H[0])
-    return 4
-
-
-def incl():
-    _L[0] = inc8(_L[0])
-    return 4
-
-
-def incinhl():
-    memory.pokeb(_HL[0], inc8(memory.peekb(_HL[0])))
-    return 11
-
-
-def inca():
-    _A[0] = inc8(_A[0])
-    return 4
-
-
-# DEC *
-def decb():
-    _B[0] = dec8(_B[0])
-    return 4
-
-
-def decc():
-    _C[0] = dec8(_C[0])
-    return 4
-
-
-def decd():
-    _D[0] = dec8(_D[0])
-    return 4
-
-
-def dece():
-    _E[0] = dec8(_E[0])
-    return 4
-
-
-def dech():
-    _H[0] = dec8(_H[0])
-    return 4
-
-
-def decl():
-    _L[0] = dec8(_L[0])
-    return 4
-
-
-def decinhl():
-    memory.pokeb(_HL[0], dec8(memory.peekb(_HL[0])))
-    return 11
-
-
-def deca():
-    _A[0] = dec8(_A[0])
-    return 4
-
-
-# LD *,N
-def ldbn():
-    _B[0] = nxtpcb()
-    return 7
-
-
-def ldcn():
-    _C[0] = nxtpcb()
-    return 7
-
-
-def lddn():
-    _D[0] = nxtpcb()
-    return 7
-
-
-def lden():
-    _E[0] = nxtpcb()
-    return 7
-
-
-def ldhn():
-    _H[0] = nxtpcb()
-    return 7
-
-
-def ldln():
-    _L[0] = nxtpcb()
-    return 7
-
-
-def ldtohln():
-    memory.pokeb(_HL[0], nxtpcb())
-    return 10
-
-
-def ldan():
-    _A[0] = nxtpcb()
-    return 7
-
-
 # R**A
 def rlca():
     global _f3, _f5, _fN, _fH, _fC
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     c = ans > 0x7f
     ans = ((ans << 1) + (0x01 if c else 0)) % 256
     _f3 = (ans & F_3) != 0
@@ -704,14 +743,15 @@ def rlca():
     _fN = False
     _fH = False
     _fC = c
-    _A[0] = ans
+    regs[A] = ans
     return 4
 
 
 # Rotate Left through Carry - alters H N C 3 5 flags (CHECKED)
 def rla():
     global _f3, _f5, _fN, _fH, _fC
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     c = ans > 0x7F
     ans = ((ans << 1) + (1 if _fC else 0)) % 256
     _f3 = (ans & F_3) != 0
@@ -719,14 +759,15 @@ def rla():
     _fN = False
     _fH = False
     _fC = c
-    _A[0] = ans
+    regs[A] = ans
     return 4
 
 
 # Rotate Right - alters H N C 3 5 flags (CHECKED)
 def rrca():
     global _f3, _f5, _fN, _fH, _fC
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     c = (ans % 2) != 0
     ans = ((ans >> 1) + (0x80 if c else 0)) % 256
     _f3 = (ans & F_3) != 0
@@ -734,14 +775,15 @@ def rrca():
     _fN = False
     _fH = False
     _fC = c
-    _A[0] = ans
+    regs[A] = ans
     return 4
 
 
 # Rotate Right through Carry - alters H N C 3 5 flags (CHECKED)
 def rra():
     global _f3, _f5, _fN, _fH, _fC
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     c = (ans % 2) != 0
     ans = ((ans >> 1) + (0x80 if _fC else 0)) % 256
     _f3 = (ans & F_3) != 0
@@ -749,14 +791,15 @@ def rra():
     _fN = False
     _fH = False
     _fC = c
-    _A[0] = ans
+    regs[A] = ans
     return 4
 
 
 # Decimal Adjust Accumulator - alters all flags (CHECKED)
 def daa():
     global _fC, _fN, _fPV, _fH
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     incr = 0
     carry = _fC
 
@@ -774,7 +817,8 @@ def daa():
     else:
         add_a(incr)
 
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     _fC = carry
     _fPV = parity[ans]
     return 4
@@ -783,19 +827,21 @@ def daa():
 # One's complement - alters N H 3 5 flags (CHECKED)
 def cpla():
     global _f3, _f5, _fH, _fN
-    ans = _A[0] ^ 0xff
+    resolve_flags()
+    ans = regs[A] ^ 0xff
     _f3 = (ans & F_3) != 0
     _f5 = (ans & F_5) != 0
     _fH = True
     _fN = True
-    _A[0] = ans
+    regs[A] = ans
     return 4
 
 
 # Set carry flag - alters N H 3 5 C flags (CHECKED)
 def scf():
     global _f3, _f5, _fH, _fN, _fC
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     _f3 = (ans & F_3) != 0
     _f5 = (ans & F_5) != 0
     _fN = False
@@ -807,7 +853,8 @@ def scf():
 # Complement carry flag - alters N 3 5 C flags (CHECKED)
 def ccf():
     global _f3, _f5, _fN, _fC, _fH
-    ans = _A[0]
+    resolve_flags()
+    ans = regs[A]
     _f3 = (ans & F_3) != 0
     _f5 = (ans & F_5) != 0
     _fH = _fC
@@ -816,4727 +863,1162 @@ def ccf():
     return 4
 
 
-# LD B,*
-def ldbb():
-    return 4
+# ** Generated handlers
+# LD r,r', LD r,n, LD r,(HL), LD (HL),r, ALU A,r, INC/DEC r, the whole CB
+# page, the DDCB/FDCB handlers and the DD/FD pages for IX and IY are
+# generated from the instruction spec in opgen.py, under the names the
+# opcode tables below use
+exec(opgen.load(), globals())
 
 
-def ldbc():
-    _B[0] = _C[0]
-    return 4
+# RET cc
+def retnz():
+    global _fZ
+    if not _fZ:
+        poppc()
+        return 11
+    else:
+        return 5
 
+def retz():
+    global _fZ
+    if _fZ:
+        poppc()
+        return 11
+    else:
+        return 5
 
-def ldbd():
-    _B[0] = _D[0]
-    return 4
 
+def retnc():
+    global _fC
+    if not _fC:
+        poppc()
+        return 11
+    else:
+        return 5
 
-def ldbe():
-    _B[0] = _E[0]
-    return 4
 
+def retc():
+    global _fC
+    if _fC:
+        poppc()
+        return 11
+    else:
+        return 5
 
-def ldbh():
-    _B[0] = _H[0]
-    return 4
 
+def retpo():
+    resolve_flags()
+    if not _fPV:
+        poppc()
+        return 11
+    else:
+        return 5
 
-def ldbl():
-    _B[0] = _L[0]
-    return 4
 
+def retpe():
+    resolve_flags()
+    if _fPV:
+        poppc()
+        return 11
+    else:
+        return 5
 
-def ldbfromhl():
-    _B[0] = memory.peekb(_HL[0])
-    return 7
 
+def retp():
+    resolve_flags()
+    if not _fS:
+        poppc()
+        return 11
+    else:
+        return 5
 
-def ldba():
-    _B[0] = _A[0]
-    return 4
 
+def retm():
+    resolve_flags()
+    if _fS:
+        poppc()
+        return 11
+    else:
+        return 5
 
-# LD C,*
-def ldcb():
-    _C[0] = _B[0]
-    return 4
 
+# POP
+def popbc():
+    regw[BC] = popw()
+    return 10
 
-def ldcc():
-    return 4
 
+def popde():
+    regw[DE] = popw()
+    return 10
 
-def ldcd():
-    _C[0] = _D[0]
-    return 4
+
+def pophl():
+    regw[HL] = popw()
+    return 10
 
 
-def ldce():
-    _C[0] = _E[0]
-    return 4
+def popaf():
+    regw[AF] = popw()
+    setflags()
+    return 10
 
 
-def ldch():
-    _C[0] = _H[0]
-    return 4
+# JP cc,nn
+def jpnznn():
+    global _fZ
+    if not _fZ:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def ldcl():
-    _C[0] = _L[0]
-    return 4
+def jpznn():
+    global _fZ
+    if _fZ:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def ldcfromhl():
-    _C[0] = memory.peekb(_HL[0])
-    return 7
+def jpncnn():
+    global _fC
+    if not _fC:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def ldca():
-    _C[0] = _A[0]
-    return 4
+def jpcnn():
+    global _fC
+    if _fC:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-# LD D,*
-def lddb():
-    _D[0] = _B[0]
-    return 4
+def jpponn():
+    resolve_flags()
+    if not _fPV:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def lddc():
-    _D[0] = _C[0]
-    return 4
+def jppenn():
+    resolve_flags()
+    if _fPV:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def lddd():
-    return 4
+def jppnn():
+    resolve_flags()
+    if not _fS:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def ldde():
-    _D[0] = _E[0]
-    return 4
+def jpmnn():
+    resolve_flags()
+    if _fS:
+        regw[PC] = nxtpcw()
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+    return 10
 
 
-def lddh():
-    _D[0] = _H[0]
+# Various
+def jphl():
+    regw[PC] = regw[HL]
     return 4
 
 
-def lddl():
-    _D[0] = _L[0]
-    return 4
+def ldsphl():
+    regw[SP] = regw[HL]
+    return 6
 
 
-def lddfromhl():
-    _D[0] = memory.peekb(_HL[0])
-    return 7
-
-
-def ldda():
-    _D[0] = _A[0]
-    return 4
-
-
-# LD E,*
-def ldeb():
-    _E[0] = _B[0]
-    return 4
-
-
-def ldec():
-    _E[0] = _C[0]
-    return 4
-
+def ret():
+    poppc()
+    return 10
 
-def lded():
-    _E[0] = _D[0]
-    return 4
 
+def jpnn():
+    regw[PC] = nxtpcw()
+    return 10
 
-def ldee():
-    return 4
 
+# CB prefix
+_cbcmds = optable({
+    0: rlcb, 1: rlcc, 2: rlcd, 3: rlce, 4: rlch, 5: rlcl, 6: rlcfromhl, 7: rlc_a,
+    8: rrcb, 9: rrcc, 10: rrcd, 11: rrce, 12: rrch, 13: rrcl, 14: rrcfromhl, 15: rrc_a,
+    16: rlb, 17: rl_c, 18: rld, 19: rle, 20: rlh, 21: rll, 22: rlfromhl, 23: rl_a,
+    24: rrb, 25: rr_c, 26: rrd, 27: rre, 28: rrh, 29: rrl, 30: rrfromhl, 31: rr_a,
+    32: slab, 33: slac, 34: slad, 35: slae, 36: slah, 37: slal, 38: slafromhl, 39: sla_a,
+    40: srab, 41: srac, 42: srad, 43: srae, 44: srah, 45: sral, 46: srafromhl, 47: sra_a,
+    48: slsb, 49: slsc, 50: slsd, 51: slse, 52: slsh, 53: slsl, 54: slsfromhl, 55: sls_a,
+    56: srlb, 57: srlc, 58: srld, 59: srle, 60: srlh, 61: srll, 62: srlfromhl, 63: srl_a,
 
-def ldeh():
-    _E[0] = _H[0]
-    return 4
+    64: bit0b, 65: bit0c, 66: bit0d, 67: bit0e, 68: bit0h, 69: bit0l, 70: bit0fromhl, 71: bit0a,
+    72: bit1b, 73: bit1c, 74: bit1d, 75: bit1e, 76: bit1h, 77: bit1l, 78: bit1fromhl, 79: bit1a,
+    80: bit2b, 81: bit2c, 82: bit2d, 83: bit2e, 84: bit2h, 85: bit2l, 86: bit2fromhl, 87: bit2a,
+    88: bit3b, 89: bit3c, 90: bit3d, 91: bit3e, 92: bit3h, 93: bit3l, 94: bit3fromhl, 95: bit3a,
+    96: bit4b, 97: bit4c, 98: bit4d, 99: bit4e, 100: bit4h, 101: bit4l, 102: bit4fromhl, 103: bit4a,
+    104: bit5b, 105: bit5c, 106: bit5d, 107: bit5e, 108: bit5h, 109: bit5l, 110: bit5fromhl, 111: bit5a,
+    112: bit6b, 113: bit6c, 114: bit6d, 115: bit6e, 116: bit6h, 117: bit6l, 118: bit6fromhl, 119: bit6a,
+    120: bit7b, 121: bit7c, 122: bit7d, 123: bit7e, 124: bit7h, 125: bit7l, 126: bit7fromhl, 127: bit7a,
 
+    128: res0b, 129: res0c, 130: res0d, 131: res0e, 132: res0h, 133: res0l, 134: res0fromhl, 135: res0a,
+    136: res1b, 137: res1c, 138: res1d, 139: res1e, 140: res1h, 141: res1l, 142: res1fromhl, 143: res1a,
+    144: res2b, 145: res2c, 146: res2d, 147: res2e, 148: res2h, 149: res2l, 150: res2fromhl, 151: res2a,
+    152: res3b, 153: res3c, 154: res3d, 155: res3e, 156: res3h, 157: res3l, 158: res3fromhl, 159: res3a,
+    160: res4b, 161: res4c, 162: res4d, 163: res4e, 164: res4h, 165: res4l, 166: res4fromhl, 167: res4a,
+    168: res5b, 169: res5c, 170: res5d, 171: res5e, 172: res5h, 173: res5l, 174: res5fromhl, 175: res5a,
+    176: res6b, 177: res6c, 178: res6d, 179: res6e, 180: res6h, 181: res6l, 182: res6fromhl, 183: res6a,
+    184: res7b, 185: res7c, 186: res7d, 187: res7e, 188: res7h, 189: res7l, 190: res7fromhl, 191: res7a,
 
-def ldel():
-    _E[0] = _L[0]
-    return 4
+    192: set0b, 193: set0c, 194: set0d, 195: set0e, 196: set0h, 197: set0l, 198: set0fromhl, 199: set0a,
+    200: set1b, 201: set1c, 202: set1d, 203: set1e, 204: set1h, 205: set1l, 206: set1fromhl, 207: set1a,
+    208: set2b, 209: set2c, 210: set2d, 211: set2e, 212: set2h, 213: set2l, 214: set2fromhl, 215: set2a,
+    216: set3b, 217: set3c, 218: set3d, 219: set3e, 220: set3h, 221: set3l, 222: set3fromhl, 223: set3a,
+    224: set4b, 225: set4c, 226: set4d, 227: set4e, 228: set4h, 229: set4l, 230: set4fromhl, 231: set4a,
+    232: set5b, 233: set5c, 234: set5d, 235: set5e, 236: set5h, 237: set5l, 238: set5fromhl, 239: set5a,
+    240: set6b, 241: set6c, 242: set6d, 243: set6e, 244: set6h, 245: set6l, 246: set6fromhl, 247: set6a,
+    248: set7b, 249: set7c, 250: set7d, 251: set7e, 252: set7h, 253: set7l, 254: set7fromhl, 255: set7a
+})
 
 
-def ldefromhl():
-    _E[0] = memory.peekb(_HL[0])
-    return 7
+def cb():
+    global m1_cycles
+    m1_cycles += 1
+    return _cbcmds[nxtpcb()]()
 
 
-def ldea():
-    _E[0] = _A[0]
-    return 4
+def outna():
+    ports.port_out(nxtpcb(), regs[A])
+    return 11
 
 
-# LD H,*
-def ldhb():
-    _H[0] = _B[0]
-    return 4
+def inan():
+    regs[A] = ports.port_in(regs[A] << 8 | nxtpcb())
+    return 11
 
 
-def ldhc():
-    _H[0] = _C[0]
-    return 4
+def exsphl():
+    t = regw[HL]
+    regw[HL] = memory.peekw(regw[SP])
+    memory.pokew(regw[SP], t)
+    return 19
 
 
-def ldhd():
-    _H[0] = _D[0]
+def exdehl():
+    regw[HL], regw[DE] = regw[DE], regw[HL]
     return 4
 
 
-def ldhe():
-    _H[0] = _E[0]
+def di():
+    global _IFF1, _IFF2
+    _IFF1 = False
+    _IFF2 = False
     return 4
 
 
-def ldhh():
+def ei():
+    global _IFF1, _IFF2
+    _IFF1 = True
+    _IFF2 = True
     return 4
 
 
-def ldhl():
-    _H[0] = _L[0]
-    return 4
+# CALL cc,nn
+def callnznn():
+    global _fZ
+    if not _fZ:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldhfromhl():
-    _H[0] = memory.peekb(_HL[0])
-    return 7
+def callznn():
+    global _fZ
+    if _fZ:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldha():
-    _H[0] = _A[0]
-    return 4
+def callncnn():
+    global _fC
+    if not _fC:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-# LD L,*
-def ldlb():
-    _L[0] = _B[0]
-    return 4
+def callcnn():
+    global _fC
+    if _fC:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldlc():
-    _L[0] = _C[0]
-    return 4
+def callponn():
+    resolve_flags()
+    if not _fPV:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldld():
-    _L[0] = _D[0]
-    return 4
+def callpenn():
+    resolve_flags()
+    if _fPV:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldle():
-    _L[0] = _E[0]
-    return 4
+def callpnn():
+    resolve_flags()
+    if not _fS:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldlh():
-    _L[0] = _H[0]
-    return 4
+def callmnn():
+    resolve_flags()
+    if _fS:
+        t = nxtpcw()
+        pushpc()
+        regw[PC] = t
+        return 17
+    else:
+        regw[PC] = (regw[PC] + 2) % 65536
+        return 10
 
 
-def ldll():
-    return 4
+# PUSH
+def pushbc():
+    pushw(regw[BC])
+    return 11
 
 
-def ldlfromhl():
-    _L[0] = memory.peekb(_HL[0])
-    return 7
+def pushde():
+    pushw(regw[DE])
+    return 11
 
 
-def ldla():
-    _L[0] = _A[0]
-    return 4
+def pushhl():
+    pushw(regw[HL])
+    return 11
 
 
-# LD (HL),*
-def ldtohlb():
-    memory.pokeb(_HL[0], _B[0])
-    return 7
+def pushaf():
+    getflags()
+    pushw(regw[AF])
+    return 11
 
 
-def ldtohlc():
-    memory.pokeb(_HL[0], _C[0])
+# op A,N
+def addan():
+    add_a(nxtpcb())
     return 7
 
 
-def ldtohld():
-    memory.pokeb(_HL[0], _D[0])
+def adcan():
+    adc_a(nxtpcb())
     return 7
 
 
-def ldtohle():
-    memory.pokeb(_HL[0], _E[0])
+def suban():
+    sub_a(nxtpcb())
     return 7
 
 
-def ldtohlh():
-    memory.pokeb(_HL[0], _H[0])
+def sbcan():
+    sbc_a(nxtpcb())
     return 7
 
 
-def ldtohll():
-    memory.pokeb(_HL[0], _L[0])
+def andan():
+    and_a(nxtpcb())
     return 7
 
 
-def ldtohla():
-    memory.pokeb(_HL[0], _A[0])
+def xoran():
+    xor_a(nxtpcb())
     return 7
 
 
-# LD A,*
-def ldab():
-    _A[0] = _B[0]
-    return 4
-
-
-def ldac():
-    _A[0] = _C[0]
-    return 4
-
-
-def ldad():
-    _A[0] = _D[0]
-    return 4
-
-
-def ldae():
-    _A[0] = _E[0]
-    return 4
-
-
-def ldah():
-    _A[0] = _H[0]
-    return 4
-
-
-def ldal():
-    _A[0] = _L[0]
-    return 4
-
-
-def ldafromhl():
-    _A[0] = memory.peekb(_HL[0])
+def oran():
+    or_a(nxtpcb())
     return 7
 
 
-def ldaa():
-    return 4
-
-
-# ADD A,*
-def addab():
-    add_a(_B[0])
-    return 4
-
-
-def addac():
-    add_a(_C[0])
-    return 4
-
-
-def addad():
-    add_a(_D[0])
-    return 4
-
-
-def addae():
-    add_a(_E[0])
-    return 4
-
-
-def addah():
-    add_a(_H[0])
-    return 4
-
-
-def addal():
-    add_a(_L[0])
-    return 4
-
-
-def addafromhl():
-    add_a(memory.peekb(_HL[0]))
+def cpan():
+    cp_a(nxtpcb())
     return 7
 
 
-def addaa():
-    add_a(_A[0])
-    return 4
-
-
-# ADC A,*
-def adcab():
-    adc_a(_B[0])
-    return 4
+# RST n
+def rst0():
+    pushpc()
+    regw[PC] = 0
+    return 11
 
 
-def adcac():
-    adc_a(_C[0])
-    return 4
+def rst8():
+    pushpc()
+    regw[PC] = 8
+    return 11
 
 
-def adcad():
-    adc_a(_D[0])
-    return 4
+def rst16():
+    pushpc()
+    regw[PC] = 16
+    return 11
 
 
-def adcae():
-    adc_a(_E[0])
-    return 4
+def rst24():
+    pushpc()
+    regw[PC] = 24
+    return 11
 
 
-def adcah():
-    adc_a(_H[0])
-    return 4
+def rst32():
+    pushpc()
+    regw[PC] = 32
+    return 11
 
 
-def adcal():
-    adc_a(_L[0])
-    return 4
+def rst40():
+    pushpc()
+    regw[PC] = 40
+    return 11
 
 
-def adcafromhl():
-    adc_a(memory.peekb(_HL[0]))
-    return 7
+def rst48():
+    pushpc()
+    regw[PC] = 48
+    return 11
 
 
-def adcaa():
-    adc_a(_A[0])
-    return 4
+def rst56():
+    pushpc()
+    regw[PC] = 56
+    return 11
 
 
-# SUB A,*
-def subab():
-    sub_a(_B[0])
-    return 4
+# Various
+def callnn():
+    t = nxtpcw()
+    pushpc()
+    regw[PC] = t
+    return 17
 
 
-def subac():
-    sub_a(_C[0])
-    return 4
+def ix():
+    global m1_cycles
+    m1_cycles += 2  # M1 cycles of the prefix and the opcode
+    return _ixcmds[nxtpcb()]()
 
 
-def subad():
-    sub_a(_D[0])
-    return 4
-
-
-def subae():
-    sub_a(_E[0])
-    return 4
-
-
-def subah():
-    sub_a(_H[0])
-    return 4
-
-
-def subal():
-    sub_a(_L[0])
-    return 4
-
-
-def subafromhl():
-    sub_a(memory.peekb(_HL[0]))
-    return 7
-
-
-def subaa():
-    sub_a(_A[0])
-    return 4
-
-
-# SBC A,*
-def sbcab():
-    sbc_a(_B[0])
-    return 4
-
-
-def sbcac():
-    sbc_a(_C[0])
-    return 4
-
-
-def sbcad():
-    sbc_a(_D[0])
-    return 4
-
-
-def sbcae():
-    sbc_a(_E[0])
-    return 4
-
-
-def sbcah():
-    sbc_a(_H[0])
-    return 4
-
-
-def sbcal():
-    sbc_a(_L[0])
-    return 4
-
-
-def sbcafromhl():
-    sbc_a(memory.peekb(_HL[0]))
-    return 7
-
-
-def sbcaa():
-    sbc_a(_A[0])
-    return 4
-
-
-# AND A,*
-def andab():
-    and_a(_B[0])
-    return 4
-
-
-def andac():
-    and_a(_C[0])
-    return 4
-
-
-def andad():
-    and_a(_D[0])
-    return 4
-
-
-def andae():
-    and_a(_E[0])
-    return 4
-
-
-def andah():
-    and_a(_H[0])
-    return 4
-
-
-def andal():
-    and_a(_L[0])
-    return 4
-
-
-def andafromhl():
-    and_a(memory.peekb(_HL[0]))
-    return 7
-
-
-def andaa():
-    and_a(_A[0])
-    return 4
-
-
-# XOR A,*
-def xorab():
-    xor_a(_B[0])
-    return 4
-
-
-def xorac():
-    xor_a(_C[0])
-    return 4
-
-
-def xorad():
-    xor_a(_D[0])
-    return 4
-
-
-def xorae():
-    xor_a(_E[0])
-    return 4
-
-
-def xorah():
-    xor_a(_H[0])
-    return 4
-
-
-def xoral():
-    xor_a(_L[0])
-    return 4
-
-
-def xorafromhl():
-    xor_a(memory.peekb(_HL[0]))
-    return 7
-
-
-def xoraa():
-    xor_a(_A[0])
-    return 4
-
-
-# OR A,*
-def orab():
-    or_a(_B[0])
-    return 4
-
-
-def orac():
-    or_a(_C[0])
-    return 4
-
-
-def orad():
-    or_a(_D[0])
-    return 4
-
-
-def orae():
-    or_a(_E[0])
-    return 4
-
-
-def orah():
-    or_a(_H[0])
-    return 4
-
-
-def oral():
-    or_a(_L[0])
-    return 4
-
-
-def orafromhl():
-    or_a(memory.peekb(_HL[0]))
-    return 7
-
-
-def oraa():
-    or_a(_A[0])
-    return 4
-
-
-# CP A,*
-def cpab():
-    cp_a(_B[0])
-    return 4
-
-
-def cpac():
-    cp_a(_C[0])
-    return 4
-
-
-def cpad():
-    cp_a(_D[0])
-    return 4
-
-
-def cpae():
-    cp_a(_E[0])
-    return 4
-
-
-def cpah():
-    cp_a(_H[0])
-    return 4
-
-
-def cpal():
-    cp_a(_L[0])
-    return 4
-
-
-def cpafromhl():
-    cp_a(memory.peekb(_HL[0]))
-    return 7
-
-
-def cpaa():
-    cp_a(_A[0])
-    return 4
-
-
-# RET cc
-def retnz():
-    global _fZ
-    if not _fZ:
-        poppc()
-        return 11
-    else:
-        return 5
-
-def retz():
-    global _fZ
-    if _fZ:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-def retnc():
-    global _fC
-    if not _fC:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-def retc():
-    global _fC
-    if _fC:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-def retpo():
-    global _fPV
-    if not _fPV:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-def retpe():
-    global _fPV
-    if _fPV:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-def retp():
-    global _fS
-    if not _fS:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-def retm():
-    global _fS
-    if _fS:
-        poppc()
-        return 11
-    else:
-        return 5
-
-
-# POP
-def popbc():
-    _BC[0] = popw()
-    return 10
-
-
-def popde():
-    _DE[0] = popw()
-    return 10
-
-
-def pophl():
-    _HL[0] = popw()
-    return 10
-
-
-def popaf():
-    _AF[0] = popw()
-    setflags()
-    return 10
-
-
-# JP cc,nn
-def jpnznn():
-    global _fZ
-    if not _fZ:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jpznn():
-    global _fZ
-    if _fZ:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jpncnn():
-    global _fC
-    if not _fC:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jpcnn():
-    global _fC
-    if _fC:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jpponn():
-    global _fPV
-    if not _fPV:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jppenn():
-    global _fPV
-    if _fPV:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jppnn():
-    global _fS
-    if not _fS:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-def jpmnn():
-    global _fS
-    if _fS:
-        _PC[0] = nxtpcw()
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-    return 10
-
-
-# Various
-def jphl():
-    _PC[0] = _HL[0]
-    return 4
-
-
-def ldsphl():
-    _SP[0] = _HL[0]
-    return 6
-
-
-def ret():
-    poppc()
-    return 10
-
-
-def jpnn():
-    _PC[0] = nxtpcw()
-    return 10
-
-
-# CB prefix
-#RLC *
-def rlcb():
-    _B[0] = rlc(_B[0])
-    return 8
-
-
-def rlcc():
-    _C[0] = rlc(_C[0])
-    return 8
-
-
-def rlcd():
-    _D[0] = rlc(_D[0])
-    return 8
-
-
-def rlce():
-    _E[0] = rlc(_E[0])
-    return 8
-
-
-def rlch():
-    _H[0] = rlc(_H[0])
-    return 8
-
-
-def rlcl():
-    _L[0] = rlc(_L[0])
-    return 8
-
-
-def rlcfromhl():
-    memory.pokeb(_HL[0], rlc(memory.peekb(_HL[0])))
-    return 15
-
-
-def rlc_a():
-    _A[0] = rlc(_A[0])
-    return 8
-
-
-#RRC *
-def rrcb():
-    _B[0] = rrc(_B[0])
-    return 8
-
-
-def rrcc():
-    _C[0] = rrc(_C[0])
-    return 8
-
-
-def rrcd():
-    _D[0] = rrc(_D[0])
-    return 8
-
-
-def rrce():
-    _E[0] = rrc(_E[0])
-    return 8
-
-
-def rrch():
-    _H[0] = rrc(_H[0])
-    return 8
-
-
-def rrcl():
-    _L[0] = rrc(_L[0])
-    return 8
-
-
-def rrcfromhl():
-    memory.pokeb(_HL[0], rrc(memory.peekb(_HL[0])))
-    return 15
-
-
-def rrc_a():
-    _A[0] = rrc(_A[0])
-    return 8
-
-
-#RL *
-def rlb():
-    _B[0] = rl(_B[0])
-    return 8
-
-
-def rl_c():
-    _C[0] = rl(_C[0])
-    return 8
-
-
-def rld():
-    _D[0] = rl(_D[0])
-    return 8
-
-
-def rle():
-    _E[0] = rl(_E[0])
-    return 8
-
-
-def rlh():
-    _H[0] = rl(_H[0])
-    return 8
-
-
-def rll():
-    _L[0] = rl(_L[0])
-    return 8
-
-
-def rlfromhl():
-    memory.pokeb(_HL[0], rl(memory.peekb(_HL[0])))
-    return 15
-
-
-def rl_a():
-    _A[0] = rl(_A[0])
-    return 8
-
-
-# RR *
-def rrb():
-    _B[0] = rr(_B[0])
-    return 8
-
-
-def rr_c():
-    _C[0] = rr(_C[0])
-    return 8
-
-
-def rrd():
-    _D[0] = rr(_D[0])
-    return 8
-
-
-def rre():
-    _E[0] = rr(_E[0])
-    return 8
-
-
-def rrh():
-    _H[0] = rr(_H[0])
-    return 8
-
-
-def rrl():
-    _L[0] = rr(_L[0])
-    return 8
-
-
-def rrfromhl():
-    memory.pokeb(_HL[0], rr(memory.peekb(_HL[0])))
-    return 15
-
-
-def rr_a():
-    _A[0] = rr(_A[0])
-    return 8
-
-
-# SLA *
-def slab():
-    _B[0] = sla(_B[0])
-    return 8
-
-
-def slac():
-    _C[0] = sla(_C[0])
-    return 8
-
-
-def slad():
-    _D[0] = sla(_D[0])
-    return 8
-
-
-def slae():
-    _E[0] = sla(_E[0])
-    return 8
-
-
-def slah():
-    _H[0] = sla(_H[0])
-    return 8
-
-
-def slal():
-    _L[0] = sla(_L[0])
-    return 8
-
-
-def slafromhl():
-    memory.pokeb(_HL[0], sla(memory.peekb(_HL[0])))
-    return 15
-
-
-def sla_a():
-    _A[0] = sla(_A[0])
-    return 8
-
-
-# SRA *
-def srab():
-    _B[0] = sra(_B[0])
-    return 8
-
-
-def srac():
-    _C[0] = sra(_C[0])
-    return 8
-
-
-def srad():
-    _D[0] = sra(_D[0])
-    return 8
-
-
-def srae():
-    _E[0] = sra(_E[0])
-    return 8
-
-
-def srah():
-    _H[0] = sra(_H[0])
-    return 8
-
-
-def sral():
-    _L[0] = sra(_L[0])
-    return 8
-
-
-def srafromhl():
-    memory.pokeb(_HL[0], sra(memory.peekb(_HL[0])))
-    return 15
-
-
-def sra_a():
-    _A[0] = sra(_A[0])
-    return 8
-
-
-# SLS *
-def slsb():
-    _B[0] = sls(_B[0])
-    return 8
-
-
-def slsc():
-    _C[0] = sls(_C[0])
-    return 8
-
-
-def slsd():
-    _D[0] = sls(_D[0])
-    return 8
-
-
-def slse():
-    _E[0] = sls(_E[0])
-    return 8
-
-
-def slsh():
-    _H[0] = sls(_H[0])
-    return 8
-
-
-def slsl():
-    _L[0] = sls(_L[0])
-    return 8
-
-
-def slsfromhl():
-    memory.pokeb(_HL[0], sls(memory.peekb(_HL[0])))
-    return 15
-
-
-def sls_a():
-    _A[0] = sls(_A[0])
-    return 8
-
-
-# SRL *
-def srlb():
-    _B[0] = srl(_B[0])
-    return 8
-
-
-def srlc():
-    _C[0] = srl(_C[0])
-    return 8
-
-
-def srld():
-    _D[0] = srl(_D[0])
-    return 8
-
-
-def srle():
-    _E[0] = srl(_E[0])
-    return 8
-
-
-def srlh():
-    _H[0] = srl(_H[0])
-    return 8
-
-
-def srll():
-    _L[0] = srl(_L[0])
-    return 8
-
-
-def srlfromhl():
-    memory.pokeb(_HL[0], srl(memory.peekb(_HL[0])))
-    return 15
-
-
-def srl_a():
-    _A[0] = srl(_A[0])
-    return 8
-
-
-# BIT 0, *
-def bit0b():
-    bit(0x01, _B[0])
-    return 8
-
-
-def bit0c():
-    bit(0x01, _C[0])
-    return 8
-
-
-def bit0d():
-    bit(0x01, _D[0])
-    return 8
-
-
-def bit0e():
-    bit(0x01, _E[0])
-    return 8
-
-
-def bit0h():
-    bit(0x01, _H[0])
-    return 8
-
-
-def bit0l():
-    bit(0x01, _L[0])
-    return 8
-
-
-def bit0fromhl():
-    bit(0x01, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit0a():
-    bit(0x01, _A[0])
-    return 8
-
-
-# BIT 1, *
-def bit1b():
-    bit(0x02, _B[0])
-    return 8
-
-
-def bit1c():
-    bit(0x02, _C[0])
-    return 8
-
-
-def bit1d():
-    bit(0x02, _D[0])
-    return 8
-
-
-def bit1e():
-    bit(0x02, _E[0])
-    return 8
-
-
-def bit1h():
-    bit(0x02, _H[0])
-    return 8
-
-
-def bit1l():
-    bit(0x02, _L[0])
-    return 8
-
-
-def bit1fromhl():
-    bit(0x02, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit1a():
-    bit(0x02, _A[0])
-    return 8
-
-
-# BIT 2, *
-def bit2b():
-    bit(0x04, _B[0])
-    return 8
-
-
-def bit2c():
-    bit(0x04, _C[0])
-    return 8
-
-
-def bit2d():
-    bit(0x04, _D[0])
-    return 8
-
-
-def bit2e():
-    bit(0x04, _E[0])
-    return 8
-
-
-def bit2h():
-    bit(0x04, _H[0])
-    return 8
-
-
-def bit2l():
-    bit(0x04, _L[0])
-    return 8
-
-
-def bit2fromhl():
-    bit(0x04, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit2a():
-    bit(0x04, _A[0])
-    return 8
-
-
-# BIT 3, *
-def bit3b():
-    bit(0x08, _B[0])
-    return 8
-
-
-def bit3c():
-    bit(0x08, _C[0])
-    return 8
-
-
-def bit3d():
-    bit(0x08, _D[0])
-    return 8
-
-
-def bit3e():
-    bit(0x08, _E[0])
-    return 8
-
-
-def bit3h():
-    bit(0x08, _H[0])
-    return 8
-
-
-def bit3l():
-    bit(0x08, _L[0])
-    return 8
-
-
-def bit3fromhl():
-    bit(0x08, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit3a():
-    bit(0x08, _A[0])
-    return 8
-
-
-# BIT 4, *
-def bit4b():
-    bit(0x10, _B[0])
-    return 8
-
-
-def bit4c():
-    bit(0x10, _C[0])
-    return 8
-
-
-def bit4d():
-    bit(0x10, _D[0])
-    return 8
-
-
-def bit4e():
-    bit(0x10, _E[0])
-    return 8
-
-
-def bit4h():
-    bit(0x10, _H[0])
-    return 8
-
-
-def bit4l():
-    bit(0x10, _L[0])
-    return 8
-
-
-def bit4fromhl():
-    bit(0x10, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit4a():
-    bit(0x10, _A[0])
-    return 8
-
-
-# BIT 5, *
-def bit5b():
-    bit(0x20, _B[0])
-    return 8
-
-
-def bit5c():
-    bit(0x20, _C[0])
-    return 8
-
-
-def bit5d():
-    bit(0x20, _D[0])
-    return 8
-
-
-def bit5e():
-    bit(0x20, _E[0])
-    return 8
-
-
-def bit5h():
-    bit(0x20, _H[0])
-    return 8
-
-
-def bit5l():
-    bit(0x20, _L[0])
-    return 8
-
-
-def bit5fromhl():
-    bit(0x20, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit5a():
-    bit(0x20, _A[0])
-    return 8
-
-
-# BIT 6, *
-def bit6b():
-    bit(0x40, _B[0])
-    return 8
-
-
-def bit6c():
-    bit(0x40, _C[0])
-    return 8
-
-
-def bit6d():
-    bit(0x40, _D[0])
-    return 8
-
-
-def bit6e():
-    bit(0x40, _E[0])
-    return 8
-
-
-def bit6h():
-    bit(0x40, _H[0])
-    return 8
-
-
-def bit6l():
-    bit(0x40, _L[0])
-    return 8
-
-
-def bit6fromhl():
-    bit(0x40, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit6a():
-    bit(0x40, _A[0])
-    return 8
-
-
-# BIT 7, *
-def bit7b():
-    bit(0x80, _B[0])
-    return 8
-
-
-def bit7c():
-    bit(0x80, _C[0])
-    return 8
-
-
-def bit7d():
-    bit(0x80, _D[0])
-    return 8
-
-
-def bit7e():
-    bit(0x80, _E[0])
-    return 8
-
-
-def bit7h():
-    bit(0x80, _H[0])
-    return 8
-
-
-def bit7l():
-    bit(0x80, _L[0])
-    return 8
-
-
-def bit7fromhl():
-    bit(0x80, memory.peekb(_HL[0]))
-    return 12
-
-
-def bit7a():
-    bit(0x80, _A[0])
-    return 8
-
-
-# RES 0, *
-def res0b():
-    _B[0] = res(0x01, _B[0])
-    return 8
-
-
-def res0c():
-    _C[0] = res(0x01, _C[0])
-    return 8
-
-
-def res0d():
-    _D[0] = res(0x01, _D[0])
-    return 8
-
-
-def res0e():
-    _E[0] = res(0x01, _E[0])
-    return 8
-
-
-def res0h():
-    _H[0] = res(0x01, _H[0])
-    return 8
-
-
-def res0l():
-    _L[0] = res(0x01, _L[0])
-    return 8
-
-
-def res0fromhl():
-    memory.pokeb(_HL[0], res(0x01, memory.peekb(_HL[0])))
-    return 15
-
-
-def res0a():
-    _A[0] = res(0x01, _A[0])
-    return 8
-
-
-# RES 1, *
-def res1b():
-    _B[0] = res(0x02, _B[0])
-    return 8
-
-
-def res1c():
-    _C[0] = res(0x02, _C[0])
-    return 8
-
-
-def res1d():
-    _D[0] = res(0x02, _D[0])
-    return 8
-
-
-def res1e():
-    _E[0] = res(0x02, _E[0])
-    return 8
-
-
-def res1h():
-    _H[0] = res(0x02, _H[0])
-    return 8
-
-
-def res1l():
-    _L[0] = res(0x02, _L[0])
-    return 8
-
-
-def res1fromhl():
-    memory.pokeb(_HL[0], res(0x02, memory.peekb(_HL[0])))
-    return 15
-
-
-def res1a():
-    _A[0] = res(0x02, _A[0])
-    return 8
-
-
-# RES 2, *
-def res2b():
-    _B[0] = res(0x04, _B[0])
-    return 8
-
-
-def res2c():
-    _C[0] = res(0x04, _C[0])
-    return 8
-
-
-def res2d():
-    _D[0] = res(0x04, _D[0])
-    return 8
-
-
-def res2e():
-    _E[0] = res(0x04, _E[0])
-    return 8
-
-
-def res2h():
-    _H[0] = res(0x04, _H[0])
-    return 8
-
-
-def res2l():
-    _L[0] = res(0x04, _L[0])
-    return 8
-
-
-def res2fromhl():
-    memory.pokeb(_HL[0], res(0x04, memory.peekb(_HL[0])))
-    return 15
-
-
-def res2a():
-    _A[0] = res(0x04, _A[0])
-    return 8
-
-
-# RES 3, *
-def res3b():
-    _B[0] = res(0x08, _B[0])
-    return 8
-
-
-def res3c():
-    _C[0] = res(0x08, _C[0])
-    return 8
-
-
-def res3d():
-    _D[0] = res(0x08, _D[0])
-    return 8
-
-
-def res3e():
-    _E[0] = res(0x08, _E[0])
-    return 8
-
-
-def res3h():
-    _H[0] = res(0x08, _H[0])
-    return 8
-
-
-def res3l():
-    _L[0] = res(0x08, _L[0])
-    return 8
-
-
-def res3fromhl():
-    memory.pokeb(_HL[0], res(0x08, memory.peekb(_HL[0])))
-    return 15
-
-
-def res3a():
-    _A[0] = res(0x08, _A[0])
-    return 8
-
-
-# RES 4, *
-def res4b():
-    _B[0] = res(0x10, _B[0])
-    return 8
-
-
-def res4c():
-    _C[0] = res(0x10, _C[0])
-    return 8
-
-
-def res4d():
-    _D[0] = res(0x10, _D[0])
-    return 8
-
-
-def res4e():
-    _E[0] = res(0x10, _E[0])
-    return 8
-
-
-def res4h():
-    _H[0] = res(0x10, _H[0])
-    return 8
-
-
-def res4l():
-    _L[0] = res(0x10, _L[0])
-    return 8
-
-
-def res4fromhl():
-    memory.pokeb(_HL[0], res(0x10, memory.peekb(_HL[0])))
-    return 15
-
-
-def res4a():
-    _A[0] = res(0x10, _A[0])
-    return 8
-
-
-# RES 5, *
-def res5b():
-    _B[0] = res(0x20, _B[0])
-    return 8
-
-
-def res5c():
-    _C[0] = res(0x20, _C[0])
-    return 8
-
-
-def res5d():
-    _D[0] = res(0x20, _D[0])
-    return 8
-
-
-def res5e():
-    _E[0] = res(0x20, _E[0])
-    return 8
-
-
-def res5h():
-    _H[0] = res(0x20, _H[0])
-    return 8
-
-
-def res5l():
-    _L[0] = res(0x20, _L[0])
-    return 8
-
-
-def res5fromhl():
-    memory.pokeb(_HL[0], res(0x20, memory.peekb(_HL[0])))
-    return 15
-
-
-def res5a():
-    _A[0] = res(0x20, _A[0])
-    return 8
-
-
-# RES 6, *
-def res6b():
-    _B[0] = res(0x40, _B[0])
-    return 8
-
-
-def res6c():
-    _C[0] = res(0x40, _C[0])
-    return 8
-
-
-def res6d():
-    _D[0] = res(0x40, _D[0])
-    return 8
-
-
-def res6e():
-    _E[0] = res(0x40, _E[0])
-    return 8
-
-
-def res6h():
-    _H[0] = res(0x40, _H[0])
-    return 8
-
-
-def res6l():
-    _L[0] = res(0x40, _L[0])
-    return 8
-
-
-def res6fromhl():
-    memory.pokeb(_HL[0], res(0x40, memory.peekb(_HL[0])))
-    return 15
-
-
-def res6a():
-    _A[0] = res(0x40, _A[0])
-    return 8
-
-
-# RES 7, *
-def res7b():
-    _B[0] = res(0x80, _B[0])
-    return 8
-
-
-def res7c():
-    _C[0] = res(0x80, _C[0])
-    return 8
-
-
-def res7d():
-    _D[0] = res(0x80, _D[0])
-    return 8
-
-
-def res7e():
-    _E[0] = res(0x80, _E[0])
-    return 8
-
-
-def res7h():
-    _H[0] = res(0x80, _H[0])
-    return 8
-
-
-def res7l():
-    _L[0] = res(0x80, _L[0])
-    return 8
-
-
-def res7fromhl():
-    memory.pokeb(_HL[0], res(0x80, memory.peekb(_HL[0])))
-    return 15
-
-
-def res7a():
-    _A[0] = res(0x80, _A[0])
-    return 8
-
-
-# SET 0, *
-def set0b():
-    _B[0] = set(0x01, _B[0])
-    return 8
-
-
-def set0c():
-    _C[0] = set(0x01, _C[0])
-    return 8
-
-
-def set0d():
-    _D[0] = set(0x01, _D[0])
-    return 8
-
-
-def set0e():
-    _E[0] = set(0x01, _E[0])
-    return 8
-
-
-def set0h():
-    _H[0] = set(0x01, _H[0])
-    return 8
-
-
-def set0l():
-    _L[0] = set(0x01, _L[0])
-    return 8
-
-
-def set0fromhl():
-    memory.pokeb(_HL[0], set(0x01, memory.peekb(_HL[0])))
-    return 15
-
-
-def set0a():
-    _A[0] = set(0x01, _A[0])
-    return 8
-
-
-# SET 1, *
-def set1b():
-    _B[0] = set(0x02, _B[0])
-    return 8
-
-
-def set1c():
-    _C[0] = set(0x02, _C[0])
-    return 8
-
-
-def set1d():
-    _D[0] = set(0x02, _D[0])
-    return 8
-
-
-def set1e():
-    _E[0] = set(0x02, _E[0])
-    return 8
-
-
-def set1h():
-    _H[0] = set(0x02, _H[0])
-    return 8
-
-
-def set1l():
-    _L[0] = set(0x02, _L[0])
-    return 8
-
-
-def set1fromhl():
-    memory.pokeb(_HL[0], set(0x02, memory.peekb(_HL[0])))
-    return 15
-
-
-def set1a():
-    _A[0] = set(0x02, _A[0])
-    return 8
-
-
-# SET 2, *
-def set2b():
-    _B[0] = set(0x04, _B[0])
-    return 8
-
-
-def set2c():
-    _C[0] = set(0x04, _C[0])
-    return 8
-
-
-def set2d():
-    _D[0] = set(0x04, _D[0])
-    return 8
-
-
-def set2e():
-    _E[0] = set(0x04, _E[0])
-    return 8
-
-
-def set2h():
-    _H[0] = set(0x04, _H[0])
-    return 8
-
-
-def set2l():
-    _L[0] = set(0x04, _L[0])
-    return 8
-
-
-def set2fromhl():
-    memory.pokeb(_HL[0], set(0x04, memory.peekb(_HL[0])))
-    return 15
-
-
-def set2a():
-    _A[0] = set(0x04, _A[0])
-    return 8
-
-
-# SET 3, *
-def set3b():
-    _B[0] = set(0x08, _B[0])
-    return 8
-
-
-def set3c():
-    _C[0] = set(0x08, _C[0])
-    return 8
-
-
-def set3d():
-    _D[0] = set(0x08, _D[0])
-    return 8
-
-
-def set3e():
-    _E[0] = set(0x08, _E[0])
-    return 8
-
-
-def set3h():
-    _H[0] = set(0x08, _H[0])
-    return 8
-
-
-def set3l():
-    _L[0] = set(0x08, _L[0])
-    return 8
-
-
-def set3fromhl():
-    memory.pokeb(_HL[0], set(0x08, memory.peekb(_HL[0])))
-    return 15
-
-
-def set3a():
-    _A[0] = set(0x08, _A[0])
-    return 8
-
-
-# SET 4, *
-def set4b():
-    _B[0] = set(0x10, _B[0])
-    return 8
-
-
-def set4c():
-    _C[0] = set(0x10, _C[0])
-    return 8
-
-
-def set4d():
-    _D[0] = set(0x10, _D[0])
-    return 8
-
-
-def set4e():
-    _E[0] = set(0x10, _E[0])
-    return 8
-
-
-def set4h():
-    _H[0] = set(0x10, _H[0])
-    return 8
-
-
-def set4l():
-    _L[0] = set(0x10, _L[0])
-    return 8
-
-
-def set4fromhl():
-    memory.pokeb(_HL[0], set(0x10, memory.peekb(_HL[0])))
-    return 15
-
-
-def set4a():
-    _A[0] = set(0x10, _A[0])
-    return 8
-
-
-# SET 5, *
-def set5b():
-    _B[0] = set(0x20, _B[0])
-    return 8
-
-
-def set5c():
-    _C[0] = set(0x20, _C[0])
-    return 8
-
-
-def set5d():
-    _D[0] = set(0x20, _D[0])
-    return 8
-
-
-def set5e():
-    _E[0] = set(0x20, _E[0])
-    return 8
-
-
-def set5h():
-    _H[0] = set(0x20, _H[0])
-    return 8
-
-
-def set5l():
-    _L[0] = set(0x20, _L[0])
-    return 8
-
-
-def set5fromhl():
-    memory.pokeb(_HL[0], set(0x20, memory.peekb(_HL[0])))
-    return 15
-
-
-def set5a():
-    _A[0] = set(0x20, _A[0])
-    return 8
-
-
-# SET 6, *
-def set6b():
-    _B[0] = set(0x40, _B[0])
-    return 8
-
-
-def set6c():
-    _C[0] = set(0x40, _C[0])
-    return 8
-
-
-def set6d():
-    _D[0] = set(0x40, _D[0])
-    return 8
-
-
-def set6e():
-    _E[0] = set(0x40, _E[0])
-    return 8
-
-
-def set6h():
-    _H[0] = set(0x40, _H[0])
-    return 8
-
-
-def set6l():
-    _L[0] = set(0x40, _L[0])
-    return 8
-
-
-def set6fromhl():
-    memory.pokeb(_HL[0], set(0x40, memory.peekb(_HL[0])))
-    return 15
-
-
-def set6a():
-    _A[0] = set(0x40, _A[0])
-    return 8
-
-
-# SET 7, *
-def set7b():
-    _B[0] = set(0x80, _B[0])
-    return 8
-
-
-def set7c():
-    _C[0] = set(0x80, _C[0])
-    return 8
-
-
-def set7d():
-    _D[0] = set(0x80, _D[0])
-    return 8
-
-
-def set7e():
-    _E[0] = set(0x80, _E[0])
-    return 8
-
-
-def set7h():
-    _H[0] = set(0x80, _H[0])
-    return 8
-
-
-def set7l():
-    _L[0] = set(0x80, _L[0])
-    return 8
-
-
-def set7fromhl():
-    memory.pokeb(_HL[0], set(0x80, memory.peekb(_HL[0])))
-    return 15
-
-
-def set7a():
-    _A[0] = set(0x80, _A[0])
-    return 8
-
-
-_cbdict = {
-    0: rlcb, 1: rlcc, 2: rlcd, 3: rlce, 4: rlch, 5: rlcl, 6: rlcfromhl, 7: rlc_a,
-    8: rrcb, 9: rrcc, 10: rrcd, 11: rrce, 12: rrch, 13: rrcl, 14: rrcfromhl, 15: rrc_a,
-    16: rlb, 17: rl_c, 18: rld, 19: rle, 20: rlh, 21: rll, 22: rlfromhl, 23: rl_a,
-    24: rrb, 25: rr_c, 26: rrd, 27: rre, 28: rrh, 29: rrl, 30: rrfromhl, 31: rr_a,
-    32: slab, 33: slac, 34: slad, 35: slae, 36: slah, 37: slal, 38: slafromhl, 39: sla_a,
-    40: srab, 41: srac, 42: srad, 43: srae, 44: srah, 45: sral, 46: srafromhl, 47: sra_a,
-    48: slsb, 49: slsc, 50: slsd, 51: slse, 52: slsh, 53: slsl, 54: slsfromhl, 55: sls_a,
-    56: srlb, 57: srlc, 58: srld, 59: srle, 60: srlh, 61: srll, 62: srlfromhl, 63: srl_a,
-
-    64: bit0b, 65: bit0c, 66: bit0d, 67: bit0e, 68: bit0h, 69: bit0l, 70: bit0fromhl, 71: bit0a,
-    72: bit1b, 73: bit1c, 74: bit1d, 75: bit1e, 76: bit1h, 77: bit1l, 78: bit1fromhl, 79: bit1a,
-    80: bit2b, 81: bit2c, 82: bit2d, 83: bit2e, 84: bit2h, 85: bit2l, 86: bit2fromhl, 87: bit2a,
-    88: bit3b, 89: bit3c, 90: bit3d, 91: bit3e, 92: bit3h, 93: bit3l, 94: bit3fromhl, 95: bit3a,
-    96: bit4b, 97: bit4c, 98: bit4d, 99: bit4e, 100: bit4h, 101: bit4l, 102: bit4fromhl, 103: bit4a,
-    104: bit5b, 105: bit5c, 106: bit5d, 107: bit5e, 108: bit5h, 109: bit5l, 110: bit5fromhl, 111: bit5a,
-    112: bit6b, 113: bit6c, 114: bit6d, 115: bit6e, 116: bit6h, 117: bit6l, 118: bit6fromhl, 119: bit6a,
-    120: bit7b, 121: bit7c, 122: bit7d, 123: bit7e, 124: bit7h, 125: bit7l, 126: bit7fromhl, 127: bit7a,
-
-    128: res0b, 129: res0c, 130: res0d, 131: res0e, 132: res0h, 133: res0l, 134: res0fromhl, 135: res0a,
-    136: res1b, 137: res1c, 138: res1d, 139: res1e, 140: res1h, 141: res1l, 142: res1fromhl, 143: res1a,
-    144: res2b, 145: res2c, 146: res2d, 147: res2e, 148: res2h, 149: res2l, 150: res2fromhl, 151: res2a,
-    152: res3b, 153: res3c, 154: res3d, 155: res3e, 156: res3h, 157: res3l, 158: res3fromhl, 159: res3a,
-    160: res4b, 161: res4c, 162: res4d, 163: res4e, 164: res4h, 165: res4l, 166: res4fromhl, 167: res4a,
-    168: res5b, 169: res5c, 170: res5d, 171: res5e, 172: res5h, 173: res5l, 174: res5fromhl, 175: res5a,
-    176: res6b, 177: res6c, 178: res6d, 179: res6e, 180: res6h, 181: res6l, 182: res6fromhl, 183: res6a,
-    184: res7b, 185: res7c, 186: res7d, 187: res7e, 188: res7h, 189: res7l, 190: res7fromhl, 191: res7a,
-
-    192: set0b, 193: set0c, 194: set0d, 195: set0e, 196: set0h, 197: set0l, 198: set0fromhl, 199: set0a,
-    200: set1b, 201: set1c, 202: set1d, 203: set1e, 204: set1h, 205: set1l, 206: set1fromhl, 207: set1a,
-    208: set2b, 209: set2c, 210: set2d, 211: set2e, 212: set2h, 213: set2l, 214: set2fromhl, 215: set2a,
-    216: set3b, 217: set3c, 218: set3d, 219: set3e, 220: set3h, 221: set3l, 222: set3fromhl, 223: set3a,
-    224: set4b, 225: set4c, 226: set4d, 227: set4e, 228: set4h, 229: set4l, 230: set4fromhl, 231: set4a,
-    232: set5b, 233: set5c, 234: set5d, 235: set5e, 236: set5h, 237: set5l, 238: set5fromhl, 239: set5a,
-    240: set6b, 241: set6c, 242: set6d, 243: set6e, 244: set6h, 245: set6l, 246: set6fromhl, 247: set6a,
-    248: set7b, 249: set7c, 250: set7d, 251: set7e, 252: set7h, 253: set7l, 254: set7fromhl, 255: set7a
-}
-
-
-def cb():
-    global _cbdict
-    inc_r()
-    opcode = (nxtpcb())
-    return _cbdict.get(opcode)()
-
-
-def outna():
-    ports.port_out(nxtpcb(), _A[0])
-    return 11
-
-
-def inan():
-    _A[0] = ports.port_in(_A[0] << 8 | nxtpcb())
-    return 11
-
-
-def exsphl():
-    t = _HL[0]
-    _HL[0] = memory.peekw(_SP[0])
-    memory.pokew(_SP[0], t)
-    return 19
-
-
-def exdehl():
-    _HL[0], _DE[0] = _DE[0], _HL[0]
-    return 4
-
-
-def di():
-    global _IFF1, _IFF2
-    _IFF1 = False
-    _IFF2 = False
-    return 4
-
-
-def ei():
-    global _IFF1, _IFF2
-    _IFF1 = True
-    _IFF2 = True
-    return 4
-
-
-# CALL cc,nn
-def callnznn():
-    global _fZ
-    if not _fZ:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callznn():
-    global _fZ
-    if _fZ:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callncnn():
-    global _fC
-    if not _fC:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callcnn():
-    global _fC
-    if _fC:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callponn():
-    global _fPV
-    if not _fPV:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callpenn():
-    global _fPV
-    if _fPV:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callpnn():
-    global _fS
-    if not _fS:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-def callmnn():
-    global _fS
-    if _fS:
-        t = nxtpcw()
-        pushpc()
-        _PC[0] = t
-        return 17
-    else:
-        _PC[0] = (_PC[0] + 2) % 65536
-        return 10
-
-
-# PUSH
-def pushbc():
-    pushw(_BC[0])
-    return 11
-
-
-def pushde():
-    pushw(_DE[0])
-    return 11
-
-
-def pushhl():
-    pushw(_HL[0])
-    return 11
-
-
-def pushaf():
-    global _fS, _fZ, _f5, _fH, _f3, _fPV, _fN, _fC
-    _F[0] = (F_S if _fS else 0) + \
-        (F_Z if _fZ else 0) + \
-        (F_5 if _f5 else 0) + \
-        (F_H if _fH else 0) + \
-        (F_3 if _f3 else 0) + \
-        (F_PV if _fPV else 0) + \
-        (F_N if _fN else 0) + \
-        (F_C if _fC else 0)
-    pushw(_AF[0])
-    return 11
-
-
-# op A,N
-def addan():
-    add_a(nxtpcb())
-    return 7
-
-
-def adcan():
-    adc_a(nxtpcb())
-    return 7
-
-
-def suban():
-    sub_a(nxtpcb())
-    return 7
-
-
-def sbcan():
-    sbc_a(nxtpcb())
-    return 7
-
-
-def andan():
-    and_a(nxtpcb())
-    return 7
-
-
-def xoran():
-    xor_a(nxtpcb())
-    return 7
-
-
-def oran():
-    or_a(nxtpcb())
-    return 7
-
-
-def cpan():
-    cp_a(nxtpcb())
-    return 7
-
-
-# RST n
-def rst0():
-    pushpc()
-    _PC[0] = 0
-    return 11
-
-
-def rst8():
-    pushpc()
-    _PC[0] = 8
-    return 11
-
-
-def rst16():
-    pushpc()
-    _PC[0] = 16
-    return 11
-
-
-def rst24():
-    pushpc()
-    _PC[0] = 24
-    return 11
-
-
-def rst32():
-    pushpc()
-    _PC[0] = 32
-    return 11
-
-
-def rst40():
-    pushpc()
-    _PC[0] = 40
-    return 11
-
-
-def rst48():
-    pushpc()
-    _PC[0] = 48
-    return 11
-
-
-def rst56():
-    pushpc()
-    _PC[0] = 56
-    return 11
-
-
-# Various
-def callnn():
-    t = nxtpcw()
-    pushpc()
-    _PC[0] = t
-    return 17
-
-
-def ix():
-    global _ID, _IDL, _IDH, _IX, _IXL, _IXH
-    inc_r()
-    _ID = _IX
-    _IDL = _IXL
-    _IDH = _IXH
-    return execute_id()
-
-
-# ED prefix
-# IN r,(c)
-def inbfrombc():
-    _B[0] = in_bc()
-    return 12
-
-
-def incfrombc():
-    _C[0] = in_bc()
-    return 12
-
-
-def indfrombc():
-    _D[0] = in_bc()
-    return 12
-
-
-def inefrombc():
-    _E[0] = in_bc()
-    return 12
-
-
-def inhfrombc():
-    _H[0] = in_bc()
-    return 12
-
-
-def inlfrombc():
-    _L[0] = in_bc()
-    return 12
-
-
-def infrombc():
-    in_bc()
-    return 12
-
-
-def inafrombc():
-    _A[0] = in_bc()
-    return 12
-
-
-# OUT (c),r
-def outtocb():
-    ports.port_out(_BC[0], _B[0])
-    return 12
-
-
-def outtocc():
-    ports.port_out(_BC[0], _C[0])
-    return 12
-
-
-def outtocd():
-    ports.port_out(_BC[0], _D[0])
-    return 12
-
-
-def outtoce():
-    ports.port_out(_BC[0], _E[0])
-    return 12
-
-
-def outtoch():
-    ports.port_out(_BC[0], _H[0])
-    return 12
-
-
-def outtocl():
-    ports.port_out(_BC[0], _L[0])
-    return 12
-
-
-def outtoc0():
-    ports.port_out(_BC[0], 0)
-    return 12
-
-
-def outtoca():
-    ports.port_out(_BC[0], _A[0])
-    return 12
-
-
-# SBC/ADC HL,ss
-def sbchlbc():
-    _HL[0] = sbc16(_HL[0], _BC[0])
-    return 15
-
-
-def adchlbc():
-    _HL[0] = adc16(_HL[0], _BC[0])
-    return 15
-
-
-def sbchlde():
-    _HL[0] = sbc16(_HL[0], _DE[0])
-    return 15
-
-
-def adchlde():
-    _HL[0] = adc16(_HL[0], _DE[0])
-    return 15
-
-
-def sbchlhl():
-    hl = _HL[0]
-    _HL[0] = sbc16(hl, hl)
-    return 15
-
-
-def adchlhl():
-    hl = _HL[0]
-    _HL[0] = adc16(hl, hl)
-    return 15
-
-
-def sbchlsp():
-    _HL[0] = sbc16(_HL[0], _SP[0])
-    return 15
-
-
-def adchlsp():
-    _HL[0] = adc16(_HL[0], _SP[0])
-    return 15
-
-
-# LD (nn),ss, LD ss,(nn)
-def ldtonnbc():
-    memory.pokew(nxtpcw(), _BC[0])
-    return 20
-
-
-def ldbcfromnn():
-    _BC[0] = memory.peekw(nxtpcw())
-    return 20
-
-
-def ldtonnde():
-    memory.pokew(nxtpcw(), _DE[0])
-    return 20
-
-
-def lddefromnn():
-    _DE[0] = memory.peekw(nxtpcw())
-    return 20
-
-
-def edldtonnhl():
-    return ldtonnhl() + 4
-
-
-def edldhlfromnn():
-    return ldhlfromnn() + 4
-
-
-def ldtonnsp():
-    memory.pokew(nxtpcw(), _SP[0])
-    return 20
-
-
-def ldspfromnn():
-    _SP[0] = memory.peekw(nxtpcw())
-    return 20
-
-
-# NEG
-def nega():
-    global _fPV, _fC
-    t = _A[0]
-    _A[0] = 0
-    sub_a(t)
-    _fPV = t == 0x80
-    _fC = t != 0
-    return 8
-
-
-# RETn
-def retn():
-    global _IFF1, _IFF2
-    _IFF1 = _IFF2
-    poppc()
-    return 14
-
-
-def reti():
-    poppc()
-    return 14
-
-
-# IM x
-def im0():
-    global _IM
-    _IM = IM0
-    return 8
-
-
-def im1():
-    global _IM
-    _IM = IM1
-    return 8
-
-
-def im2():
-    global _IM
-    _IM = IM2
-    return 8
-
-
-# LD A,s / LD s,A / RxD
-def ldia():
-    _I[0] = _A[0]
-    return 9
-
-
-def ldra():
-    global _R
-    _R = _A[0]
-    return 9
-
-
-def ldai():
-    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _IFF2
-    ans = _I[0]
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ = ans == 0
-    _fPV = _IFF2
-    _fH = False
-    _FN  = False
-    _A[0] = ans
-    return 9
-
-
-# Load a with r - (NOT CHECKED)
-def ldar():
-    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _IFF2, _R
-    _A[0] = _R
-    _fS = _A[0] > 0x7f
-    _f3 = (_A[0] & F_3) != 0
-    _f5 = (_A[0] & F_5) != 0
-    _fZ = _A[0] == 0
-    _fPV = _IFF2
-    _fH = False
-    _fN = False
-    return 9
-
-
-def rrda():
-    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN
-    ans = _A[0]
-    t = memory.peekb(_HL[0])
-    q = t
-
-    t = ((t >> 4) + (ans << 4)) % 256
-    ans = (ans & 0xf0) + (q % 16)
-    memory.pokeb(_HL[0], t)
-    _fS = (ans & F_S) != 0
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ = ans == 0
-    _fPV = parity[ans]
-    _fH = False
-    _fN = False
-    _A[0] = ans
-    return 18
-
-
-def rlda():
-    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN
-    ans = _A[0]
-    t = memory.peekb(_HL[0])
-    q = t
-
-    t = ((t << 4) + (ans % 16)) % 256
-    ans = ((ans & 0xf0) + (q >> 4)) % 256
-    memory.pokeb(_HL[0], t)
-    _fS = (ans & F_S) != 0
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ = ans == 0
-    _fPV = parity[ans]
-    _fH = False
-    _fN = False
-    _A[0] = ans
-    return 18
-
-
-# xxI
-def ldi():
-    global _fPV, _fH, _fN
-    memory.pokeb(_DE[0], memory.peekb(_HL[0]))
-    _DE[0] = inc16(_DE[0])
-    _HL[0] = inc16(_HL[0])
-    _BC[0] = dec16(_BC[0])
-    _fPV = _BC[0] != 0
-    _fH = False
-    _fN = False
-    return 16
-
-
-def cpi():
-    global _fPV, _fN, _fC
-    c = _fC
-    cp_a(memory.peekb(_HL[0]))
-    _HL[0] = inc16(_HL[0])
-    _BC[0] = dec16(_BC[0])
-    _fPV = _BC[0] != 0
-    _fC = c
-    _fN = True
-    return 16
-
-
-def ini():
-    global _fPV, _fN, _fC, _fZ
-    c = _fC
-    memory.pokeb(_HL[0], ports.port_in(_BC[0]))
-    _HL[0] = inc16(_HL[0])
-    _B[0] = qdec8(_B[0])
-    _fC = c
-    _fN = False
-    _fZ = _B[0] == 0
-    return 16
-
-
-def outi():
-    global _fPV, _fN, _fC
-    c = _fC
-    ports.port_out(_BC[0], memory.peekb(_HL[0]))
-    _HL[0] = inc16(_HL[0])
-    _B[0] = qdec8(_B[0])
-    _fC = c
-    _fN = False
-    _fZ = _B[0] == 0
-    return 16
-
-
-# xxD
-def ldd():
-    global _fPV, _fH, _fN
-    memory.pokeb(_DE[0], memory.peekb(_HL[0]))
-    _DE[0] = dec16(_DE[0])
-    _HL[0] = dec16(_HL[0])
-    _BC[0] = dec16(_BC[0])
-    _fPV = _BC[0] != 0
-    _fH = False
-    _fN = False
-    return 16
-
-
-def cpd():
-    global _fPV, _fN, _fC
-    c = _fC
-    cp_a(memory.peekb(_HL[0]))
-    _HL[0] = dec16(_HL[0])
-    _BC[0] = dec16(_BC[0])
-    _fC = c
-    _fN = True
-    _fPV = _BC[0] != 0
-    return 16
-
-
-def ind():
-    global _fZ, _fN
-    memory.pokeb(_HL[0], ports.port_in(_BC[0]))
-    _HL[0] = dec16(_HL[0])
-    _B[0] = qdec8(_B[0])
-    _fN = True
-    _fZ = _B[0] == 0
-    return 16
-
-
-def outd():
-    global _fZ, _fN
-    ports.port_out(_BC[0], memory.peekb(_HL[0]))
-    _HL[0] = dec16(_HL[0])
-    _B[0] = qdec8(_B[0])
-    _fN = True
-    _fZ = _B[0] == 0
-    return 16
-
-
-# xxIR
-def ldir():
-    global _fPV, _R7_b, local_tstates, _fN, _fH
-    _fPV = True
-    while True:
-        memory.pokeb(_DE[0], memory.peekb(_HL[0]))
-        _DE[0] = (_DE[0] + 1) % 65536
-        _HL[0] = (_HL[0] + 1) % 65536
-        _BC[0] = (_BC[0] - 1) % 65536
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _BC[0] == 0:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fPV = False
-    _fN = False
-    _fH = False
-    return 16
-
-
-def cpir():
-    global _fPV, _fN, _fC, _fZ, _R7_b, local_tstates
-    c = _fC
-    _fPV = True
-    while True:
-        cp_a(memory.peekb(_HL[0]))
-        _HL[0] = (_HL[0] + 1) % 65536
-        _BC[0] = (_BC[0] - 1) % 65536
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _BC[0] == 0 or _fZ:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fC = c
-    _fN = True
-    _fPV = _BC[0] != 0
-    return 16
-
-
-def inir():
-    global _fN, _fC, _fZ, _R7_b, local_tstates
-    while True:
-        memory.pokeb(_HL, ports.port_in(_BC[0]))
-        _HL[0] = (_HL[0] + 1) % 65536
-        _B[0] = (_B[0] - 1) % 256
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _B[0] == 0:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fZ = True
-    _fC = False
-    _fN = False
-    return 16
-
-def otir():
-    global _fN, _fZ, _R7_b, local_tstates
-    while True:
-        ports.port_out(_BC[0], memory.peekb(_HL[0]))
-        _HL[0] = (_HL[0] + 1) % 65536
-        _B[0] = (_B[0] - 1) % 256
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _B[0] == 0:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fZ = True
-    _fN = False
-    return 16
-
-
-# xxDR
-def lddr():
-    global _fPV, _R7_b, local_tstates, _fH, _fN
-    _fPV = True
-    while True:
-        memory.pokeb(_DE[0], memory.peekb(_HL[0]))
-        _DE[0] = (_DE[0] - 1) % 65536
-        _HL[0] = (_HL[0] - 1) % 65536
-        _BC[0] = (_BC[0] - 1) % 65536
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _BC[0] == 0:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fPV = False
-    _fH = False
-    _fN = False
-    return 16
-
-
-def cpdr():
-    global _fPV, _fN, _fC, _fZ, _R7_b, local_tstates
-    c = _fC
-    _fPV = True
-    while True:
-        cp_a(memory.peekb(_HL[0]))
-        _HL[0] = (_HL[0] - 1) % 65536
-        _BC[0] = (_BC[0] - 1) % 65536
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _BC[0] == 0 or _fZ:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fC = c
-    _fN = True
-    _fPV = _BC[0] != 0
-    return 16
-
-
-def indr():
-    global _fN, _fC, _fZ, _R7_b, local_tstates
-    while True:
-        memory.pokeb(_HL, ports.port_in(_BC[0]))
-        _HL[0] = (_HL[0] - 1) % 65536
-        _B[0] = (_B[0] - 1) % 256
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _B[0] == 0:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fZ = True
-    _fC = False
-    _fN = False
-    return 16
-
-def otdr():
-    global _fN, _fZ, _R7_b, local_tstates
-    while True:
-        ports.port_out(_BC[0], memory.peekb(_HL[0]))
-        _HL[0] = (_HL[0] - 1) % 65536
-        _B[0] = (_B[0] - 1) % 256
-        _R_b[0] = (_R_b[0] + 2) % 128 + _R7_b
-        if _B[0] == 0:
-            break
-        local_tstates += 21
-        check_tstates()
-    _fZ = True
-    _fN = False
-    return 16
-
-
-_eddict = {
-    64: inbfrombc, 72: incfrombc, 80: indfrombc, 88: inefrombc, 96: inhfrombc, 104: inlfrombc, 112: infrombc, 120: inafrombc,
-    65: outtocb, 73: outtocc, 81: outtocd, 89: outtoce, 97: outtoch, 105: outtocl, 113: outtoc0, 121: outtoca,
-    66: sbchlbc, 74: adchlbc, 82: sbchlde, 90: adchlde, 98: sbchlhl, 106: adchlhl, 114: sbchlsp, 122: adchlsp,
-    67: ldtonnbc, 75: ldbcfromnn, 83: ldtonnde, 91: lddefromnn, 99: edldtonnhl, 107: edldhlfromnn, 115: ldtonnsp, 123: ldspfromnn,
-    68: nega, 76: nega, 84: nega, 92: nega, 100: nega, 108: nega, 116: nega, 124: nega,
-    69: retn, 85: retn, 101: retn, 117: retn, 77: reti, 93: reti, 109: reti, 125: reti,
-    70: im0, 78: im0, 102: im0, 110: im0, 86: im1, 118: im1, 94: im2, 126: im2,
-    71: ldia, 79: ldra, 87: ldai, 95: ldar, 103: rrda, 111: rlda,
-    160: ldi, 161: cpi, 162: ini, 163: outi,
-    168: ldd, 169: cpd, 170: ind, 171: outd,
-    176: ldir, 177: cpir, 178: inir, 179: otir,
-    184: lddr, 185: cpdr, 186: indr, 187: otdr
-}
-
-
-def ednop():
-    return 8
-
-
-def ed():
-    opcode = nxtpcb()
-    return _eddict.get(opcode, ednop)()
-
-
-def iy():
-    global _ID, _IDL, _IDH, _IY, _IYL, _IYH
-    inc_r()
-    _ID = _IY
-    _IDL = _IYL
-    _IDH = _IYH
-    return execute_id()
-
-
-main_cmds = {
-    0: nop, 8: ex_af_af, 16: djnz, 24: jr, 32: jrnz, 40: jrz, 48: jrnc, 56: jrc,
-    1: ldbcnn, 9: addhlbc, 17: lddenn, 25: addhlde, 33: ldhlnn, 41: addhlhl, 49: ldspnn, 57: addhlsp,
-    2: ldtobca, 10: ldafrombc, 18: ldtodea, 26: ldafromde, 34: ldtonnhl, 42: ldhlfromnn, 50: ldtonna, 58: ldafromnn,
-    3: incbc, 11: decbc, 19: incde, 27: decde, 35: inchl, 43: dechl, 51: incsp, 59: decsp,
-    4: incb, 12: incc, 20: incd, 28: ince, 36: inch, 44: incl, 52: incinhl, 60: inca,
-    5: decb, 13: decc, 21: decd, 29: dece, 37: dech, 45: decl, 53: decinhl, 61: deca,
-    6: ldbn, 14: ldcn, 22: lddn, 30: lden, 38: ldhn, 46: ldln, 54: ldtohln, 62: ldan,
-    7: rlca, 15: rrca, 23: rla, 31: rra, 39: daa, 47: cpla, 55: scf, 63: ccf,
-    64: ldbb, 65: ldbc, 66: ldbd, 67: ldbe, 68: ldbh, 69: ldbl, 70: ldbfromhl, 71: ldba,
-    72: ldcb, 73: ldcc, 74: ldcd, 75: ldce, 76: ldch, 77: ldcl, 78: ldcfromhl, 79: ldca,
-    80: lddb, 81: lddc, 82: lddd, 83: ldde, 84: lddh, 85: lddl, 86: lddfromhl, 87: ldda,
-    88: ldeb, 89: ldec, 90: lded, 91: ldee, 92: ldeh, 93: ldel, 94: ldefromhl, 95: ldea,
-    96: ldhb, 97: ldhc, 98: ldhd, 99: ldhe, 100: ldhh, 101: ldhl, 102: ldhfromhl, 103: ldha,
-    104: ldlb, 105: ldlc, 106: ldld, 107: ldle, 108: ldlh, 109: ldll, 110: ldlfromhl, 111: ldla,
-    112: ldtohlb, 113: ldtohlc, 114: ldtohld, 115: ldtohle, 116: ldtohlh, 117: ldtohll, 119: ldtohla,
-    120: ldab, 121: ldac, 122: ldad, 123: ldae, 124: ldah, 125: ldal, 126: ldafromhl, 127: ldaa,
-    128: addab, 129: addac, 130: addad, 131: addae, 132: addah, 133: addal, 134: addafromhl, 135: addaa,
-    136: adcab, 137: adcac, 138: adcad, 139: adcae, 140: adcah, 141: adcal, 142: adcafromhl, 143: adcaa,
-    144: subab, 145: subac, 146: subad, 147: subae, 148: subah, 149: subal, 150: subafromhl, 151: subaa,
-    152: sbcab, 153: sbcac, 154: sbcad, 155: sbcae, 156: sbcah, 157: sbcal, 158: sbcafromhl, 159: sbcaa,
-    160: andab, 161: andac, 162: andad, 163: andae, 164: andah, 165: andal, 166: andafromhl, 167: andaa,
-    168: xorab, 169: xorac, 170: xorad, 171: xorae, 172: xorah, 173: xoral, 174: xorafromhl, 175: xoraa,
-    176: orab, 177: orac, 178: orad, 179: orae, 180: orah, 181: oral, 182: orafromhl, 183: oraa,
-    184: cpab, 185: cpac, 186: cpad, 187: cpae, 188: cpah, 189: cpal, 190: cpafromhl, 191: cpaa,
-    192: retnz, 200: retz, 208: retnc, 216: retc, 224: retpo, 232: retpe, 240: retp, 248: retm,
-    193: popbc, 209: popde, 225: pophl, 241: popaf,
-    194: jpnznn, 202: jpznn, 210: jpncnn, 218: jpcnn, 226: jpponn, 234: jppenn, 242: jppnn, 250: jpmnn,
-    217: exx, 233: jphl, 249: ldsphl, 201: ret, 195: jpnn, 203: cb, 211: outna, 219: inan, 227: exsphl, 235: exdehl, 243: di, 251: ei,
-    196: callnznn, 204: callznn, 212: callncnn, 220: callcnn, 228: callponn, 236: callpenn, 244: callpnn, 252: callmnn,
-    197: pushbc, 213: pushde, 229: pushhl, 245: pushaf,
-    198: addan, 206: adcan, 214: suban, 222: sbcan, 230: andan, 238: xoran, 246: oran, 254: cpan,
-    199: rst0, 207: rst8, 215: rst16, 223: rst24, 231: rst32, 239: rst40, 247: rst48, 255: rst56,
-    205: callnn, 221: ix, 237: ed, 253: iy, 
-}
-
-
-# IX, IY ops
-# ADD ID, *
-def addidbc():
-    _ID[0] = add16(_ID[0], _BC[0])
-    return 15
-
-
-def addidde():
-    _ID[0] = add16(_ID[0], _DE[0])
-    return 15
-
-
-def addidid():
-    id = _ID[0]
-    _ID[0] = add16(id, id)
-    return 15
-
-
-def addidsp():
-    _ID[0] = add16(_ID[0], _SP[0])
-    return 15
-
-
-# LD ID, nn
-def ldidnn():
-    _ID[0] = nxtpcw()
-    return 14
-
-
-def ldtonnid():
-    memory.pokew(nxtpcw(), _ID[0])
-    return 20
-
-
-def ldidfromnn():
-    _ID[0] = memory.peekw(nxtpcw())
-    return 20
-
-
-# INC
-def incid():
-    _ID[0] = inc16(_ID[0])
-    return 10
-
-
-def incidh():
-    _IDH[0] = inc8(_IDH[0])
-    return 8
-
-
-def incidl():
-    _IDL[0] = inc8(_IDL[0])
-    return 8
-
-
-def incinidd():
-    z = ID_d()
-    memory.pokeb(z, inc8(memory.peekb(z)))
-    return 23
-    
-
-# DEC
-def decid():
-    _ID[0] = dec16(_ID[0])
-    return 10
-
-
-def decidh():
-    _IDH[0] = dec8(_IDH[0])
-    return 8
-
-
-def decidl():
-    _IDL[0] = dec8(_IDL[0])
-    return 8
-
-
-def decinidd():
-    z = ID_d()
-    memory.pokeb(z, dec8(memory.peekb(z)))
-    return 23
-
-
-# LD *, IDH
-def ldbidh():
-    _B[0] = _IDH[0]
-    return 8
-
-
-def ldcidh():
-    _C[0] = _IDH[0]
-    return 8
-
-
-def lddidh():
-    _D[0] = _IDH[0]
-    return 8
-
-
-def ldeidh():
-    _E[0] = _IDH[0]
-    return 8
-
-
-def ldaidh():
-    _A[0] = _IDH[0]
-    return 8
-
-
-# LD *, IDL
-def ldbidl():
-    _B[0] = _IDL[0]
-    return 8
-
-
-def ldcidl():
-    _C[0] = _IDL[0]
-    return 8
-
-
-def lddidl():
-    _D[0] = _IDL[0]
-    return 8
-
-
-def ldeidl():
-    _E[0] = _IDL[0]
-    return 8
-
-
-def ldaidl():
-    _A[0] = _IDL[0]
-    return 8
-
-
-# LD IDH, *
-def ldidhb():
-    _IDH[0] = _B[0]
-    return 8
-
-
-def ldidhc():
-    _IDH[0] = _C[0]
-    return 8
-
-
-def ldidhd():
-    _IDH[0] = _D[0]
-    return 8
-
-
-def ldidhe():
-    _IDH[0] = _E[0]
-    return 8
-
-
-def ldidhidh():
-    return 8
-
-
-def ldidhidl():
-    _IDH[0] = _IDL[0]
-    return 8
-
-
-def ldidhn():
-    _IDH[0] = nxtpcb()
-    return 11
-
-
-def ldidha():
-    _IDH[0] = _A[0]
-    return 8
-
-
-# LD IDL, *
-def ldidlb():
-    _IDL[0] = _B[0]
-    return 8
-
-
-def ldidlc():
-    _IDL[0] = _C[0]
-    return 8
-
-
-def ldidld():
-    _IDL[0] = _D[0]
-    return 8
-
-
-def ldidle():
-    _IDL[0] = _E[0]
-    return 8
-
-
-def ldidlidh():
-    _IDL[0] = _IDH[0]
-    return 8
-
-
-def ldidlidl():
-    return 8
-
-
-def ldidln():
-    _IDL[0] = nxtpcb()
-    return 11
-
-
-def ldidla():
-    _IDL[0] = _A[0]
-    return 8
-
-
-# LD *, (ID+d)
-def ldbfromidd():
-    _B[0] = memory.peekb(ID_d())
-    return 19
-
-
-def ldcfromidd():
-    _C[0] = memory.peekb(ID_d())
-    return 19
-
-
-def lddfromidd():
-    _D[0] = memory.peekb(ID_d())
-    return 19
-
-
-def ldefromidd():
-    _E[0] = memory.peekb(ID_d())
-    return 19
-
-
-def ldhfromidd():
-    _H[0] = memory.peekb(ID_d())
-    return 19
-
-
-def ldlfromidd():
-    _L[0] = memory.peekb(ID_d())
-    return 19
-
-
-def ldafromidd():
-    _A[0] = memory.peekb(ID_d())
-    return 19
-
-
-# LD (ID+d), *
-def ldtoiddb():
-    memory.pokeb(ID_d(), _B[0])
-    return 19
-
-
-def ldtoiddc():
-    memory.pokeb(ID_d(), _C[0])
-    return 19
-
-
-def ldtoiddd():
-    memory.pokeb(ID_d(), _D[0])
-    return 19
-
-
-def ldtoidde():
-    memory.pokeb(ID_d(), _E[0])
-    return 19
-
-
-def ldtoiddh():
-    memory.pokeb(ID_d(), _H[0])
-    return 19
-
-
-def ldtoiddl():
-    memory.pokeb(ID_d(), _L[0])
-    return 19
-
-
-def ldtoiddn():
-    memory.pokeb(ID_d(), nxtpcb())
-    return 19
-
-
-def ldtoidda():
-    memory.pokeb(ID_d(), _A[0])
-    return 19
-
-
-# ADD/ADC A, *
-def addaidh():
-    add_a(_IDH[0])
-    return 8
-
-
-def addaidl():
-    add_a(_IDL[0])
-    return 8
-
-
-def addafromidd():
-    add_a(memory.peekb(ID_d()))
-    return 19
-
-
-def adcaidh():
-    adc_a(_IDH[0])
-    return 8
-
-
-def adcaidl():
-    adc_a(_IDL[0])
-    return 8
-
-
-def adcafromidd():
-    adc_a(memory.peekb(ID_d()))
-    return 19
-
-
-# SUB/SBC A, *
-def subaidh():
-    sub_a(_IDH[0])
-    return 8
-
-
-def subaidl():
-    sub_a(_IDL[0])
-    return 8
-
-
-def subafromidd():
-    sub_a(memory.peekb(ID_d()))
-    return 19
-
-
-def sbcaidh():
-    sbc_a(_IDH[0])
-    return 8
-
-
-def sbcaidl():
-    sbc_a(_IDL[0])
-    return 8
-
-
-def sbcafromidd():
-    sbc_a(memory.peekb(ID_d()))
-    return 19
-
-
-# Bitwise OPS
-def andaidh():
-    and_a(_IDH[0])
-    return 8
-
-
-def andaidl():
-    and_a(_IDL[0])
-    return 8
-
-
-def andafromidd():
-    and_a(memory.peekb(ID_d()))
-    return 19
-
-
-def xoraidh():
-    xor_a(_IDH[0])
-    return 8
-
-
-def xoraidl():
-    xor_a(_IDL[0])
-    return 8
-
-
-def xorafromidd():
-    xor_a(memory.peekb(ID_d()))
-    return 19
-
-
-def oraidh():
-    or_a(_IDH[0])
-    return 8
-
-
-def oraidl():
-    or_a(_IDL[0])
-    return 8
-
-
-def orafromidd():
-    or_a(memory.peekb(ID_d()))
-    return 19
-
-
-#CP A, *
-def cpaidh():
-    cp_a(_IDH[0])
-    return 8
-
-
-def cpaidl():
-    cp_a(_IDL[0])
-    return 8
-
-
-def cpafromidd():
-    cp_a(memory.peekb(ID_d()))
-    return 19
-
-
-# Various
-def pushid():
-    pushw(_ID[0])
-    return 15
-
-
-def popid():
-    _ID[0] = popw()
-    return 14
-
-
-def jpid():
-    _PC[0] = _ID[0]
-    return 8
-
-
-def ldspid():
-    _SP[0] = _ID[0]
-    return 10
-
-
-def exfromspid():
-    t = _ID[0]
-    sp = _SP[0]
-    _ID[0] = memory.peekw(sp)
-    memory.pokew(sp, t)
-    return 23
-
-
-# DDCB/FDCB prefix
-def idcb():
-    # Get index address (offset byte is first)
-    z = ID_d()
-    # Opcode comes after offset byte
-    op = nxtpcb()
-    return execute_id_cb(op, z)
-
-
-_ixiydict = {
-    9: addidbc, 25: addidde, 41: addidid, 57: addidsp,
-    33: ldidnn, 34: ldtonnid, 42: ldidfromnn,
-    35: incid, 36: incidh, 44: incidl, 52: incinidd,
-    43: decid, 37: decidh, 45: decidl, 53: decinidd,
-    68: ldbidh, 76: ldcidh, 84: lddidh, 92: ldeidh, 124: ldaidh,
-    69: ldbidl, 77: ldcidl, 85: lddidl, 93: ldeidl, 125: ldaidl,
-    96: ldidhb, 97: ldidhc, 98: ldidhd, 99: ldidhe, 100: ldidhidh, 101: ldidhidl, 38: ldidhn, 103: ldidha,
-    104: ldidlb, 105: ldidlc, 106: ldidld, 107: ldidle, 108: ldidlidh, 109: ldidlidl, 46: ldidln, 111: ldidla,
-    70: ldbfromidd, 78: ldcfromidd, 86: lddfromidd, 94: ldefromidd, 102: ldhfromidd, 110: ldlfromidd, 126: ldafromidd,
-    112: ldtoiddb, 113: ldtoiddc, 114: ldtoiddd, 115: ldtoidde, 116: ldtoiddh, 117: ldtoiddl, 54: ldtoiddn, 119: ldtoidda,
-    132: addaidh, 133: addaidl, 134: addafromidd, 140: adcaidh, 141: adcaidl, 142: adcafromidd,
-    148: subaidh, 149: subaidl, 150: subafromidd, 156: sbcaidh, 157: sbcaidl, 158: sbcafromidd,
-    164: andaidh, 165: andaidl, 166: andafromidd, 172: xoraidh, 173: xoraidl, 174: xorafromidd, 180: oraidh, 181: oraidl, 182: orafromidd,
-    188: cpaidh, 189: cpaidl, 190: cpafromidd,
-    229: pushid, 225: popid, 233: jpid, 249: ldspid, 227: exfromspid,
-    203: idcb
-}
-
-
-def ID_d():
-    return (_ID[0] + nxtpcsb()) % 65536
-
-
-# DDCB/FDCB opcodes
-# RLC *
-def cbrlcb(z):
-    _B[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbrlcc(z):
-    _C[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbrlcd(z):
-    _D[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbrlce(z):
-    _E[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbrlch(z):
-    _H[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbrlcl(z):
-    _L[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbrlcinhl(z):
-    memory.pokeb(z, rlc(memory.peekb(z)))
-    return 23
-
-
-def cbrlca(z):
-    _A[0] = rlc(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RRC *
-def cbrrcb(z):
-    _B[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbrrcc(z):
-    _C[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbrrcd(z):
-    _D[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbrrce(z):
-    _E[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbrrch(z):
-    _H[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbrrcl(z):
-    _L[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbrrcinhl(z):
-    memory.pokeb(z, rrc(memory.peekb(z)))
-    return 23
-
-
-def cbrrca(z):
-    _A[0] = rrc(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RL *
-def cbrlb(z):
-    _B[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbrlc(z):
-    _C[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbrld(z):
-    _D[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbrle(z):
-    _E[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbrlh(z):
-    _H[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbrll(z):
-    _L[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbrlinhl(z):
-    memory.pokeb(z, rl(memory.peekb(z)))
-    return 23
-
-
-def cbrla(z):
-    _A[0] = rl(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RR *
-def cbrrb(z):
-    _B[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbrrc(z):
-    _C[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbrrd(z):
-    _D[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbrre(z):
-    _E[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbrrh(z):
-    _H[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbrrl(z):
-    _L[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbrrinhl(z):
-    memory.pokeb(z, rr(memory.peekb(z)))
-    return 23
-
-
-def cbrra(z):
-    _A[0] = rr(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# SLA *
-def cbslab(z):
-    _B[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbslac(z):
-    _C[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbslad(z):
-    _D[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbslae(z):
-    _E[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbslah(z):
-    _H[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbslal(z):
-    _L[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbslainhl(z):
-    memory.pokeb(z, sla(memory.peekb(z)))
-    return 23
-
-
-def cbslaa(z):
-    _A[0] = sla(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# SRA *
-def cbsrab(z):
-    _B[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbsrac(z):
-    _C[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbsrad(z):
-    _D[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbsrae(z):
-    _E[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbsrah(z):
-    _H[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbsral(z):
-    _L[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbsrainhl(z):
-    memory.pokeb(z, sra(memory.peekb(z)))
-    return 23
-
-
-def cbsraa(z):
-    _A[0] = sra(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# SLS *
-def cbslsb(z):
-    _B[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbslsc(z):
-    _C[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbslsd(z):
-    _D[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbslse(z):
-    _E[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbslsh(z):
-    _H[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbslsl(z):
-    _L[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbslsinhl(z):
-    memory.pokeb(z, sls(memory.peekb(z)))
-    return 23
-
-
-def cbslsa(z):
-    _A[0] = sls(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# SRL *
-def cbsrlb(z):
-    _B[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-def cbsrlc(z):
-    _C[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbsrld(z):
-    _D[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbsrle(z):
-    _E[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbsrlh(z):
-    _H[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbsrll(z):
-    _L[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbsrlinhl(z):
-    memory.pokeb(z, srl(memory.peekb(z)))
-    return 23
-
-
-def cbsrla(z):
-    _A[0] = srl(memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# BIT *
-def cbbit0(z):
-    bit(0x01, memory.peekb(z))
-    return 20
-
-
-def cbbit1(z):
-    bit(0x02, memory.peekb(z))
-    return 20
-
-
-def cbbit2(z):
-    bit(0x04, memory.peekb(z))
-    return 20
-
-
-def cbbit3(z):
-    bit(0x08, memory.peekb(z))
-    return 20
-
-
-def cbbit4(z):
-    bit(0x10, memory.peekb(z))
-    return 20
-
-
-def cbbit5(z):
-    bit(0x20, memory.peekb(z))
-    return 20
-
-
-def cbbit6(z):
-    bit(0x40, memory.peekb(z))
-    return 20
-
-
-def cbbit7(z):
-    bit(0x80, memory.peekb(z))
-    return 20
-
-
-# RES 0, *
-def cbres0b(z):
-    _B[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres0c(z):
-    _C[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres0d(z):
-    _D[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres0e(z):
-    _E[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres0h(z):
-    _H[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres0l(z):
-    _L[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres0inhl(z):
-    memory.pokeb(z, res(0x01, memory.peekb(z)))
-    return 23
-
-
-def cbres0a(z):
-    _A[0] = res(0x01, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 1, *
-def cbres1b(z):
-    _B[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres1c(z):
-    _C[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres1d(z):
-    _D[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres1e(z):
-    _E[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres1h(z):
-    _H[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres1l(z):
-    _L[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres1inhl(z):
-    memory.pokeb(z, res(0x02, memory.peekb(z)))
-    return 23
-
-
-def cbres1a(z):
-    _A[0] = res(0x02, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 2, *
-def cbres2b(z):
-    _B[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres2c(z):
-    _C[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres2d(z):
-    _D[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres2e(z):
-    _E[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres2h(z):
-    _H[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres2l(z):
-    _L[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres2inhl(z):
-    memory.pokeb(z, res(0x04, memory.peekb(z)))
-    return 23
-
-
-def cbres2a(z):
-    _A[0] = res(0x04, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 3, *
-def cbres3b(z):
-    _B[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres3c(z):
-    _C[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres3d(z):
-    _D[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres3e(z):
-    _E[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres3h(z):
-    _H[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres3l(z):
-    _L[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres3inhl(z):
-    memory.pokeb(z, res(0x08, memory.peekb(z)))
-    return 23
-
-
-def cbres3a(z):
-    _A[0] = res(0x08, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 4, *
-def cbres4b(z):
-    _B[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres4c(z):
-    _C[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres4d(z):
-    _D[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres4e(z):
-    _E[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres4h(z):
-    _H[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres4l(z):
-    _L[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres4inhl(z):
-    memory.pokeb(z, res(0x10, memory.peekb(z)))
-    return 23
-
-
-def cbres4a(z):
-    _A[0] = res(0x10, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 5, *
-def cbres5b(z):
-    _B[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres5c(z):
-    _C[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres5d(z):
-    _D[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres5e(z):
-    _E[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres5h(z):
-    _H[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres5l(z):
-    _L[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres5inhl(z):
-    memory.pokeb(z, res(0x20, memory.peekb(z)))
-    return 23
-
-
-def cbres5a(z):
-    _A[0] = res(0x20, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 6, *
-def cbres6b(z):
-    _B[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres6c(z):
-    _C[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres6d(z):
-    _D[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres6e(z):
-    _E[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres6h(z):
-    _H[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
-
-
-def cbres6l(z):
-    _L[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
-
-
-def cbres6inhl(z):
-    memory.pokeb(z, res(0x40, memory.peekb(z)))
-    return 23
-
-
-def cbres6a(z):
-    _A[0] = res(0x40, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
-
-
-# RES 7, *
-def cbres7b(z):
-    _B[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
-
-
-def cbres7c(z):
-    _C[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
-
-
-def cbres7d(z):
-    _D[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
-
-
-def cbres7e(z):
-    _E[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
-
-
-def cbres7h(z):
-    _H[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+# ED prefix
+# IN r,(c)
+def inbfrombc():
+    regs[B] = in_bc()
+    return 12
 
 
-def cbres7l(z):
-    _L[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+def incfrombc():
+    regs[C] = in_bc()
+    return 12
 
 
-def cbres7inhl(z):
-    memory.pokeb(z, res(0x80, memory.peekb(z)))
-    return 23
+def indfrombc():
+    regs[D] = in_bc()
+    return 12
 
 
-def cbres7a(z):
-    _A[0] = res(0x80, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+def inefrombc():
+    regs[E] = in_bc()
+    return 12
 
 
-# SET 0, *
-def cbset0b(z):
-    _B[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+def inhfrombc():
+    regs[H] = in_bc()
+    return 12
 
 
-def cbset0c(z):
-    _C[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+def inlfrombc():
+    regs[L] = in_bc()
+    return 12
 
 
-def cbset0d(z):
-    _D[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+def infrombc():
+    in_bc()
+    return 12
 
 
-def cbset0e(z):
-    _E[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def inafrombc():
+    regs[A] = in_bc()
+    return 12
 
 
-def cbset0h(z):
-    _H[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+# OUT (c),r
+def outtocb():
+    ports.port_out(regw[BC], regs[B])
+    return 12
 
 
-def cbset0l(z):
-    _L[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+def outtocc():
+    ports.port_out(regw[BC], regs[C])
+    return 12
 
 
-def cbset0inhl(z):
-    memory.pokeb(z, set(0x01, memory.peekb(z)))
-    return 23
+def outtocd():
+    ports.port_out(regw[BC], regs[D])
+    return 12
 
 
-def cbset0a(z):
-    _A[0] = set(0x01, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+def outtoce():
+    ports.port_out(regw[BC], regs[E])
+    return 12
 
 
-# SET 1, *
-def cbset1b(z):
-    _B[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+def outtoch():
+    ports.port_out(regw[BC], regs[H])
+    return 12
 
 
-def cbset1c(z):
-    _C[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+def outtocl():
+    ports.port_out(regw[BC], regs[L])
+    return 12
 
 
-def cbset1d(z):
-    _D[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+def outtoc0():
+    ports.port_out(regw[BC], 0)
+    return 12
 
 
-def cbset1e(z):
-    _E[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def outtoca():
+    ports.port_out(regw[BC], regs[A])
+    return 12
 
 
-def cbset1h(z):
-    _H[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+# SBC/ADC HL,ss
+def sbchlbc():
+    regw[HL] = sbc16(regw[HL], regw[BC])
+    return 15
 
 
-def cbset1l(z):
-    _L[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+def adchlbc():
+    regw[HL] = adc16(regw[HL], regw[BC])
+    return 15
 
 
-def cbset1inhl(z):
-    memory.pokeb(z, set(0x02, memory.peekb(z)))
-    return 23
+def sbchlde():
+    regw[HL] = sbc16(regw[HL], regw[DE])
+    return 15
 
 
-def cbset1a(z):
-    _A[0] = set(0x02, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+def adchlde():
+    regw[HL] = adc16(regw[HL], regw[DE])
+    return 15
 
 
-# SET 2, *
-def cbset2b(z):
-    _B[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+def sbchlhl():
+    hl = regw[HL]
+    regw[HL] = sbc16(hl, hl)
+    return 15
 
 
-def cbset2c(z):
-    _C[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+def adchlhl():
+    hl = regw[HL]
+    regw[HL] = adc16(hl, hl)
+    return 15
 
 
-def cbset2d(z):
-    _D[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+def sbchlsp():
+    regw[HL] = sbc16(regw[HL], regw[SP])
+    return 15
 
 
-def cbset2e(z):
-    _E[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def adchlsp():
+    regw[HL] = adc16(regw[HL], regw[SP])
+    return 15
 
 
-def cbset2h(z):
-    _H[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+# LD (nn),ss, LD ss,(nn)
+def ldtonnbc():
+    memory.pokew(nxtpcw(), regw[BC])
+    return 20
 
 
-def cbset2l(z):
-    _L[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+def ldbcfromnn():
+    regw[BC] = memory.peekw(nxtpcw())
+    return 20
 
 
-def cbset2inhl(z):
-    memory.pokeb(z, set(0x04, memory.peekb(z)))
-    return 23
+def ldtonnde():
+    memory.pokew(nxtpcw(), regw[DE])
+    return 20
 
 
-def cbset2a(z):
-    _A[0] = set(0x04, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+def lddefromnn():
+    regw[DE] = memory.peekw(nxtpcw())
+    return 20
 
 
-# SET 3, *
-def cbset3b(z):
-    _B[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+def edldtonnhl():
+    return ldtonnhl() + 4
 
 
-def cbset3c(z):
-    _C[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+def edldhlfromnn():
+    return ldhlfromnn() + 4
 
 
-def cbset3d(z):
-    _D[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+def ldtonnsp():
+    memory.pokew(nxtpcw(), regw[SP])
+    return 20
 
 
-def cbset3e(z):
-    _E[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def ldspfromnn():
+    regw[SP] = memory.peekw(nxtpcw())
+    return 20
 
 
-def cbset3h(z):
-    _H[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+# NEG
+# Subtracting from zero already gives PV = (A == 0x80) and C = (A != 0)
+def nega():
+    t = regs[A]
+    regs[A] = 0
+    sub_a(t)
+    return 8
 
 
-def cbset3l(z):
-    _L[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+# RETn
+def retn():
+    global _IFF1, _IFF2
+    _IFF1 = _IFF2
+    poppc()
+    return 14
 
 
-def cbset3inhl(z):
-    memory.pokeb(z, set(0x08, memory.peekb(z)))
-    return 23
+def reti():
+    poppc()
+    return 14
 
 
-def cbset3a(z):
-    _A[0] = set(0x08, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+# IM x
+def im0():
+    global _IM
+    _IM = IM0
+    return 8
 
 
-# SET 4, *
-def cbset4b(z):
-    _B[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+def im1():
+    global _IM
+    _IM = IM1
+    return 8
 
 
-def cbset4c(z):
-    _C[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+def im2():
+    global _IM
+    _IM = IM2
+    return 8
 
 
-def cbset4d(z):
-    _D[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+# LD A,s / LD s,A / RxD
+def ldia():
+    regs[I] = regs[A]
+    return 9
 
 
-def cbset4e(z):
-    _E[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def ldra():
+    regs[R] = regs[A]
+    setr()
+    return 9
 
 
-def cbset4h(z):
-    _H[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+def ldai():
+    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _IFF2, _lf
+    _lf = None
+    ans = regs[I]
+    _fS = ans > 0x7f
+    _f3 = (ans & F_3) != 0
+    _f5 = (ans & F_5) != 0
+    _fZ = ans == 0
+    _fPV = _IFF2
+    _fH = False
+    _fN = False
+    regs[A] = ans
+    return 9
 
 
-def cbset4l(z):
-    _L[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+# Load a with r - (NOT CHECKED)
+def ldar():
+    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _IFF2, _lf
+    _lf = None
+    regs[A] = getr()
+    _fS = regs[A] > 0x7f
+    _f3 = (regs[A] & F_3) != 0
+    _f5 = (regs[A] & F_5) != 0
+    _fZ = regs[A] == 0
+    _fPV = _IFF2
+    _fH = False
+    _fN = False
+    return 9
 
 
-def cbset4inhl(z):
-    memory.pokeb(z, set(0x10, memory.peekb(z)))
-    return 23
+def rrda():
+    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _lf
+    _lf = None
+    ans = regs[A]
+    t = memory.peekb(regw[HL])
+    q = t
 
+    t = ((t >> 4) + (ans << 4)) % 256
+    ans = (ans & 0xf0) + (q % 16)
+    memory.pokeb(regw[HL], t)
+    _fS = (ans & F_S) != 0
+    _f3 = (ans & F_3) != 0
+    _f5 = (ans & F_5) != 0
+    _fZ = ans == 0
+    _fPV = parity[ans]
+    _fH = False
+    _fN = False
+    regs[A] = ans
+    return 18
 
-def cbset4a(z):
-    _A[0] = set(0x10, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
 
+def rlda():
+    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _lf
+    _lf = None
+    ans = regs[A]
+    t = memory.peekb(regw[HL])
+    q = t
 
-# SET 5, *
-def cbset5b(z):
-    _B[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+    t = ((t << 4) + (ans % 16)) % 256
+    ans = ((ans & 0xf0) + (q >> 4)) % 256
+    memory.pokeb(regw[HL], t)
+    _fS = (ans & F_S) != 0
+    _f3 = (ans & F_3) != 0
+    _f5 = (ans & F_5) != 0
+    _fZ = ans == 0
+    _fPV = parity[ans]
+    _fH = False
+    _fN = False
+    regs[A] = ans
+    return 18
 
 
-def cbset5c(z):
-    _C[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+# xxI
+def ldi():
+    global _fPV, _fH, _fN
+    resolve_flags()
+    memory.pokeb(regw[DE], memory.peekb(regw[HL]))
+    regw[DE] = inc16(regw[DE])
+    regw[HL] = inc16(regw[HL])
+    regw[BC] = dec16(regw[BC])
+    _fPV = regw[BC] != 0
+    _fH = False
+    _fN = False
+    return 16
 
 
-def cbset5d(z):
-    _D[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+def cpi():
+    global _fPV, _fN, _fC
+    c = _fC
+    cp_a(memory.peekb(regw[HL]))
+    resolve_flags()
+    regw[HL] = inc16(regw[HL])
+    regw[BC] = dec16(regw[BC])
+    _fPV = regw[BC] != 0
+    _fC = c
+    _fN = True
+    return 16
 
 
-def cbset5e(z):
-    _E[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def ini():
+    global _fPV, _fN, _fC, _fZ
+    resolve_flags()
+    c = _fC
+    memory.pokeb(regw[HL], ports.port_in(regw[BC]))
+    regw[HL] = inc16(regw[HL])
+    regs[B] = qdec8(regs[B])
+    _fC = c
+    _fN = False
+    _fZ = regs[B] == 0
+    return 16
 
 
-def cbset5h(z):
-    _H[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+def outi():
+    global _fPV, _fN, _fC, _fZ
+    resolve_flags()
+    c = _fC
+    ports.port_out(regw[BC], memory.peekb(regw[HL]))
+    regw[HL] = inc16(regw[HL])
+    regs[B] = qdec8(regs[B])
+    _fC = c
+    _fN = False
+    _fZ = regs[B] == 0
+    return 16
 
 
-def cbset5l(z):
-    _L[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+# xxD
+def ldd():
+    global _fPV, _fH, _fN
+    resolve_flags()
+    memory.pokeb(regw[DE], memory.peekb(regw[HL]))
+    regw[DE] = dec16(regw[DE])
+    regw[HL] = dec16(regw[HL])
+    regw[BC] = dec16(regw[BC])
+    _fPV = regw[BC] != 0
+    _fH = False
+    _fN = False
+    return 16
 
 
-def cbset5inhl(z):
-    memory.pokeb(z, set(0x20, memory.peekb(z)))
-    return 23
+def cpd():
+    global _fPV, _fN, _fC
+    c = _fC
+    cp_a(memory.peekb(regw[HL]))
+    resolve_flags()
+    regw[HL] = dec16(regw[HL])
+    regw[BC] = dec16(regw[BC])
+    _fC = c
+    _fN = True
+    _fPV = regw[BC] != 0
+    return 16
 
 
-def cbset5a(z):
-    _A[0] = set(0x20, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+def ind():
+    global _fZ, _fN
+    resolve_flags()
+    memory.pokeb(regw[HL], ports.port_in(regw[BC]))
+    regw[HL] = dec16(regw[HL])
+    regs[B] = qdec8(regs[B])
+    _fN = True
+    _fZ = regs[B] == 0
+    return 16
 
 
-# SET 6, *
-def cbset6b(z):
-    _B[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
+def outd():
+    global _fZ, _fN
+    resolve_flags()
+    ports.port_out(regw[BC], memory.peekb(regw[HL]))
+    regw[HL] = dec16(regw[HL])
+    regs[B] = qdec8(regs[B])
+    _fN = True
+    _fZ = regs[B] == 0
+    return 16
 
 
-def cbset6c(z):
-    _C[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+# xxIR
+# LDIR/LDDR/CPIR/CPDR do as many bytes as fit before the next event in
+# one go, 21 T-states each but the last, then run the events and go on
+def block_count(bc):
+    return min(bc, max(1, (20 - local_tstates) // 21))
 
 
-def cbset6d(z):
-    _D[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+def ldir():
+    global _fPV, local_tstates, _fN, _fH, m1_cycles
+    resolve_flags()
+    _fPV = True
+    while True:
+        bc = regw[BC] or 65536
+        count = block_count(bc)
+        memory.block_copy(regw[DE], regw[HL], count)
+        regw[DE] = (regw[DE] + count) % 65536
+        regw[HL] = (regw[HL] + count) % 65536
+        regw[BC] = bc - count
+        m1_cycles += 2 * count
+        if count == bc:
+            local_tstates += 21 * (count - 1)
+            break
+        local_tstates += 21 * count
+        run_events()
+    _fPV = False
+    _fN = False
+    _fH = False
+    return 16
 
 
-def cbset6e(z):
-    _E[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def cpir():
+    global _fPV, _fN, _fC, local_tstates, m1_cycles
+    c = _fC
+    while True:
+        bc = regw[BC] or 65536
+        count = block_count(bc)
+        found = memory.find(regs[A], regw[HL], count)
+        if found >= 0:
+            count = found + 1
+        # Flags come from the last byte compared
+        cp_a(memory.peekb((regw[HL] + count - 1) % 65536))
+        regw[HL] = (regw[HL] + count) % 65536
+        regw[BC] = bc - count
+        m1_cycles += 2 * count
+        if found >= 0 or count == bc:
+            local_tstates += 21 * (count - 1)
+            break
+        local_tstates += 21 * count
+        run_events()
+    resolve_flags()
+    _fC = c
+    _fN = True
+    _fPV = regw[BC] != 0
+    return 16
 
 
-def cbset6h(z):
-    _H[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+def inir():
+    global _fN, _fC, _fZ, m1_cycles, local_tstates
+    resolve_flags()
+    while True:
+        memory.pokeb(regw[HL], ports.port_in(regw[BC]))
+        regw[HL] = (regw[HL] + 1) % 65536
+        regs[B] = (regs[B] - 1) % 256
+        m1_cycles += 2
+        if regs[B] == 0:
+            break
+        local_tstates += 21
+        if local_tstates >= 0:
+            run_events()
+    _fZ = True
+    _fC = False
+    _fN = False
+    return 16
 
+def otir():
+    global _fN, _fZ, m1_cycles, local_tstates
+    resolve_flags()
+    while True:
+        ports.port_out(regw[BC], memory.peekb(regw[HL]))
+        regw[HL] = (regw[HL] + 1) % 65536
+        regs[B] = (regs[B] - 1) % 256
+        m1_cycles += 2
+        if regs[B] == 0:
+            break
+        local_tstates += 21
+        if local_tstates >= 0:
+            run_events()
+    _fZ = True
+    _fN = False
+    return 16
 
-def cbset6l(z):
-    _L[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
 
+# Undefined ED xx opcodes act as an 8 T-state NOP
+def ednop():
+    return 8
 
-def cbset6inhl(z):
-    memory.pokeb(z, set(0x40, memory.peekb(z)))
-    return 23
 
+# xxDR
+def lddr():
+    global _fPV, local_tstates, _fH, _fN, m1_cycles
+    resolve_flags()
+    _fPV = True
+    while True:
+        bc = regw[BC] or 65536
+        count = block_count(bc)
+        memory.block_copy(regw[DE], regw[HL], count, -1)
+        regw[DE] = (regw[DE] - count) % 65536
+        regw[HL] = (regw[HL] - count) % 65536
+        regw[BC] = bc - count
+        m1_cycles += 2 * count
+        if count == bc:
+            local_tstates += 21 * (count - 1)
+            break
+        local_tstates += 21 * count
+        run_events()
+    _fPV = False
+    _fH = False
+    _fN = False
+    return 16
 
-def cbset6a(z):
-    _A[0] = set(0x40, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
 
+def cpdr():
+    global _fPV, _fN, _fC, local_tstates, m1_cycles
+    c = _fC
+    while True:
+        bc = regw[BC] or 65536
+        count = block_count(bc)
+        found = memory.find(regs[A], regw[HL], count, -1)
+        if found >= 0:
+            count = found + 1
+        # Flags come from the last byte compared
+        cp_a(memory.peekb((regw[HL] - count + 1) % 65536))
+        regw[HL] = (regw[HL] - count) % 65536
+        regw[BC] = bc - count
+        m1_cycles += 2 * count
+        if found >= 0 or count == bc:
+            local_tstates += 21 * (count - 1)
+            break
+        local_tstates += 21 * count
+        run_events()
+    resolve_flags()
+    _fC = c
+    _fN = True
+    _fPV = regw[BC] != 0
+    return 16
 
-# SET 7, *
-def cbset7b(z):
-    _B[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _B[0])
-    return 23
 
+def indr():
+    global _fN, _fC, _fZ, m1_cycles, local_tstates
+    resolve_flags()
+    while True:
+        memory.pokeb(regw[HL], ports.port_in(regw[BC]))
+        regw[HL] = (regw[HL] - 1) % 65536
+        regs[B] = (regs[B] - 1) % 256
+        m1_cycles += 2
+        if regs[B] == 0:
+            break
+        local_tstates += 21
+        if local_tstates >= 0:
+            run_events()
+    _fZ = True
+    _fC = False
+    _fN = False
+    return 16
 
-def cbset7c(z):
-    _C[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _C[0])
-    return 23
+def otdr():
+    global _fN, _fZ, m1_cycles, local_tstates
+    resolve_flags()
+    while True:
+        ports.port_out(regw[BC], memory.peekb(regw[HL]))
+        regw[HL] = (regw[HL] - 1) % 65536
+        regs[B] = (regs[B] - 1) % 256
+        m1_cycles += 2
+        if regs[B] == 0:
+            break
+        local_tstates += 21
+        if local_tstates >= 0:
+            run_events()
+    _fZ = True
+    _fN = False
+    return 16
 
 
-def cbset7d(z):
-    _D[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _D[0])
-    return 23
+_edcmds = optable({
+    64: inbfrombc, 72: incfrombc, 80: indfrombc, 88: inefrombc, 96: inhfrombc, 104: inlfrombc, 112: infrombc, 120: inafrombc,
+    65: outtocb, 73: outtocc, 81: outtocd, 89: outtoce, 97: outtoch, 105: outtocl, 113: outtoc0, 121: outtoca,
+    66: sbchlbc, 74: adchlbc, 82: sbchlde, 90: adchlde, 98: sbchlhl, 106: adchlhl, 114: sbchlsp, 122: adchlsp,
+    67: ldtonnbc, 75: ldbcfromnn, 83: ldtonnde, 91: lddefromnn, 99: edldtonnhl, 107: edldhlfromnn, 115: ldtonnsp, 123: ldspfromnn,
+    68: nega, 76: nega, 84: nega, 92: nega, 100: nega, 108: nega, 116: nega, 124: nega,
+    69: retn, 85: retn, 101: retn, 117: retn, 77: reti, 93: reti, 109: reti, 125: reti,
+    70: im0, 78: im0, 102: im0, 110: im0, 86: im1, 118: im1, 94: im2, 126: im2,
+    71: ldia, 79: ldra, 87: ldai, 95: ldar, 103: rrda, 111: rlda,
+    160: ldi, 161: cpi, 162: ini, 163: outi,
+    168: ldd, 169: cpd, 170: ind, 171: outd,
+    176: ldir, 177: cpir, 178: inir, 179: otir,
+    184: lddr, 185: cpdr, 186: indr, 187: otdr
+}, ednop)
 
 
-def cbset7e(z):
-    _E[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _E[0])
-    return 23
+def ed():
+    return _edcmds[nxtpcb()]()
 
 
-def cbset7h(z):
-    _H[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _H[0])
-    return 23
+def iy():
+    global m1_cycles
+    m1_cycles += 2
+    return _iycmds[nxtpcb()]()
 
 
-def cbset7l(z):
-    _L[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _L[0])
-    return 23
+main_cmds = optable({
+    0: nop, 8: ex_af_af, 16: djnz, 24: jr, 32: jrnz, 40: jrz, 48: jrnc, 56: jrc,
+    1: ldbcnn, 9: addhlbc, 17: lddenn, 25: addhlde, 33: ldhlnn, 41: addhlhl, 49: ldspnn, 57: addhlsp,
+    2: ldtobca, 10: ldafrombc, 18: ldtodea, 26: ldafromde, 34: ldtonnhl, 42: ldhlfromnn, 50: ldtonna, 58: ldafromnn,
+    3: incbc, 11: decbc, 19: incde, 27: decde, 35: inchl, 43: dechl, 51: incsp, 59: decsp,
+    4: incb, 12: incc, 20: incd, 28: ince, 36: inch, 44: incl, 52: incinhl, 60: inca,
+    5: decb, 13: decc, 21: decd, 29: dece, 37: dech, 45: decl, 53: decinhl, 61: deca,
+    6: ldbn, 14: ldcn, 22: lddn, 30: lden, 38: ldhn, 46: ldln, 54: ldtohln, 62: ldan,
+    7: rlca, 15: rrca, 23: rla, 31: rra, 39: daa, 47: cpla, 55: scf, 63: ccf,
+    64: ldbb, 65: ldbc, 66: ldbd, 67: ldbe, 68: ldbh, 69: ldbl, 70: ldbfromhl, 71: ldba,
+    72: ldcb, 73: ldcc, 74: ldcd, 75: ldce, 76: ldch, 77: ldcl, 78: ldcfromhl, 79: ldca,
+    80: lddb, 81: lddc, 82: lddd, 83: ldde, 84: lddh, 85: lddl, 86: lddfromhl, 87: ldda,
+    88: ldeb, 89: ldec, 90: lded, 91: ldee, 92: ldeh, 93: ldel, 94: ldefromhl, 95: ldea,
+    96: ldhb, 97: ldhc, 98: ldhd, 99: ldhe, 100: ldhh, 101: ldhl, 102: ldhfromhl, 103: ldha,
+    104: ldlb, 105: ldlc, 106: ldld, 107: ldle, 108: ldlh, 109: ldll, 110: ldlfromhl, 111: ldla,
+    112: ldtohlb, 113: ldtohlc, 114: ldtohld, 115: ldtohle, 116: ldtohlh, 117: ldtohll, 119: ldtohla,
+    120: ldab, 121: ldac, 122: ldad, 123: ldae, 124: ldah, 125: ldal, 126: ldafromhl, 127: ldaa,
+    128: addab, 129: addac, 130: addad, 131: addae, 132: addah, 133: addal, 134: addafromhl, 135: addaa,
+    136: adcab, 137: adcac, 138: adcad, 139: adcae, 140: adcah, 141: adcal, 142: adcafromhl, 143: adcaa,
+    144: subab, 145: subac, 146: subad, 147: subae, 148: subah, 149: subal, 150: subafromhl, 151: subaa,
+    152: sbcab, 153: sbcac, 154: sbcad, 155: sbcae, 156: sbcah, 157: sbcal, 158: sbcafromhl, 159: sbcaa,
+    160: andab, 161: andac, 162: andad, 163: andae, 164: andah, 165: andal, 166: andafromhl, 167: andaa,
+    168: xorab, 169: xorac, 170: xorad, 171: xorae, 172: xorah, 173: xoral, 174: xorafromhl, 175: xoraa,
+    176: orab, 177: orac, 178: orad, 179: orae, 180: orah, 181: oral, 182: orafromhl, 183: oraa,
+    184: cpab, 185: cpac, 186: cpad, 187: cpae, 188: cpah, 189: cpal, 190: cpafromhl, 191: cpaa,
+    192: retnz, 200: retz, 208: retnc, 216: retc, 224: retpo, 232: retpe, 240: retp, 248: retm,
+    193: popbc, 209: popde, 225: pophl, 241: popaf,
+    194: jpnznn, 202: jpznn, 210: jpncnn, 218: jpcnn, 226: jpponn, 234: jppenn, 242: jppnn, 250: jpmnn,
+    217: exx, 233: jphl, 249: ldsphl, 201: ret, 195: jpnn, 203: cb, 211: outna, 219: inan, 227: exsphl, 235: exdehl, 243: di, 251: ei,
+    196: callnznn, 204: callznn, 212: callncnn, 220: callcnn, 228: callponn, 236: callpenn, 244: callpnn, 252: callmnn,
+    197: pushbc, 213: pushde, 229: pushhl, 245: pushaf,
+    198: addan, 206: adcan, 214: suban, 222: sbcan, 230: andan, 238: xoran, 246: oran, 254: cpan,
+    199: rst0, 207: rst8, 215: rst16, 223: rst24, 231: rst32, 239: rst40, 247: rst48, 255: rst56,
+    205: callnn, 221: ix, 237: ed, 253: iy, 118: halt
+})
 
 
-def cbset7inhl(z):
-    memory.pokeb(z, set(0x80, memory.peekb(z)))
-    return 23
+# DD/FD followed by an opcode without an indexed form: the prefix is
+# a 4 T-state NOP and the opcode runs unprefixed on the next fetch. ix()
+# and iy() counted the opcode's M1 cycle already, the next fetch counts it
+def idnop():
+    global m1_cycles
+    m1_cycles -= 1
+    regw[PC] = (regw[PC] - 1) % 65536
+    return 4
 
 
-def cbset7a(z):
-    _A[0] = set(0x80, memory.peekb(z))
-    memory.pokeb(z, _A[0])
-    return 23
+# The DD/FD pages and their DDCB/FDCB prefixes come from opgen.py, one
+# page per index register
+_ixcmds = optable(_ixops, idnop)
+_iycmds = optable(_iyops, idnop)
 
 
-_idcbdict = {
+_idcbcmds = optable({
     0: cbrlcb, 1: cbrlcc, 2: cbrlcd, 3: cbrlce, 4: cbrlch, 5: cbrlcl, 6: cbrlcinhl, 7: cbrlca,
     8: cbrrcb, 9: cbrrcc, 10: cbrrcd, 11: cbrrce, 12: cbrrch, 13: cbrrcl, 14: cbrrcinhl, 15: cbrrca,
     16: cbrlb, 17: cbrlc, 18: cbrld, 19: cbrle, 20: cbrlh, 21: cbrll, 22: cbrlinhl, 23: cbrla,
@@ -5569,12 +2051,13 @@ _idcbdict = {
     232: cbset5b, 233: cbset5c, 234: cbset5d, 235: cbset5e, 236: cbset5h, 237: cbset5l, 238: cbset5inhl, 239: cbset5a,
     240: cbset6b, 241: cbset6c, 242: cbset6d, 243: cbset6e, 244: cbset6h, 245: cbset6l, 246: cbset6inhl, 247: cbset6a,
     248: cbset7b, 249: cbset7c, 250: cbset7d, 251: cbset7e, 252: cbset7h, 253: cbset7l, 254: cbset7inhl, 255: cbset7a
-}
+})
 
 
 def in_bc():
-    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN
-    ans = ports.port_in(_BC[0])
+    global _fS, _f3, _f5, _fZ, _fPV, _fH, _fN, _lf
+    ans = ports.port_in(regw[BC])
+    _lf = None
     _fZ = ans == 0
     _fS = ans > 0x7f
     _f3 = (ans & F_3) != 0
@@ -5585,366 +2068,185 @@ def in_bc():
     return ans
 
 
-"""
-The algorithm for calculating P/V flag for ADD instruction is: 
-if (((reg_a ^ operand) & 0x80) == 0 /* Same sign */
-&& ((reg_a ^ result) & 0x80) != 0) /* Not same sign */
-overflow = 1;
-else
-overflow = 0;
-"""
+# Lazy flag resolvers - each one fills in S 5 H 3 PV N from what the ALU
+# helper that set _lf recorded
+def _lf_table():
+    global _fS, _f3, _f5, _fPV, _fH, _fN
+    f = _lf_f
+    _fS = f & F_S
+    _f3 = f & F_3
+    _f5 = f & F_5
+    _fPV = f & F_PV
+    _fH = f & F_H
+    _fN = f & F_N
+
+
+def _lf_bit():
+    global _fS, _f3, _f5, _fPV, _fH, _fN
+    r, b = _lf_a, _lf_b
+    _fS = b == F_S and (r & b) != 0
+    _f3 = (r & F_3) != 0
+    _f5 = (r & F_5) != 0
+    _fPV = not (r & b)
+    _fH = True
+    _fN = False
+
+
+def _lf_adc16():
+    global _fS, _f3, _f5, _fPV, _fH, _fN
+    a, b, ans = _lf_a, _lf_b, _lf_ans
+    _fS = ans > 0x7fff
+    _f3 = (ans & F_3_16) != 0
+    _f5 = (ans & F_5_16) != 0
+    _fPV = ((a ^ b) < 0x8000) and ((a ^ ans) > 0x7fff)
+    _fH = ((ans ^ a ^ b) & 0x1000) != 0
+    _fN = False
+
+
+def _lf_sbc16():
+    global _fS, _f3, _f5, _fPV, _fH, _fN
+    a, b, ans = _lf_a, _lf_b, _lf_ans
+    _fS = ans > 0x7fff
+    _f3 = (ans & F_3_16) != 0
+    _f5 = (ans & F_5_16) != 0
+    _fPV = ((a ^ b) > 0x7fff) and ((b ^ ans) < 0x8000)
+    _fH = ((ans ^ a ^ b) & 0x1000) != 0
+    _fN = True
+
+
 # Add with carry - alters all flags (CHECKED)
 def adc_a(b):
-    global _fS, _f3, _f5, _fZ, _fC, _fPV, _fH, _fN
-    a = _A[0]
+    global _fZ, _fC, _lf, _lf_f
+    a = regs[A]
     c = 1 if _fC else 0
-    ans = (a + b + c) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ  = not ans
-    _fC = a > ans
-    _fPV = ((a ^ b) < 0x80) and ((a ^ ans) > 0x7f)
-    # _fH = ((ans ^ a ^ b) & 0x10) != 0
-    _fH = ((a % 16) + (b % 16) + c) > 0x0f
-    _fN = False
-    _A[0] = ans
+    f = addflags[(c << 16) | (a << 8) | b]
+    _fZ = f & F_Z
+    _fC = f & F_C
+    _lf = _lf_table
+    _lf_f = f
+    regs[A] = (a + b + c) % 256
 
 
 # Add - alters all flags (CHECKED)
 def add_a(b):
-    global _fS, _f3, _f5, _fZ, _fC, _fPV, _fH, _fN
-    a = _A[0]
-    ans = (a + b) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ  = not ans
-    _fC = a > ans
-    _fPV = ((a ^ b) < 0x80) and ((a ^ ans) > 0x7f)
-    _fH = ((a % 16) + (b % 16)) > 0x0f
-    _fN = False
-    _A[0] = ans
-
+    global _fZ, _fC, _lf, _lf_f
+    a = regs[A]
+    f = addflags[(a << 8) | b]
+    _fZ = f & F_Z
+    _fC = f & F_C
+    _lf = _lf_table
+    _lf_f = f
+    regs[A] = (a + b) % 256
 
-# print 'add_a(%d): a=%d wans=%d ans=%d' % (b, a, wans, ans)
 
-"""
-While for SUB instruction is:
-
-if (((reg_a ^ operand) & 0x80) != 0 /* Not same sign */
-&& ((operand ^ result) & 0x80) == 0) /* Same sign */
-overflow = 1;
-else
-overflow = 0; 
-"""
 # Subtract with carry - alters all flags (CHECKED)
 def sbc_a(b):
-    global _fS, _f3, _f5, _fZ, _fC, _fPV, _fH, _fN
-    a = _A[0]
+    global _fZ, _fC, _lf, _lf_f
+    a = regs[A]
     c = 1 if _fC else 0
-    ans = (a - b - c) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ  = not ans
-    _fC = a < ans
-    _fPV = ((a ^ b) > 0x7f) and ((b ^ ans) < 0x80)
-    _fH = ((a % 16) - (b % 16) - c) < 0
-    _fN = True
-    _A[0] = ans
+    f = subflags[(c << 16) | (a << 8) | b]
+    _fZ = f & F_Z
+    _fC = f & F_C
+    _lf = _lf_table
+    _lf_f = f
+    regs[A] = (a - b - c) % 256
 
 
 # Subtract - alters all flags (CHECKED)
 def sub_a(b):
-    global _fS, _f3, _f5, _fZ, _fC, _fPV, _fH, _fN
-    a = _A[0]
-    ans = (a - b) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ  = not ans
-    _fC = a < ans
-    _fPV = ((a ^ b) > 0x7f) and ((b ^ ans) < 0x80)
-    _fH = ((a % 16) - (b % 16)) < 0
-    _fN = True
-    _A[0] = ans
-
-
-# Increment - alters all but C flag (CHECKED)
-def inc8(ans):
-    global _fS, _f3, _f5, _fN, _fZ, _fH, _fPV
-    ans = (ans + 1) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ = not ans
-    _fPV = ans == 0x80
-    _fH = not (ans % 16)
-    _fN = False
-    return ans
-
+    global _fZ, _fC, _lf, _lf_f
+    a = regs[A]
+    f = subflags[(a << 8) | b]
+    _fZ = f & F_Z
+    _fC = f & F_C
+    _lf = _lf_table
+    _lf_f = f
+    regs[A] = (a - b) % 256
 
-# Decrement - alters all but C flag (CHECKED)
-def dec8(ans):
-    global _fS, _f3, _f5, _fN, _fZ, _fH, _fPV
-    h = not (ans % 16)
-    ans = (ans - 1) %256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ = not ans
-    _fPV = ans == 0x7f
-    _fH = h
-    _fN = True
-    return ans
 
-# Add with carry - (NOT CHECKED)
+# Add with carry - alters all flags (CHECKED)
 def adc16(a, b):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH, _fPV
-    #print(f'_fC = {_fC}, a = 0x{a:4x}, b = 0x{b:4x}')
-    c = 1 if _fC else 0
-    ans = (a + b + c) % 65536
-    _fS = ans > 0x7fff
-    _f3 = (ans & F_3_16) != 0 
-    _f5 = (ans & F_5_16) != 0
+    global _fZ, _fC, _lf, _lf_a, _lf_b, _lf_ans
+    ans = a + b + (1 if _fC else 0)
+    _fC = ans > 0xffff
+    ans %= 65536
     _fZ = not ans
-    _fC = a > ans
-    _fPV = ((a ^ b) < 0x8000) and ((a ^ ans) > 0x7fff)
-    _fH = ((a % 0x1000) + (b % 0x1000) + c) > 0x0fff
-    _fH = ((ans ^ a ^ b) & 0x1000) != 0
-    _fN = False
+    _lf = _lf_adc16
+    _lf_a = a
+    _lf_b = b
+    _lf_ans = ans
     return ans
 
 
-# Add - (NOT CHECKED)
+# Add - alters 3 5 H N C flags (CHECKED)
 def add16(a, b):
-    global _f3, _f5, _fC, _fH
-    ans = (a + b) % 65536
-    _f3 = (ans & F_3_16) != 0 
+    global _f3, _f5, _fC, _fH, _fN
+    resolve_flags()
+    ans = a + b
+    _fC = ans > 0xffff
+    ans %= 65536
+    _f3 = (ans & F_3_16) != 0
     _f5 = (ans & F_5_16) != 0
-    _fC = a > ans
     _fH = ((a % 0x1000) + (b % 0x1000)) > 0x0fff
+    _fN = False
     return ans
 
 
-# Add with carry - (NOT CHECKED)
+# Subtract with carry - alters all flags (CHECKED)
 def sbc16(a, b):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH
-    c = 1 if _fC else 0
-    ans = (a - b - c) % 65536
-    _fS = ans > 0x7fff
-    _f3 = (ans & F_3_16) != 0 
-    _f5 = (ans & F_5_16) != 0
+    global _fZ, _fC, _lf, _lf_a, _lf_b, _lf_ans
+    ans = a - b - (1 if _fC else 0)
+    _fC = ans < 0
+    ans %= 65536
     _fZ = not ans
-    _fC = a < ans
-    _fPV = ((a ^ b) > 0x7fff) and ((b ^ ans) < 0x8000)
-    _fH = ((a % 0x1000) - (b % 0x1000) - c) < 0
-    _fN = True
+    _lf = _lf_sbc16
+    _lf_a = a
+    _lf_b = b
+    _lf_ans = ans
     return ans
 
 
-# TODO: check comparisons !
 # Compare - alters all flags (CHECKED)
 def cp_a(b):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH, _fPV
-    a = _A[0]
-    ans = (a - b) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fZ  = not ans
-    _fC = a < ans
-    _fPV = ((a ^ b) > 0x7f) and ((b ^ ans) < 0x80)
-    _fH = ((a % 16) - (b % 16)) < 0
-    _fN = True
+    global _fZ, _fC, _lf, _lf_f
+    f = cpflags[(regs[A] << 8) | b]
+    _fZ = f & F_Z
+    _fC = f & F_C
+    _lf = _lf_table
+    _lf_f = f
 
 
 # Bitwise and - alters all flags (CHECKED)
 def and_a(b):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH, _fPV
-    ans = _A[0] & b
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fH = True
-    _fPV = parity[ans]
+    global _fZ, _fC, _lf, _lf_f
+    ans = regs[A] & b
     _fZ = not ans
-    _fN = False
     _fC = False
-    _A[0] = ans
+    _lf = _lf_table
+    _lf_f = sz53p[ans] | F_H
+    regs[A] = ans
 
 
 # Bitwise or - alters all flags (CHECKED)
 def or_a(b):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH, _fPV
-    ans = _A[0] | b
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fH = False
-    _fPV = parity[ans]
+    global _fZ, _fC, _lf, _lf_f
+    ans = regs[A] | b
     _fZ = not ans
-    _fN = False
     _fC = False
-    _A[0] = ans
+    _lf = _lf_table
+    _lf_f = sz53p[ans]
+    regs[A] = ans
 
 
 # Bitwise exclusive or - alters all flags (CHECKED)
 def xor_a(b):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH, _fPV
-    ans = (_A[0] ^ b) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fH = False
-    _fPV = parity[ans]
+    global _fZ, _fC, _lf, _lf_f
+    ans = regs[A] ^ b
     _fZ = not ans
-    _fN = False
     _fC = False
-    _A[0] = ans
-
-
-# Test bit - alters all but C flag (CHECKED)
-def bit(b, r):
-    global _fS, _f3, _f5, _fN, _fZ, _fC, _fH, _fPV
-    bitset = (r & b) != 0
-    _fS = bitset if b == F_S else False
-    _f3 = (r & F_3) != 0
-    _f5 = (r & F_5) != 0
-    _fN = False
-    _fH = True
-    _fZ = not bitset
-    _fPV = _fZ
-
-
-# Rotate left - alters all flags (CHECKED)
-def rlc(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = ans > 0x7f
-    ans = ((ans << 1) + (0x01 if c else 0)) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Rotate left through carry - alters all flags (CHECKED)
-def rl(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = ans > 0x7F
-    ans = ((ans << 1) + (1 if _fC else 0)) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Rotate right - alters all flags (CHECKED)
-def rrc(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = (ans % 2) != 0
-    ans = ((ans >> 1) + (0x80 if c else 0)) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Rotate right through carry - alters all flags (CHECKED)
-def rr(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = (ans % 2) != 0
-    ans = ((ans >> 1) + (0x80 if _fC else 0)) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Shift Left Arithmetically - alters all flags (CHECKED)
-def sla(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = ans > 0x7f
-    ans = (ans << 1) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Shift Right Arithmetically - alters all flags (CHECKED)
-def sra(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = (ans % 2) != 0
-    b7 = 0x80 if ans > 0x7f else 0 
-    ans = ((ans >> 1) + b7) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Shift Right Logically - alters all flags (CHECKED)
-def srl(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = (ans % 2) != 0
-    ans = (ans >> 1) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
-
-
-# Shift Left and Set - alters all flags (CHECKED)
-def sls(ans):
-    global _f3, _f5, _fN, _fH, _fC, _fPV, _fZ, _fS
-    c = ans > 0x7f
-    ans = ((ans << 1) + 1) % 256
-    _fS = ans > 0x7f
-    _f3 = (ans & F_3) != 0
-    _f5 = (ans & F_5) != 0
-    _fPV = parity[ans]
-    _fZ = not ans
-    _fN = False
-    _fH = False
-    _fC = c
-    return ans
+    _lf = _lf_table
+    _lf_f = sz53p[ans]
+    regs[A] = ans
 
 
 # Quick Increment : no flags
@@ -5952,10 +2254,6 @@ def inc16(a):
     return (a + 1) % 65536
 
 
-def qinc8(a):
-    return (a + 1) % 256
-
-
 # Quick Decrement : no flags
 def dec16(a):
     return (a - 1) % 65536
@@ -5963,12 +2261,3 @@ def dec16(a):
 
 def qdec8(a):
     return (a - 1) % 256
-
-
-# Bit toggling
-def res(bit, val): 
-    return val & ~bit
-
-
-def set(bit, val): 
-    return val | bit
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Z80 core benchmark suite
+
+Runs deterministic workloads headless for a fixed number of frames
+(70000 T-states each) and reports emulated MHz, instructions per second
+and frames per second as JSON:
+
+    rom_boot      48.rom from power on to the copyright message
+    basic_prompt  48 BASIC waiting for a key, after booting unmeasured
+    ldir_fill     LDIR filling 8K of RAM over and over
+    arithmetic    8/16-bit ALU, rotates and DAA in a DJNZ loop
+    indexed       IX/IY indexed loads, ALU, INC and DDCB/FDCB bit ops
+    port_io       IN/OUT on the keyboard, border and joystick ports
+    <snapshot>    every snapshot in games/, running on its own
+
+Instructions are counted as opcode fetches on a separate interpreter run,
+so the timed runs carry no counting overhead; a repeating block
+instruction counts once. --idle turns on idle loop skipping (idle.py),
+the emulated MHz then include the skipped time. With --baseline the MHz
+figures are compared against an earlier JSON report, and a slowdown
+beyond --tolerance percent makes the exit status non-zero.
+
+python3 bench.py [--frames N] [--runs N] [--jit] [--idle] [--only NAME ...]
+                 [--output FILE] [--baseline FILE] [--tolerance PERCENT]
+'''
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import Z80
+import jit
+import idle
+import load
+
+
+ROMFILE = '48.rom'
+GAMES = 'games'
+FRAMES = 100  # 2 seconds of emulated time per workload
+RUNS = 3
+BOOT_FRAMES = 500  # give up on the copyright message after this
+PROMPT_FRAMES = 150  # the copyright message shows after 82
+
+
+class Done(Exception):
+    pass
+
+
+# ** Workloads
+def power_on():
+    Z80.Z80(3.5)
+    Z80.memory.mem[:] = bytes(65536)
+    with open(ROMFILE, 'rb') as rom:
+        rom.readinto(Z80.memory.mem)
+    Z80.reset()
+    jit.flush()
+
+
+def basic_prompt():
+    run(power_on, PROMPT_FRAMES, None, Z80.execute)
+
+
+def program(code):
+    ''' Setup running given machine code from 0x8000 '''
+    def setup():
+        power_on()
+        Z80.memory.mem[0x8000:0x8000+len(code)] = code
+        Z80.regw[Z80.PC] = 0x8000
+        Z80.regw[Z80.SP] = 0xff00
+    return setup
+
+
+def snapshot(filename):
+    def setup():
+        power_on()
+        if filename.lower().endswith('.z80'):
+            load.load_z80(filename)
+        else:
+            load.load_sna(filename)
+    return setup
+
+
+COPYRIGHT = 0x3d00 + (0x7f - 0x20) * 8  # (C) glyph in the ROM font
+
+
+def copyright_shown():
+    ''' The (C) glyph at the start of the bottom screen line '''
+    mem = Z80.memory.mem
+    return all(mem[0x50e0 + line*256] == mem[COPYRIGHT + line] for line in range(8))
+
+
+LDIR_FILL = bytes([
+    0xf3,              # di
+    0x21, 0x00, 0x60,  # loop: ld hl,0x6000
+    0x11, 0x01, 0x60,  # ld de,0x6001
+    0x01, 0xff, 0x1f,  # ld bc,0x1fff
+    0x77,              # ld (hl),a
+    0xed, 0xb0,        # ldir
+    0x3c,              # inc a
+    0x18, 0xf1,        # jr loop
+])
+
+ARITHMETIC = bytes([
+    0xf3,              # di
+    0x06, 0x00,        # outer: ld b,0
+    0x21, 0x00, 0x00,  # ld hl,0
+    0x80,              # inner: add a,b
+    0x8f,              # adc a,a
+    0x91,              # sub c
+    0x9a,              # sbc a,d
+    0xa3,              # and e
+    0xac,              # xor h
+    0xb5,              # or l
+    0xfe, 0x55,        # cp 0x55
+    0x0c,              # inc c
+    0x15,              # dec d
+    0xcb, 0x07,        # rlc a
+    0xcb, 0x1b,        # rr e
+    0x27,              # daa
+    0x09,              # add hl,bc
+    0xed, 0x52,        # sbc hl,de
+    0x10, 0xeb,        # djnz inner
+    0x18, 0xe4,        # jr outer
+])
+
+INDEXED = bytes([
+    0xf3,                    # di
+    0xdd, 0x21, 0x00, 0x90,  # outer: ld ix,0x9000
+    0xfd, 0x21, 0x00, 0xa0,  # ld iy,0xa000
+    0x06, 0x00,              # ld b,0
+    0xdd, 0x7e, 0x01,        # inner: ld a,(ix+1)
+    0xfd, 0x86, 0x02,        # add a,(iy+2)
+    0xdd, 0x77, 0x03,        # ld (ix+3),a
+    0xdd, 0x34, 0x04,        # inc (ix+4)
+    0xfd, 0xcb, 0x05, 0x46,  # bit 0,(iy+5)
+    0xdd, 0xcb, 0x06, 0xc6,  # set 0,(ix+6)
+    0xfd, 0xcb, 0x07, 0x86,  # res 0,(iy+7)
+    0xdd, 0x23,              # inc ix
+    0xfd, 0x2b,              # dec iy
+    0xdd, 0x19,              # add ix,de
+    0x10, 0xe0,              # djnz inner
+    0x18, 0xd4,              # jr outer
+])
+
+PORT_IO = bytes([
+    0xf3,              # di
+    0x01, 0xfe, 0x7f,  # ld bc,0x7ffe
+    0xdb, 0xfe,        # loop: in a,(0xfe)
+    0xd3, 0xfe,        # out (0xfe),a
+    0xed, 0x50,        # in d,(c)
+    0xed, 0x51,        # out (c),d
+    0xdb, 0x1f,        # in a,(0x1f)
+    0x18, 0xf4,        # jr loop
+])
+
+
+def workloads():
+    ''' name: (setup, frames or None for the command line count, stop condition) '''
+    found = {
+        'rom_boot': (power_on, BOOT_FRAMES, copyright_shown),
+        'basic_prompt': (basic_prompt, None, None),
+        'ldir_fill': (program(LDIR_FILL), None, None),
+        'arithmetic': (program(ARITHMETIC), None, None),
+        'indexed': (program(INDEXED), None, None),
+        'port_io': (program(PORT_IO), None, None),
+    }
+    for filename in sorted(glob.glob(os.path.join(GAMES, '*'))):
+        if filename.lower().endswith(('.sna', '.z80')):
+            found[os.path.basename(filename)] = (snapshot(filename), None, None)
+    return found
+
+
+# ** Running
+def run(setup, frames, until, execute):
+    ''' Run a workload headless, returns frames run and elapsed seconds '''
+    setup()
+    first = Z80.video_update_time
+
+    def frame(n):
+        if n - first >= frames or (until and until()):
+            raise Done()
+
+    Z80.frontend = frame
+    start = time.perf_counter()
+    try:
+        execute()
+    except Done:
+        pass
+    finally:
+        Z80.frontend = None
+    return Z80.video_update_time - first, time.perf_counter() - start
+
+
+def count_instructions(setup, frames, until):
+    ''' Number of opcodes fetched from the main table, and frames run '''
+    count = 0
+    handlers = list(Z80.main_cmds)
+
+    def counted(cmd):
+        def run():
+            nonlocal count
+            count += 1
+            return cmd()
+        return run
+
+    def counted_setup():
+        setup()
+        Z80.main_cmds[:] = [counted(cmd) for cmd in handlers]
+
+    try:
+        frames, _ = run(counted_setup, frames, until, Z80.execute)
+    finally:
+        Z80.main_cmds[:] = handlers
+    return count, frames
+
+
+def flag_tables():
+    ''' Time to build the ALU flag tables and to load them from the cache '''
+    start = time.perf_counter()
+    Z80.build_flag_tables()
+    built = time.perf_counter() - start
+    Z80.load_flag_tables()
+    start = time.perf_counter()
+    Z80.load_flag_tables()
+    return built, time.perf_counter() - start
+
+
+def benchmark(names, frames, runs, execute):
+    results = {}
+    for name, (setup, limit, until) in workloads().items():
+        if names and name not in names:
+            continue
+        # The counting run fixes the frame count, boot stops on the message
+        instructions, frames_run = count_instructions(setup, limit or frames, until)
+        elapsed = min(run(setup, frames_run, None, execute)[1] for _ in range(runs))
+        tstates = frames_run * Z80.tstatesPerInterrupt
+        results[name] = {
+            'frames': frames_run,
+            'seconds': round(elapsed, 4),
+            'mhz': round(tstates / elapsed / 1e6, 3),
+            'instructions_per_second': round(instructions / elapsed),
+            'fps': round(frames_run / elapsed, 2),
+        }
+        print(f'{name}: {results[name]["mhz"]} MHz', file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    ''' Print the MHz change per workload, returns the workloads that slowed down '''
+    slower = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        change = (result['mhz'] / before['mhz'] - 1) * 100
+        print(f'{name:40s} {before["mhz"]:8.3f} -> {result["mhz"]:8.3f} MHz {change:+6.1f}%', file=sys.stderr)
+        if change < -tolerance:
+            slower.append(name)
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Z80 core benchmark suite')
+    parser.add_argument('--frames', type=int, default=FRAMES, help='frames per workload')
+    parser.add_argument('--runs', type=int, default=RUNS, help='timed runs per workload, best is kept')
+    parser.add_argument('--jit', action='store_true', help='use the basic-block cache')
+    parser.add_argument('--idle', action='store_true', help='skip idle loops')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='run only these workloads')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=10, help='allowed slowdown in percent')
+    args = parser.parse_args()
+
+    built, loaded = flag_tables()
+    if args.idle:
+        idle.enable()
+    report = {
+        'engine': 'jit' if args.jit else 'interpreter',
+        'idle': args.idle,
+        'python': platform.python_version(),
+        'frames': args.frames,
+        'flag_tables_ms': {'build': round(built * 1000, 1), 'cached': round(loaded * 1000, 1)},
+        'workloads': benchmark(args.only, args.frames, args.runs, jit.execute if args.jit else Z80.execute),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            slower = compare(report['workloads'], json.load(baseline)['workloads'], args.tolerance)
+        if slower:
+            print('Slower: ' + ', '.join(slower), file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Flag exactness check for the Z80 ALU helpers
+
+Builds reference tables of expected result and F register straight from
+the Z80 flag definitions (signed overflow, nibble carries, bit counts),
+then runs every helper over its whole input space (16-bit ops over a
+sample) and compares the materialised F register against the tables.
+The handlers generated by opgen.py for ALU A,r, INC/DEC r and the CB
+page are run the same way, through the opcode tables, on B and (HL).
+The core has no single INC/DEC, shift or BIT helpers left beside those
+handlers, the ones checked here record flags the way it does.
+
+python3 flagcheck.py
+'''
+
+import random
+import Z80
+
+
+F_C = 0x01
+F_N = 0x02
+F_PV = 0x04
+F_3 = 0x08
+F_H = 0x10
+F_5 = 0x20
+F_Z = 0x40
+F_S = 0x80
+
+
+def signed8(v):
+    return v - 256 if v > 127 else v
+
+
+def signed16(v):
+    return v - 65536 if v > 32767 else v
+
+
+def sz53(v):
+    return (v & (F_S | F_5 | F_3)) | (F_Z if v == 0 else 0)
+
+
+def sz53p(v):
+    return sz53(v) | (F_PV if bin(v).count('1') % 2 == 0 else 0)
+
+
+# ** Reference tables, indexed by (c << 16) | (a << 8) | b, values are
+#    (result << 8) | F
+def ref_add(a, b, c):
+    ans = a + b + c
+    f = sz53(ans % 256)
+    f |= F_H if (a % 16) + (b % 16) + c > 15 else 0
+    f |= F_PV if not -128 <= signed8(a) + signed8(b) + c <= 127 else 0
+    f |= F_C if ans > 255 else 0
+    return ((ans % 256) << 8) | f
+
+
+def ref_sub(a, b, c):
+    ans = a - b - c
+    f = sz53(ans % 256) | F_N
+    f |= F_H if (a % 16) - (b % 16) - c < 0 else 0
+    f |= F_PV if not -128 <= signed8(a) - signed8(b) - c <= 127 else 0
+    f |= F_C if ans < 0 else 0
+    return ((ans % 256) << 8) | f
+
+
+def ref_cp(a, b):
+    f = ref_sub(a, b, 0) % 256
+    f = (f & ~(F_5 | F_3)) | (b & (F_5 | F_3))
+    return (a << 8) | f
+
+
+def ref_logic(ans, h):
+    return (ans << 8) | sz53p(ans) | (F_H if h else 0)
+
+
+def build_tables():
+    add, sub, cp, land, lor, lxor = [], [], [], [], [], []
+    for c in (0, 1):
+        for a in range(256):
+            for b in range(256):
+                add.append(ref_add(a, b, c))
+                sub.append(ref_sub(a, b, c))
+    for a in range(256):
+        for b in range(256):
+            cp.append(ref_cp(a, b))
+            land.append(ref_logic(a & b, True))
+            lor.append(ref_logic(a | b, False))
+            lxor.append(ref_logic(a ^ b, False))
+    return add, sub, cp, land, lor, lxor
+
+
+# ** INC/DEC r, the CB shifts and BIT as single helpers recording their
+#    flags lazily the way the core does. The generated handlers inline this,
+#    check_handlers() runs them against these
+def inc8(ans):
+    ans = (ans + 1) % 256
+    Z80._fZ = not ans
+    Z80._lf = Z80._lf_table
+    Z80._lf_f = Z80.incflags[ans]
+    return ans
+
+
+def dec8(ans):
+    ans = (ans - 1) % 256
+    Z80._fZ = not ans
+    Z80._lf = Z80._lf_table
+    Z80._lf_f = Z80.decflags[ans]
+    return ans
+
+
+def shifted(ans, c):
+    Z80._fZ = not ans
+    Z80._fC = c
+    Z80._lf = Z80._lf_table
+    Z80._lf_f = Z80.sz53p[ans]
+    return ans
+
+
+def rlc(ans):
+    return shifted(((ans << 1) | (ans >> 7)) % 256, ans > 0x7f)
+
+
+def rrc(ans):
+    return shifted((ans >> 1) | ((ans & 1) << 7), ans & 1 != 0)
+
+
+def rl(ans):
+    return shifted(((ans << 1) | (1 if Z80._fC else 0)) % 256, ans > 0x7f)
+
+
+def rr(ans):
+    return shifted((ans >> 1) | (0x80 if Z80._fC else 0), ans & 1 != 0)
+
+
+def sla(ans):
+    return shifted((ans << 1) % 256, ans > 0x7f)
+
+
+def sra(ans):
+    return shifted((ans >> 1) | (ans & 0x80), ans & 1 != 0)
+
+
+def srl(ans):
+    return shifted(ans >> 1, ans & 1 != 0)
+
+
+def sls(ans):
+    return shifted(((ans << 1) | 1) % 256, ans > 0x7f)
+
+
+SHIFTS = {'RLC': rlc, 'RRC': rrc, 'RL': rl, 'RR': rr, 'SLA': sla, 'SRA': sra, 'SRL': srl, 'SLS': sls}
+
+
+def bit(b, r):
+    Z80._fZ = not (r & b)
+    Z80._lf = Z80._lf_bit
+    Z80._lf_a = r
+    Z80._lf_b = b
+
+
+# ** Running the helpers
+def run_a(fn, a, b, c):
+    Z80.regs[Z80.A] = a
+    Z80.regs[Z80.F] = F_C if c else 0
+    Z80.setflags()
+    fn(b)
+    return (Z80.regs[Z80.A] << 8) | Z80.getflags()
+
+
+def run_r(fn, v, f):
+    Z80.regs[Z80.F] = f
+    Z80.setflags()
+    ans = fn(v)
+    return (ans << 8) | Z80.getflags()
+
+
+failures = 0
+
+
+def check(name, got, expected, *args):
+    global failures
+    if got != expected:
+        failures += 1
+        if failures <= 20:
+            print(f'{name}{args}: got res={got >> 8:02x} F={got % 256:08b}, '
+                  f'expected res={expected >> 8:02x} F={expected % 256:08b}')
+
+
+def check_8bit():
+    add, sub, cp, land, lor, lxor = build_tables()
+    for a in range(256):
+        for b in range(256):
+            i = (a << 8) | b
+            for c in (0, 1):
+                j = (c << 16) | i
+                check('ADD', run_a(Z80.add_a, a, b, c), add[i], a, b, c)
+                check('ADC', run_a(Z80.adc_a, a, b, c), add[j], a, b, c)
+                check('SUB', run_a(Z80.sub_a, a, b, c), sub[i], a, b, c)
+                check('SBC', run_a(Z80.sbc_a, a, b, c), sub[j], a, b, c)
+            check('CP', run_a(Z80.cp_a, a, b, 0), cp[i], a, b)
+            check('AND', run_a(Z80.and_a, a, b, 1), land[i], a, b)
+            check('OR', run_a(Z80.or_a, a, b, 1), lor[i], a, b)
+            check('XOR', run_a(Z80.xor_a, a, b, 1), lxor[i], a, b)
+
+
+def check_incdec():
+    for v in range(256):
+        for c in (0, F_C):
+            ans = (v + 1) % 256
+            f = sz53(ans) | c | (F_H if v % 16 == 15 else 0) | (F_PV if v == 0x7f else 0)
+            check('INC', run_r(inc8, v, c), (ans << 8) | f, v, c)
+            ans = (v - 1) % 256
+            f = sz53(ans) | c | F_N | (F_H if v % 16 == 0 else 0) | (F_PV if v == 0x80 else 0)
+            check('DEC', run_r(dec8, v, c), (ans << 8) | f, v, c)
+
+
+def check_shifts():
+    for v in range(256):
+        for c in (0, 1):
+            ops = {
+                'RLC': ((v << 1) | (v >> 7), v >> 7),
+                'RRC': ((v >> 1) | ((v & 1) << 7), v & 1),
+                'RL': ((v << 1) | c, v >> 7),
+                'RR': ((v >> 1) | (c << 7), v & 1),
+                'SLA': (v << 1, v >> 7),
+                'SRA': ((v >> 1) | (v & 0x80), v & 1),
+                'SRL': (v >> 1, v & 1),
+                'SLS': ((v << 1) | 1, v >> 7),
+            }
+            for name, (ans, cout) in ops.items():
+                ans %= 256
+                expected = (ans << 8) | sz53p(ans) | cout
+                check(name, run_r(SHIFTS[name], v, c), expected, v, c)
+
+
+def check_accumulator_rotates():
+    for v in range(256):
+        for f in (0, F_C, F_S | F_Z | F_PV | F_H | F_N, 0xff):
+            c = f & F_C
+            ops = {
+                Z80.rlca: ((v << 1) | (v >> 7), v >> 7),
+                Z80.rrca: ((v >> 1) | ((v & 1) << 7), v & 1),
+                Z80.rla: ((v << 1) | c, v >> 7),
+                Z80.rra: ((v >> 1) | (c << 7), v & 1),
+            }
+            for fn, (ans, cout) in ops.items():
+                ans %= 256
+                Z80.regs[Z80.A] = v
+                Z80.regs[Z80.F] = f
+                Z80.setflags()
+                fn()
+                got = (Z80.regs[Z80.A] << 8) | Z80.getflags()
+                expected = (ans << 8) | (f & (F_S | F_Z | F_PV)) | (ans & (F_5 | F_3)) | cout
+                check(fn.__name__.upper(), got, expected, v, f)
+
+
+def check_bit():
+    for v in range(256):
+        for n in range(8):
+            for c in (0, F_C):
+                set_ = (v >> n) & 1
+                f = F_H | c | (v & (F_5 | F_3))
+                f |= 0 if set_ else F_Z | F_PV
+                f |= F_S if n == 7 and set_ else 0
+                Z80.regs[Z80.F] = c
+                Z80.setflags()
+                bit(1 << n, v)
+                check('BIT', Z80.getflags(), f, n, v, c)
+
+
+def check_daa():
+    for a in range(256):
+        for f in range(0, 256):
+            if f & ~(F_N | F_H | F_C):
+                continue
+            n, h, c = f & F_N, f & F_H, f & F_C
+            diff = 0
+            cout = c
+            if h or a % 16 > 9:
+                diff |= 0x06
+            if c or a > 0x99:
+                diff |= 0x60
+                cout = F_C
+            ans = (a - diff if n else a + diff) % 256
+            if n:
+                hout = F_H if h and a % 16 < 6 else 0
+            else:
+                hout = F_H if a % 16 > 9 else 0
+            expected = (ans << 8) | sz53p(ans) | n | hout | cout
+            Z80.regs[Z80.A] = a
+            Z80.regs[Z80.F] = f
+            Z80.setflags()
+            Z80.daa()
+            check('DAA', (Z80.regs[Z80.A] << 8) | Z80.getflags(), expected, a, f)
+
+
+def run_op(table, op, operand, v, a, f):
+    ''' Run an opcode handler on v in B (operand 0) or in (HL) (operand 6) '''
+    Z80.regs[Z80.A] = a
+    Z80.regs[Z80.F] = f
+    Z80.regw[Z80.HL] = 0x8000
+    Z80.regs[Z80.B] = v
+    Z80.memory.mem[0x8000] = v
+    Z80.setflags()
+    table[op]()
+    ans = Z80.memory.mem[0x8000] if operand == 6 else Z80.regs[Z80.B]
+    return ans, Z80.regs[Z80.A], Z80.getflags()
+
+
+def check_handlers():
+    add, sub, cp, land, lor, lxor = build_tables()
+    alu = (('ADD', add, 0), ('ADC', add, 1), ('SUB', sub, 0), ('SBC', sub, 1),
+           ('AND', land, 0), ('XOR', lxor, 0), ('OR', lor, 0), ('CP', cp, 0))
+    shifts = ('RLC', 'RRC', 'RL', 'RR', 'SLA', 'SRA', 'SLS', 'SRL')
+    for operand in (0, 6):
+        for a in range(256):
+            for b in range(256):
+                for c in (0, 1):
+                    for n, (name, table, carry) in enumerate(alu):
+                        _, ans, f = run_op(Z80.main_cmds, 0x80 + n * 8 + operand, operand, b, a, c)
+                        expected = table[(carry * c << 16) | (a << 8) | b]
+                        check(name + 'OP', (ans << 8) | f, expected, operand, a, b, c)
+        for v in range(256):
+            for c in (0, F_C):
+                for n, (name, helper) in enumerate((('INC', inc8), ('DEC', dec8))):
+                    ans, _, f = run_op(Z80.main_cmds, 0x04 + n + operand * 8, operand, v, 0, c)
+                    check(name + 'OP', (ans << 8) | f, run_r(helper, v, c), operand, v, c)
+                for n, name in enumerate(shifts):
+                    ans, _, f = run_op(Z80._cbcmds, n * 8 + operand, operand, v, 0, c)
+                    check(name + 'OP', (ans << 8) | f, run_r(SHIFTS[name], v, c), operand, v, c)
+                for n in range(8):
+                    _, _, f = run_op(Z80._cbcmds, 0x40 + n * 8 + operand, operand, v, 0, c)
+                    Z80.regs[Z80.F] = c
+                    Z80.setflags()
+                    bit(1 << n, v)
+                    check('BITOP', f, Z80.getflags(), operand, n, v, c)
+                    ans, _, _ = run_op(Z80._cbcmds, 0x80 + n * 8 + operand, operand, v, 0, c)
+                    check('RESOP', ans << 8, (v & ~(1 << n)) << 8, operand, n, v)
+                    ans, _, _ = run_op(Z80._cbcmds, 0xc0 + n * 8 + operand, operand, v, 0, c)
+                    check('SETOP', ans << 8, (v | (1 << n)) << 8, operand, n, v)
+
+
+def check_16bit():
+    rnd = random.Random(0x280)
+    edges = [0, 1, 0x7f, 0x80, 0xff, 0x100, 0x0fff, 0x1000, 0x7fff, 0x8000, 0x8001, 0xfffe, 0xffff]
+    values = edges + [rnd.randrange(65536) for _ in range(120)]
+    for a in values:
+        for b in values:
+            for c in (0, 1):
+                for name, fn, sign in (('ADC16', Z80.adc16, 1), ('SBC16', Z80.sbc16, -1)):
+                    ans = a + sign * (b + c)
+                    s = signed16(a) + sign * (signed16(b) + c)
+                    r = ans % 65536
+                    f = (F_S if r > 0x7fff else 0) | (F_Z if r == 0 else 0) | ((r >> 8) & (F_5 | F_3))
+                    f |= F_H if (a ^ b ^ r) & 0x1000 else 0
+                    f |= F_PV if not -32768 <= s <= 32767 else 0
+                    f |= F_N if sign < 0 else 0
+                    f |= F_C if not 0 <= ans <= 0xffff else 0
+                    Z80.regs[Z80.F] = c
+                    Z80.setflags()
+                    got = fn(a, b)
+                    check(name, (got << 8) | Z80.getflags(), (r << 8) | f, a, b, c)
+
+                preserved = F_S | F_Z | F_PV if c else 0
+                r = (a + b) % 65536
+                f = preserved | ((r >> 8) & (F_5 | F_3))
+                f |= F_H if (a % 0x1000) + (b % 0x1000) > 0xfff else 0
+                f |= F_C if a + b > 0xffff else 0
+                Z80.regs[Z80.F] = preserved | F_N
+                Z80.setflags()
+                got = Z80.add16(a, b)
+                check('ADD16', (got << 8) | Z80.getflags(), (r << 8) | f, a, b, c)
+
+
+if __name__ == '__main__':
+    check_8bit()
+    check_incdec()
+    check_shifts()
+    check_accumulator_rotates()
+    check_bit()
+    check_daa()
+    check_16bit()
+    check_handlers()
+    print('FAILED: %d mismatches' % failures if failures else 'OK')
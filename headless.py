@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+'''
+Headless frontend: runs the Z80 core with no window, no keyboard polling
+and no pygame at all, as fast as the host allows. Frames can be saved as
+PNG files every N frames or on request with save_frame().
+
+    import Z80, load, headless
+    Z80.Z80(3.5)
+    ... load ROM and snapshot ...
+    headless.run(500, every=50, directory='shots')
+'''
+
+import os
+import struct
+import time
+import zlib
+import Z80
+import render
+
+
+class FramesDone(Exception):
+    pass
+
+
+stop_at = 0
+dump_every = 0
+dump_dir = '.'
+
+
+def frame(n):
+    ''' Z80 frontend hook, called on every interrupt with the frame number '''
+    if dump_every and not (n % dump_every):
+        save_frame(os.path.join(dump_dir, f'frame{n:06d}.png'))
+    if n == stop_at:
+        raise FramesDone()
+
+
+def save_frame(filename):
+    ''' Write the current screen with border to a PNG file '''
+    width, height = render.FULL_SCREEN_WIDTH, render.FULL_SCREEN_HEIGHT
+    pixels = render.full_frame(Z80.ports.current_border)
+    rows = b''.join(b'\0' + pixels[y*width : (y+1)*width] for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    with open(filename, 'wb') as png:
+        png.write(b'\x89PNG\r\n\x1a\n')
+        png.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)))
+        png.write(chunk(b'PLTE', bytes(c for color in render.COLORS for c in color)))
+        png.write(chunk(b'IDAT', zlib.compress(rows)))
+        png.write(chunk(b'IEND', b''))
+
+
+def run(frames=0, every=0, directory='.', execute=None):
+    '''
+    Run for given number of frames, 0 runs until interrupted, saving a frame
+    into directory every given number of frames. Returns the number of
+    frames run and the elapsed time in seconds
+    '''
+    global stop_at, dump_every, dump_dir
+    dump_every, dump_dir = every, directory
+    first = Z80.video_update_time
+    stop_at = first + frames if frames else -1
+    if dump_every:
+        os.makedirs(dump_dir, exist_ok=True)
+
+    Z80.frontend = frame
+    start = time.perf_counter()
+    try:
+        (execute or Z80.execute)()
+    except (FramesDone, KeyboardInterrupt):
+        pass
+    return Z80.video_update_time - first, time.perf_counter() - start
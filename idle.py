@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+'''
+Idle loop detection
+
+Menus and the BASIC editor spend most of their time in short loops
+waiting for the frame interrupt to change something: a key in the ROM's
+keyboard variables, a frame counter, a port. Once a pass round such a
+loop ends with registers, flags and memory exactly as it started, and
+wrote no port on the way, every pass up to the next scheduled event is
+the same, so the clock skips ahead by whole passes the way HALT does. The last, partial pass and the
+interrupt itself run as usual, so the results match running the loop.
+
+Loops are watched where a JR, JR cc, JP or JP cc jumps back. The first
+time a jump lands on the same target with the same registers, memory is
+copied; if the next pass finds registers and memory unchanged, with no
+event in between, the loop is idle. A loop that turns out to change
+memory or write a port (OUT, OTIR...: ports.port_out is wrapped to count
+the writes) is left alone until the next event.
+
+Usage: call idle.enable() before Z80.execute() or jit.execute() start
+(before the block cache has compiled anything), idle.disable() to stop.
+'''
+
+import functools
+import Z80
+import memory
+import ports
+
+
+MAX_PASS = 20000  # longest pass in T-states still taken for a loop
+_JUMPS = (0x18, 0x20, 0x28, 0x30, 0x38, 0xc2, 0xc3, 0xca, 0xd2, 0xda, 0xe2, 0xea, 0xf2, 0xfa)
+
+skipped = 0  # T-states skipped so far
+# Loop target: [registers, T-state at the loop head, event base, M1 cycles, flags
+# and the rest of cpu_state(), memory, port writes], memory is None before
+# the first repeat and False for loops writing it or a port
+_watches = {}
+_last_head = 0
+_handlers = []
+_port_writes = 0
+_port_out = None  # ports.port_out while wrapped
+
+
+def cpu_state():
+    ''' Flags and the rest of what decides a pass, beside the registers A to IY '''
+    return Z80.getflags(), Z80.regs[Z80.I], Z80._R7_b, Z80._IFF1, Z80._IFF2, Z80._IM
+
+
+def fast_forward(t):
+    ''' At a loop head reached by a jump taking t T-states, returns the T-states to skip '''
+    global skipped, _last_head
+    target = Z80.regw[Z80.PC]
+    head = Z80.tstates_now() + t
+    if head < _last_head:
+        _watches.clear()  # the clock went back: reset
+    _last_head = head
+    # F is only up to date after getflags(), so it is left to cpu_state()
+    registers = bytes(Z80.regs[Z80.A:Z80.R])
+    watch = _watches.get(target)
+    if watch is None or watch[0] != registers or watch[2] != Z80.tstates_base or head - watch[1] > MAX_PASS:
+        if len(_watches) > 256:
+            _watches.clear()
+        _watches[target] = [registers, head, Z80.tstates_base, 0, None, None, 0]
+        return 0
+    if watch[5] is False:
+        return 0
+    state = cpu_state()
+    if watch[5] is None or watch[4] != state:
+        # Registers repeat: time the next pass from here
+        watch[1:] = head, Z80.tstates_base, Z80.m1_cycles, state, bytes(memory.mem), _port_writes
+        return 0
+    if watch[6] != _port_writes or watch[5] != memory.mem:
+        watch[5] = False
+        return 0
+
+    period = head - watch[1]
+    count = (-(Z80.local_tstates + t) - 1) // period
+    if count <= 0:
+        return 0
+    Z80.m1_cycles += (Z80.m1_cycles - watch[3]) * count
+    del _watches[target]
+    skipped += period * count
+    return period * count
+
+
+def looping(jump):
+    ''' Jump handler checking for an idle loop whenever it jumps back '''
+    @functools.wraps(jump)
+    def handler():
+        pc = Z80.regw[Z80.PC]
+        t = jump()
+        if Z80.regw[Z80.PC] < pc:
+            return t + fast_forward(t)
+        return t
+    return handler
+
+
+def counted_out(portnum, data):
+    ''' ports.port_out counting the writes, a pass writing a port is not idle '''
+    global _port_writes
+    _port_writes += 1
+    _port_out(portnum, data)
+
+
+def reading_r(ldar):
+    ''' LD A,R, the one way a pass can see R: forget all loops '''
+    @functools.wraps(ldar)
+    def handler():
+        _watches.clear()
+        return ldar()
+    return handler
+
+
+def enable():
+    global _last_head, _port_out
+    if _handlers:
+        return
+    _watches.clear()
+    _last_head = 0
+    _port_out, ports.port_out = ports.port_out, counted_out
+    for op in _JUMPS:
+        _handlers.append((Z80.main_cmds, op, Z80.main_cmds[op]))
+        Z80.main_cmds[op] = looping(Z80.main_cmds[op])
+    _handlers.append((Z80._edcmds, 0x5f, Z80._edcmds[0x5f]))
+    Z80._edcmds[0x5f] = reading_r(Z80._edcmds[0x5f])
+
+
+def disable():
+    global _port_out
+    for table, op, handler in _handlers:
+        table[op] = handler
+    _handlers.clear()
+    if _port_out is not None:
+        ports.port_out, _port_out = _port_out, None
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+'''
+Basic-block translation cache for the Z80 core
+
+Straight-line runs of Z80 code are decoded once into generated Python
+functions that call the opcode handlers directly, skipping the per
+instruction fetch, table dispatch and R/interrupt bookkeeping of
+Z80.execute(). Blocks are cached by start address. ROM blocks stay valid
+forever; blocks in RAM are dropped when memory.pokeb/pokew/block_copy
+write over one of the opcode bytes they were decoded from, and end after
+the first instruction that may write memory so self modifying code is
+seen on the next fetch.
+
+A block is only entered when all its instructions are guaranteed to
+finish before the next scheduled event is due, otherwise a single
+instruction is interpreted, so timing and results match the interpreter.
+
+Usage: call jit.execute() instead of Z80.execute(), and jit.flush()
+after loading a snapshot straight into memory.
+'''
+
+import Z80
+import memory
+
+
+MAX_BLOCK = 32  # instructions per block
+MAX_TSTATES = 23  # longest instruction that can sit inside a block
+
+# ** Instruction lengths
+# Opcodes followed by a byte operand
+_N = {0x06, 0x0e, 0x16, 0x1e, 0x26, 0x2e, 0x36, 0x3e,
+      0xc6, 0xce, 0xd6, 0xde, 0xe6, 0xee, 0xf6, 0xfe,
+      0xd3, 0xdb, 0x10, 0x18, 0x20, 0x28, 0x30, 0x38}
+# Opcodes followed by a word operand
+_NN = {0x01, 0x11, 0x21, 0x31, 0x22, 0x2a, 0x32, 0x3a,
+       0xc2, 0xc3, 0xca, 0xd2, 0xda, 0xe2, 0xea, 0xf2, 0xfa,
+       0xc4, 0xcc, 0xcd, 0xd4, 0xdc, 0xe4, 0xec, 0xf4, 0xfc}
+# DD/FD opcodes taking an (IX+d) displacement
+_D = {0x34, 0x35, 0x36, 0x46, 0x4e, 0x56, 0x5e, 0x66, 0x6e, 0x7e,
+      0x70, 0x71, 0x72, 0x73, 0x74, 0x75, 0x77,
+      0x86, 0x8e, 0x96, 0x9e, 0xa6, 0xae, 0xb6, 0xbe}
+# ED opcodes followed by a word operand
+_EDNN = {0x43, 0x4b, 0x53, 0x5b, 0x63, 0x6b, 0x73, 0x7b}
+
+main_length = bytes(3 if op in _NN else 2 if op in _N else 1 for op in range(256))
+id_length = bytes(main_length[op] + (1 if op in _D else 0) for op in range(256))
+ed_length = bytes(4 if op in _EDNN else 2 for op in range(256))
+
+
+# ** Handler properties
+# Anything touching these ends a block: it jumps, or it looks at or
+# advances the T-state counter itself
+_ENDS = {'PC', 'poppc', 'incpcsb', 'pushpc', 'local_tstates', 'run_events'}
+_WRITES = {'pokeb', 'pokew', 'block_copy'}
+# Handlers reading PC, or running events that may push it
+_USES_PC = {'PC', 'run_events'}
+# Handlers moving the clock themselves
+_CLOCK = {'local_tstates', 'run_events'}
+# Handlers reading or setting R, which needs the M1 cycles up to date
+_REFRESH = {'getr', 'setr'}
+_names = {}
+
+
+def names(fn):
+    ''' Every global and attribute name a Z80 function uses, helpers included '''
+    if fn not in _names:
+        _names[fn] = found = set()
+        stack = [fn.__code__]
+        while stack:
+            code = stack.pop()
+            found.update(code.co_names)
+            stack.extend(c for c in code.co_consts if hasattr(c, 'co_names'))
+        for name in list(found):
+            helper = Z80.__dict__.get(name)
+            if callable(helper) and hasattr(helper, '__code__') and helper is not fn:
+                found |= names(helper)
+    return _names[fn]
+
+
+def ends_block(fn):
+    return bool(_ENDS.intersection(fn.__code__.co_names))
+
+
+def uses_pc(fn):
+    return bool(_USES_PC & names(fn))
+
+
+def writes(fn):
+    return bool(_WRITES & names(fn))
+
+
+def moves_clock(fn):
+    return bool(_CLOCK & names(fn))
+
+
+def uses_r(fn):
+    return bool(_REFRESH & names(fn))
+
+
+# ** Cache
+blocks = {}
+# Opcode bytes in RAM that cached blocks were decoded from
+code = bytearray(65536)
+owners = {}
+baked = {}
+
+
+def decode(pc):
+    '''
+    Decode one instruction at pc into
+    (handler, length, r increments, pc to set before the call,
+     bytes the decoding depends on, ends block, writes memory)
+    '''
+    mem = memory.mem
+    op = mem[pc]
+    if op == 0xcb:
+        fn = Z80._cbcmds[mem[(pc + 1) % 65536]]
+        return fn, 2, 2, pc + 2, 2, False, writes(fn)
+    if op == 0xed:
+        op2 = mem[(pc + 1) % 65536]
+        fn = Z80._edcmds[op2]
+        return fn, ed_length[op2], 1, pc + 2, 2, ends_block(fn), writes(fn)
+    if op in (0xdd, 0xfd):
+        op2 = mem[(pc + 1) % 65536]
+        fn = (Z80._ixcmds if op == 0xdd else Z80._iycmds)[op2]
+        if op2 == 0xcb:
+            # ixcb/iycb fetch the displacement and the opcode themselves
+            return fn, 4, 3, pc + 2, 2, False, True
+        return fn, id_length[op2] + 1, 3, pc + 2, 2, ends_block(fn), writes(fn)
+    fn = Z80.main_cmds[op]
+    return fn, main_length[op], 1, pc + 1, 1, ends_block(fn), writes(fn)
+
+
+def compile_block(start):
+    ''' Translate the block at start into a function, returns (limit, run) '''
+    lines = []
+    handlers = []
+    opcodes = []
+    ram = False
+    pc = start
+    r = 0  # M1 cycles not added yet
+    add_r = 0  # where to add them: up front, or after the last LD R,A / LD A,R
+    count = 0
+    while True:
+        fn, length, dr, fetched, used, ends, wr = decode(pc)
+        for addr in range(pc, pc + used):
+            opcodes.append(addr % 65536)
+            ram = ram or addr % 65536 >= memory.ram_start
+        if uses_pc(fn):
+            lines.append(f'regw[PC] = {fetched % 65536}')
+        r += dr
+        if uses_r(fn):
+            lines.append(f'm1_cycles += {r}')
+            r = 0
+        if moves_clock(fn):
+            # local_tstates is only read back after the handler returns
+            lines.append(f't = h{count}()')
+            lines.append('local_tstates += t')
+        else:
+            lines.append(f'local_tstates += h{count}()')
+        handlers.append(fn)
+        if uses_r(fn):
+            add_r = len(lines)
+        count += 1
+        pc += length
+        if ends or (ram and wr) or count == MAX_BLOCK or pc > 0xffff:
+            break
+        if pc >= memory.ram_start and not ram:
+            break  # ROM blocks stop where RAM starts
+    if not ends:
+        lines.append(f'regw[PC] = {pc % 65536}')
+    if r:
+        lines.insert(add_r, f'm1_cycles += {r}')
+
+    args = ', '.join(f'h{i}' for i in range(count))
+    body = '\n        '.join(lines)
+    source = (
+        f'def make({args}):\n'
+        f'    def block_{start:04x}():\n'
+        f'        global local_tstates, m1_cycles\n'
+        f'        {body}\n'
+        f'    return block_{start:04x}\n')
+    scope = {}
+    exec(compile(source, f'<block {start:04x}>', 'exec'), Z80.__dict__, scope)
+    block = (-MAX_TSTATES * (count - 1), scope['make'](*handlers))
+
+    blocks[start] = block
+    if ram:
+        baked[start] = opcodes
+        for addr in opcodes:
+            owners.setdefault(addr, set()).add(start)
+            code[addr] = 1
+    return block
+
+
+def invalidate(addr):
+    ''' Drop every block decoded from the opcode byte at addr '''
+    for start in owners.pop(addr, ()):
+        del blocks[start]
+        for a in baked.pop(start):
+            users = owners.get(a)
+            if users is not None:
+                users.discard(start)
+                if not users:
+                    del owners[a]
+                    code[a] = 0
+    code[addr] = 0
+
+
+def flush():
+    ''' Forget all blocks, for memory changed behind the memory functions' back '''
+    blocks.clear()
+    owners.clear()
+    baked.clear()
+    code[:] = bytes(65536)
+
+
+# ** Memory writes with invalidation
+_pokeb = memory.pokeb
+_pokew = memory.pokew
+_block_copy = memory.block_copy
+
+
+def pokeb(addr, byte):
+    if code[addr] and memory.mem[addr] != byte:
+        invalidate(addr)
+    _pokeb(addr, byte)
+
+
+def pokew(addr, word):
+    if code[addr] and memory.mem[addr] != word % 256:
+        invalidate(addr)
+    hi = (addr + 1) % 65536
+    if code[hi] and memory.mem[hi] != word >> 8:
+        invalidate(hi)
+    _pokew(addr, word)
+
+
+def block_copy(dst, src, count, step=1):
+    low = dst if step > 0 else dst - count + 1
+    if 0 <= low and low + count <= 65536:
+        addr = code.find(1, low, low + count)
+        while addr >= 0:
+            invalidate(addr)
+            addr = code.find(1, addr + 1, low + count)
+    # else wrapping round, copied byte by byte through pokeb
+    _block_copy(dst, src, count, step)
+
+
+def execute():
+    ''' Z80.execute() running cached blocks '''
+    memory.pokeb = pokeb
+    memory.pokew = pokew
+    memory.block_copy = block_copy
+    regw = Z80.regw
+    PC = Z80.PC
+    get = blocks.get
+    try:
+        while True:
+            if Z80.local_tstates >= 0:
+                Z80.run_events()
+            block = get(regw[PC]) or compile_block(regw[PC])
+            if Z80.local_tstates < block[0]:
+                block[1]()
+            else:
+                Z80.step()
+    finally:
+        memory.pokeb = _pokeb
+        memory.pokew = _pokew
+        memory.block_copy = _block_copy
@@ -1,5 +1,9 @@
+import queue
+import threading
 import pygame
 from pygame.locals import *
+from ports import keyboard, joy, keys_changed
+import Z80
 
 b4 = 0x10
 b3 = 0x08
@@ -7,9 +11,6 @@ b2 = 0x04
 b1 = 0x02
 b0 = 0x01
 
-keyboard = [0xff] * 8
-joy = [0]
-
 _B_SPC = 0
 _H_ENT = 1
 _Y_P = 2
@@ -30,6 +31,7 @@ def reset_keyboard():
     keyboard[_Q_T] = 0xff
     keyboard[_A_G] = 0xff
     keyboard[_CAPS_V] = 0xff
+    keys_changed()
 
     joy = [0]
 
@@ -84,16 +86,74 @@ signals = {
 }
 
 
+# Input: only key, quit and window expose events reach the queue, everything
+# else is dropped by SDL. The Kempston joystick is the numeric keypad, so
+# joystick events are left out too. do_keys() reads them once a frame from
+# the video frontend, always on the main thread, which owns the window.
+# With init(threaded=True) it hands each batch to an input thread, which
+# drops the keys nothing is mapped to, and applies what the thread sorted
+# up to then. Headless runs never import this module
+EXPOSED = [getattr(pygame, name) for name in ('VIDEOEXPOSE', 'WINDOWEXPOSED', 'WINDOWSHOWN', 'WINDOWRESTORED')
+           if hasattr(pygame, name)]
+ALLOWED = [KEYDOWN, KEYUP, QUIT] + EXPOSED
+# Keys do_key() does something with
+KEYS = set(signals) | {K_F9, K_TAB, K_BACKSPACE, K_LEFT, K_DOWN, K_UP, K_RIGHT,
+                       K_KP8, K_KP2, K_KP4, K_KP6, K_KP0}
+_batches = None  # events read on the main thread, for the input thread
+_events = None  # sorted by the input thread, None when polling
+# Called when the window needs painting again, set by the video frontend
+exposed = None
+
+
+def init(threaded=False):
+    ''' Call after pygame.init() '''
+    global _batches, _events
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(ALLOWED)
+    if threaded and _events is None:
+        _batches, _events = queue.SimpleQueue(), queue.SimpleQueue()
+        threading.Thread(target=collect, name='input', daemon=True).start()
+
+
+def collect():
+    ''' Input thread: no pygame calls here, SDL events belong to the main thread '''
+    while True:
+        for event in _batches.get():
+            if event.type not in (KEYDOWN, KEYUP) or event.key in KEYS:
+                _events.put(event)
+
+
+def pending():
+    ''' Events the input thread sorted up to now '''
+    while True:
+        try:
+            yield _events.get_nowait()
+        except queue.Empty:
+            return
+
+
 def do_keys():
-    pygame.event.pump()
-    mods = pygame.key.get_mods()
-    for event in pygame.event.get():
-        if event.type == pygame.KEYDOWN:
-            do_key(True, event.key, mods)
-        elif event.type == pygame.KEYUP:
-            do_key(False, event.key, mods)
-        elif event.type == pygame.QUIT:
+    events = pygame.event.get()
+    if _events is not None:
+        if events:
+            _batches.put(events)
+        events = pending()
+    for event in events:
+        if event.type == KEYDOWN:
+            if event.key == K_F9:
+                toggle_trace()
+            do_key(True, event.key, event.mod)
+        elif event.type == KEYUP:
+            do_key(False, event.key, event.mod)
+        elif event.type == QUIT:
             raise KeyboardInterrupt()
+        elif event.type in EXPOSED and exposed is not None:
+            exposed()
+
+
+# F9 switches the interpreter between its fast and traced run loops
+def toggle_trace():
+    Z80.run_loop = Z80.run_fast if Z80.run_loop is Z80.run_traced else Z80.run_traced
 
 
 def do_key(down, scan_code, mods):
@@ -173,6 +233,7 @@ def do_key(down, scan_code, mods):
         else:
             sig = signals[K_LCTRL]
             keyboard[sig[0]] |= sig[1]
+        keys_changed()
 
     except KeyError:
         pass
@@ -47,21 +47,24 @@ def load_z80(name):
         z80file = f.read()
     mz80file = memoryview(z80file)
 
-    Z80._A[0], Z80._F[0], Z80._BC[0], Z80._HL[0], Z80._PC[0], Z80._SP[0], Z80._I[0], Z80.R, tbyte, Z80._DE[0], \
-    Z80._BC_[0], Z80._DE_[0], Z80._HL_[0], Z80._A_[0], Z80._F_[0], Z80._IY[0], Z80._IX[0], iff1, iff2, im = _z80_header.unpack_from(mz80file, 0)
+    regs, regw, alt = Z80.regs, Z80.regw, Z80.ALT
+    regs[Z80.A], regs[Z80.F], regw[Z80.BC], regw[Z80.HL], regw[Z80.PC], regw[Z80.SP], regs[Z80.I], r, tbyte, regw[Z80.DE], \
+    regw[Z80.BC+alt//2], regw[Z80.DE+alt//2], regw[Z80.HL+alt//2], regs[Z80.A+alt], regs[Z80.F+alt], regw[Z80.IY], regw[Z80.IX], \
+    iff1, iff2, im = _z80_header.unpack_from(mz80file, 0)
     Z80.setflags()
     
     if tbyte == 255:
         tbyte = 1
 
-    Z80.outb(254, ((tbyte >> 1) % 8))  # border
+    Z80.ports.port_out(254, ((tbyte >> 1) % 8))  # border
 
-    if (tbyte % 2) != 0:
-        Z80._R = Z80._R | 0x80
+    regs[Z80.R] = (r % 128) | (0x80 if (tbyte % 2) != 0 else 0)
+    Z80.setr()
 
     compressed = ((tbyte & 0x20) != 0)
     Z80._IFF1 = iff1 != 0
     Z80._IFF2 = iff2 != 0
+    Z80._halted = False
 
     im = im & 0x03
     if im == 0:
@@ -71,17 +74,19 @@ def load_z80(name):
     else:
         Z80._IM = Z80.IM2
 
-    if Z80._PC[0] == 0:
+    if regw[Z80.PC] == 0:
         load_z80_extended(mz80file[30:])
+        Z80.memory.screen_changed()
         return
 
-    # Old format Z80 snapshot
-    load_z80_block(mz80file[30:], 16384, compressed)
+    # Old format Z80 snapshot, compressed data ends with 00 ED ED 00
+    load_z80_block(mz80file[30:-4] if compressed else mz80file[30:], 16384, compressed)
+    Z80.memory.screen_changed()
 
 
 def load_z80_extended(mz80file):
-    z80_type, Z80._PC[0], zx_type = struct.unpack_from('<HHB', mz80file, 0)
-    print(f'first byte: {z80_type}, PC: {Z80._PC[0]}')
+    z80_type, Z80.regw[Z80.PC], zx_type = struct.unpack_from('<HHB', mz80file, 0)
+    print(f'first byte: {z80_type}, PC: {Z80.regw[Z80.PC]}')
     if z80_type == 23:  # V2.01
         print('Z80 (v201)')
         """
@@ -210,12 +215,15 @@ def load_sna(name):
     with open(name, 'rb') as f:
         snafile = f.read()
     msnafile = memoryview(snafile)
-    Z80._I[0], \
-    Z80._HL_[0], Z80._DE_[0], Z80._BC_[0], Z80._AF_[0], \
-    Z80._HL[0], Z80._DE[0], Z80._BC[0], Z80._IY[0], Z80._IX[0], \
-    iff2, Z80._R, Z80._AF[0], Z80._SP[0], im, border = _sna_struct.unpack_from(msnafile, 0)
+    regs, regw, alt = Z80.regs, Z80.regw, Z80.ALT
+    regs[Z80.I], \
+    regw[Z80.HL+alt//2], regw[Z80.DE+alt//2], regw[Z80.BC+alt//2], regw[Z80.AF+alt//2], \
+    regw[Z80.HL], regw[Z80.DE], regw[Z80.BC], regw[Z80.IY], regw[Z80.IX], \
+    iff2, regs[Z80.R], regw[Z80.AF], regw[Z80.SP], im, border = _sna_struct.unpack_from(msnafile, 0)
+    Z80.setr()
     Z80._IFF2 = (iff2 & 0b100) != 0
     Z80._IFF1 = Z80._IFF2
+    Z80._halted = False
     if im == 0:
         Z80._IM = Z80.IM0
     elif im == 1:
@@ -225,4 +233,5 @@ def load_sna(name):
     Z80.setflags()
     Z80.ports.port_out(254, (border % 8))  # border
     Z80.memory.mem[16384:] = msnafile[27:]
+    Z80.memory.screen_changed()
     Z80.poppc()
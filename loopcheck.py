@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Run loop consistency check
+
+Runs the same program under run_fast, run_traced and run_breakpoints and
+compares the clock, the registers and memory after every frame. The
+program keeps the block instructions (LDIR, LDDR, CPIR, CPDR, INIR, OTIR)
+busy with interrupts off, so their runs cross events and the loops have
+to read the clock back after the handlers move it.
+
+python3 loopcheck.py
+'''
+
+import contextlib
+import hashlib
+import io
+import Z80
+
+
+FRAMES = 4
+
+# At 0x8000, looping forever:
+#   DI
+#   LD HL,4000h : LD DE,4001h : LD BC,1AFFh : LD (HL),A : LDIR
+#   LD HL,5AFFh : LD DE,5AFEh : LD BC,1AFFh : LDDR
+#   LD HL,4000h : LD BC,1B00h : CPIR
+#   LD HL,5AFFh : LD BC,1B00h : CPDR
+#   LD HL,6000h : LD BC,02FEh : INIR
+#   LD HL,6000h : LD BC,02FEh : OTIR
+#   INC A : JR loop
+PROGRAM = bytes.fromhex(
+    'f3'
+    '210040' '110140' '01ff1a' '77' 'edb0'
+    '21ff5a' '11fe5a' '01ff1a' 'edb8'
+    '210040' '01001b' 'edb1'
+    '21ff5a' '01001b' 'edb9'
+    '210060' '01fe02' 'edb2'
+    '210060' '01fe02' 'edb3'
+    '3c' '18')
+PROGRAM += bytes([(1 - len(PROGRAM) - 1) % 256])  # back to the first LD
+
+
+class Done(Exception):
+    pass
+
+
+def frame(n):
+    states.append((n, Z80.tstates_now(), bytes(Z80.regs),
+                   hashlib.md5(Z80.memory.mem).hexdigest()))
+    if n == FRAMES:
+        raise Done()
+
+
+def run(loop):
+    global states
+    states = []
+    Z80.Z80(3.5)
+    Z80.memory.mem[:] = bytes(len(Z80.memory.mem))
+    Z80.memory.mem[0x8000:0x8000 + len(PROGRAM)] = PROGRAM
+    Z80.reset()
+    Z80.regw[Z80.PC] = 0x8000
+    Z80.regw[Z80.SP] = 0xff00
+    Z80.video_update_time = 0
+    Z80.frontend = frame
+    Z80.breakpoints = {0x0038}  # never reached, interrupts are off
+    Z80.run_loop = loop
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            Z80.execute()
+    except Done:
+        pass
+    finally:
+        Z80.run_loop = Z80.run_fast
+    return states
+
+
+if __name__ == '__main__':
+    expected = run(Z80.run_fast)
+    failures = 0
+    for loop in (Z80.run_traced, Z80.run_breakpoints):
+        for want, got in zip(expected, run(loop)):
+            if want != got:
+                failures += 1
+                print(f'{loop.__name__} differs from run_fast at frame {want[0]}: '
+                      f'T-states {got[1]} instead of {want[1]}')
+                break
+    print('FAILED: %d loops differ' % failures if failures else 'OK')
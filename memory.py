@@ -1,48 +1,103 @@
 # -*- coding: utf-8 -*-
-from typing import Union
-import struct
 
 # ** Memory
 mem = memoryview(bytearray(65536))
 
 mem_rw = [False, True, True, True]
-
-# Word access
-wstruct = struct.Struct('<H')
+# ROM pages sit below RAM as on the 48K, every address from ram_start up
+# is writable and the write fast path is a single compare
+ram_start = mem_rw.index(True) * 0x4000
+
+# Word access through 16-bit views of the same buffer, one starting at an
+# even and one at an odd address, indexed by addr >> 1. Host byte order,
+# little endian like the Z80 on anything we run on
+words = (mem.cast('H'), mem[1:65535].cast('H'))
 # Signed byte access
-signedbyte = struct.Struct('<b')
+smem = mem.cast('b')
+
+# ** Display file dirty tracking
+# Changed character cells (row * 32 + column), cleared by the renderer
+SCREEN_END = 0x5b00
+dirty = bytearray(b'\1' * 768)
+# Cell of every display file address, bitmap and attributes
+cellmap = [0] * 0x4000 + \
+    [(((a >> 8) & 0x18) | ((a >> 5) & 7)) * 32 + (a & 31) for a in range(6144)] + \
+    list(range(768))
+
+
+def screen_changed():
+    ''' Mark the whole screen dirty, for writes that bypass pokeb '''
+    dirty[:] = b'\1' * 768
 
 
 def pokew(addr: int, word):
-    global mem
-
-    if addr % 0x4000 == 0x3fff:
-        if mem_rw[addr//0x4000]:
-            mem[addr] = word % 256
-        addr = (addr + 1) % 65536
-        if mem_rw[addr//0x4000]:
-            mem[addr] = word >> 8
+    if SCREEN_END <= addr < 65535:
+        words[addr & 1][addr >> 1] = word
     else:
-        if mem_rw[addr//0x4000]:
-            wstruct.pack_into(mem, addr, word)
+        # Screen, ROM, or the word wraps round to address 0
+        pokeb(addr, word % 256)
+        pokeb((addr + 1) % 65536, word >> 8)
 
 
 def peekw(addr: int) -> int:
-    global mem
-
     if addr == 65535:
-        return (mem[65535] | (mem[0] << 8)) % 65536
-
-    return wstruct.unpack_from(mem, addr)[0]
+        return mem[65535] | (mem[0] << 8)
+    return words[addr & 1][addr >> 1]
 
 
 def pokeb(addr: int, byte):
-    try:
-        if mem_rw[addr//0x4000]:
-            mem[addr] = byte
-    except Exception as error:
-        print(addr, byte, type(addr), type(byte))
-        raise error
+    if addr >= ram_start:
+        if addr < SCREEN_END and mem[addr] != byte:
+            dirty[cellmap[addr]] = 1
+        mem[addr] = byte
+
+
+def block_copy(dst: int, src: int, count: int, step=1):
+    '''
+    Copy count bytes one at a time from src to dst, both counting up
+    (step 1, LDIR) or down (step -1, LDDR). Overlapping ranges repeat the
+    bytes the writes run ahead of, as on the Z80
+    '''
+    low_dst, low_src = (dst, src) if step > 0 else (dst - count + 1, src - count + 1)
+    if low_dst < ram_start or min(low_dst, low_src) < 0 or max(low_dst, low_src) + count > 65536:
+        # Writes to ROM, or a range wraps round
+        for _ in range(count):
+            pokeb(dst, mem[src])
+            dst = (dst + step) % 65536
+            src = (src + step) % 65536
+        return
+    ahead = (dst - src) * step
+    if 0 < ahead < count:
+        if step > 0:
+            data = (bytes(mem[src:dst]) * (count // ahead + 1))[:count]
+        else:
+            data = (bytes(mem[dst+1:src+1]) * (count // ahead + 1))[-count:]
+    else:
+        data = bytes(mem[low_src:low_src+count])
+    if low_dst < SCREEN_END:
+        for cell in set(cellmap[low_dst:min(low_dst+count, SCREEN_END)]):
+            dirty[cell] = 1
+    mem[low_dst:low_dst+count] = data
+
+
+def find(byte: int, start: int, count: int, step=1) -> int:
+    '''
+    How many bytes past start the first of count bytes equal to byte is,
+    scanning up (step 1, CPIR) or down (step -1, CPDR) and wrapping round,
+    -1 if there is none
+    '''
+    ram = mem.obj
+    if step > 0:
+        found = ram.find(byte, start, min(start + count, 65536))
+        if found < 0 and start + count > 65536:
+            found = ram.find(byte, 0, start + count - 65536)
+            return found + 65536 - start if found >= 0 else -1
+        return found - start if found >= 0 else -1
+    found = ram.rfind(byte, max(start - count + 1, 0), start + 1)
+    if found < 0 and start - count + 1 < 0:
+        found = ram.rfind(byte, start - count + 1 + 65536, 65536)
+        return start + 65536 - found if found >= 0 else -1
+    return start - found if found >= 0 else -1
 
 
 def peekb(addr: int) -> int:
@@ -50,8 +105,54 @@ def peekb(addr: int) -> int:
 
 
 def peeksb(addr: int) -> int:
-    return signedbyte.unpack_from(mem, addr)[0]
+    return smem[addr]
+
 
 if __name__ == '__main__':
-    pokeb(100000, 111)
-    print('DONE')
+    import timeit
+
+    pokeb(0x1000, 0x55)
+    pokew(0x3fff, 0x1234)
+    pokew(0xffff, 0x5678)
+    pokew(0x8001, 0xabcd)
+    assert mem[0x1000] == 0 and mem[0x3fff] == 0 and mem[0x4000] == 0x12
+    assert mem[0xffff] == 0x78 and mem[0] == 0
+    assert peekw(0x8001) == 0xabcd and peekw(0xffff) == 0x78 and peekw(0x3fff) == 0x1200
+    assert peeksb(0x8001) == -0x33 and peeksb(0x8002) == -0x55
+    dirty[:] = bytes(768)
+    pokeb(0x4000 + 0x0721, 1)  # last line of character row 1, column 1
+    pokew(0x5800 + 0x2ff, 0x0101)  # last attribute, wraps off the screen
+    assert [i for i, d in enumerate(dirty) if d] == [1 * 32 + 1, 767]
+
+    # Block copies against byte by byte copies, overlapping both ways
+    def slow_copy(dst, src, count, step):
+        for _ in range(count):
+            pokeb(dst, mem[src])
+            dst = (dst + step) % 65536
+            src = (src + step) % 65536
+
+    for dst, src, count, step in ((0x8001, 0x8000, 300, 1), (0x8005, 0x8000, 300, 1), (0x8000, 0x8003, 300, 1),
+                                  (0x9000, 0x9001, 300, -1), (0x9000, 0x9007, 300, -1), (0x9005, 0x9000, 300, -1),
+                                  (0x3ff0, 0x8000, 40, 1), (0xfff0, 0x8000, 40, 1), (0x4010, 0x0000, 40, -1)):
+        results = []
+        for copy in (block_copy, slow_copy):
+            mem[0x4000:] = bytes(i * 7 % 251 for i in range(0xc000))
+            copy(dst, src, count, step)
+            results.append(bytes(mem))
+        assert results[0] == results[1], (hex(dst), hex(src), step)
+
+    # Searches against a byte by byte scan, wrapping round both ways
+    mem[:] = bytes(i * 7 % 251 for i in range(65536))
+    for byte, start, count, step in ((mem[0x8010], 0x8000, 100, 1), (mem[0x8010], 0x8000, 16, 1), (mem[5], 0xfff0, 100, 1),
+                                     (mem[0x7ff0], 0x8000, 100, -1), (mem[0x7ff0], 0x8000, 16, -1), (mem[0xfffa], 0x10, 100, -1)):
+        expected = next((i for i in range(count) if mem[(start + i * step) % 65536] == byte), -1)
+        assert find(byte, start, count, step) == expected, (hex(start), step)
+
+    # Throughput micro-suite
+    N = 100000
+    for stmt in ('peekb(0x8000)', 'peeksb(0x8000)', 'peekw(0x8000)', 'peekw(0x8001)',
+                 'pokeb(0x8000, 0x55)', 'pokeb(0x1000, 0x55)', 'pokeb(0x4000, 0x55)',
+                 'pokew(0x8000, 0x1234)', 'pokew(0x8001, 0x1234)', 'pokew(0x3fff, 0x1234)',
+                 'block_copy(0x9000, 0x8000, 256)', 'block_copy(0x8001, 0x8000, 256)'):
+        t = min(timeit.repeat(stmt, globals=globals(), number=N, repeat=7))
+        print(f'{stmt:24s} {N / t / 1e6:6.2f} M/s')
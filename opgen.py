@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+
+'''
+Opcode handler generator for the Z80 core
+
+The regular families of the opcode map, 8-bit LD, ALU A,s, INC/DEC s, the
+CB page and their DD/FD (IX/IY) and DDCB/FDCB forms, are described below
+as data: mnemonic, operand, result, carry out, F byte and T-states, and
+the few other IX/IY opcodes as short templates. generate() turns the spec
+into Python source with one specialised function per opcode, the ALU
+helper bodies inlined, operands read straight from the register file or
+the memory buffer, and F taken from the flag tables.
+
+The DD and FD pages are generated once for IX and once for IY, with the
+index register fixed in every handler, into the opcode dicts _ixops and
+_iyops. Everything else keeps the names the opcode tables in Z80.py refer
+to. The code runs in Z80's namespace.
+
+The source is cached in __pycache__ under a digest of this file, so it is
+only generated again after the spec changes, and tracebacks and profiles
+point at a real file. Compiling it takes longer than generating it, so the
+code object is cached beside it, per Python version like a .pyc.
+
+python3 opgen.py prints the generated source.
+'''
+
+import os
+import re
+import glob
+import sys
+import marshal
+import hashlib
+
+
+# ** Spec
+# Operand kinds, also the index into the T-state tuples below: register,
+# (HL), half of IX/IY, (IX+d)/(IY+d)
+REG, HL, HALF, INDEXED = range(4)
+
+# 8-bit operands in opcode order: name, register offset and kind. Memory
+# operands take their name from the address (fromhl, inhl, tohl...)
+OPERANDS = (('b', 'B', REG), ('c', 'C', REG), ('d', 'D', REG), ('e', 'E', REG),
+            ('h', 'H', REG), ('l', 'L', REG), ('hl', None, HL), ('a', 'A', REG))
+
+
+def index_operands(name):
+    ''' Operands on the DD/FD page of an index register: H, L and (HL) become IXH, IXL and (IX+d) '''
+    reg = name.upper()
+    return OPERANDS[:4] + ((name + 'h', reg + 'H', HALF), (name + 'l', reg + 'L', HALF), (name + 'd', reg, INDEXED)) + OPERANDS[7:]
+
+
+# Index registers: name and word offset
+INDEX = (('ix', 'IX'), ('iy', 'IY'))
+
+# LD s,s' at 0x40, and LD s,n at 0x06. On the DD/FD pages LD r,(IX+d) and
+# LD (IX+d),r move the real H and L
+LD_TSTATES = (4, 7, 8, 19)
+LDN_TSTATES = (7, 10, 11, 19)
+
+# ALU A,s at 0x80: mnemonic, result and F byte from A in a, the operand in
+# b and the carry in c. No result for CP
+ALU = (
+    ('add', '(a + b) % 256', 'addflags[(a << 8) | b]'),
+    ('adc', '(a + b + c) % 256', 'addflags[(c << 16) | (a << 8) | b]'),
+    ('sub', '(a - b) % 256', 'subflags[(a << 8) | b]'),
+    ('sbc', '(a - b - c) % 256', 'subflags[(c << 16) | (a << 8) | b]'),
+    ('and', 'a & b', 'sz53p[ans] | F_H'),
+    ('xor', 'a ^ b', 'sz53p[ans]'),
+    ('or', 'a | b', 'sz53p[ans]'),
+    ('cp', None, 'cpflags[(a << 8) | b]'),
+)
+ALU_TSTATES = (4, 7, 8, 19)
+
+# INC/DEC s at 0x04/0x05: mnemonic, result from v, F table (but C)
+INCDEC = (
+    ('inc', '(v + 1) % 256', 'incflags'),
+    ('dec', '(v - 1) % 256', 'decflags'),
+)
+INCDEC_TSTATES = (4, 11, 8, 23)
+
+# CB rotates and shifts: mnemonic, result and carry out from the operand
+# in v and the carry in c, F from sz53p. On the CB page A is _a, and C is
+# _c where the name would be another mnemonic's (rl c, rr c)
+SHIFTS = (
+    ('rlc', '((v << 1) | (v >> 7)) % 256', 'v >> 7'),
+    ('rrc', '(v >> 1) | ((v & 1) << 7)', 'v & 1'),
+    ('rl', '((v << 1) | c) % 256', 'v >> 7'),
+    ('rr', '(v >> 1) | (c << 7)', 'v & 1'),
+    ('sla', '(v << 1) % 256', 'v >> 7'),
+    ('sra', '(v >> 1) | (v & 0x80)', 'v & 1'),
+    ('sls', '((v << 1) | 1) % 256', 'v >> 7'),
+    ('srl', 'v >> 1', 'v & 1'),
+)
+SHIFT_TSTATES = (8, 15)
+
+# BIT/RES/SET n,s - RES and SET as mnemonic, operator and the mask for
+# bit 0, rotated left n places for bit n
+RES_SET = (('res', '&', 0xfe), ('set', '|', 0x01))
+BIT_TSTATES = (8, 12)
+RES_SET_TSTATES = (8, 15)
+
+# DDCB/FDCB page, shared by IX and IY: handlers get the (IX+d) address in
+# z from the prefix. Register forms also copy the result to the register
+INDEX_CB_TSTATES = 23
+INDEX_BIT_TSTATES = 20
+
+# Other DD/FD opcodes: opcode, name, T-states and body, {id} and {ID}
+# standing for the index register's name and word offset
+INDEX_OPS = (
+    (0x09, 'add{id}bc', 15, ('regw[{ID}] = add16(regw[{ID}], regw[BC])',)),
+    (0x19, 'add{id}de', 15, ('regw[{ID}] = add16(regw[{ID}], regw[DE])',)),
+    (0x29, 'add{id}{id}', 15, ('id = regw[{ID}]', 'regw[{ID}] = add16(id, id)')),
+    (0x39, 'add{id}sp', 15, ('regw[{ID}] = add16(regw[{ID}], regw[SP])',)),
+    (0x21, 'ld{id}nn', 14, ('regw[{ID}] = nxtpcw()',)),
+    (0x22, 'ldtonn{id}', 20, ('memory.pokew(nxtpcw(), regw[{ID}])',)),
+    (0x2a, 'ld{id}fromnn', 20, ('regw[{ID}] = memory.peekw(nxtpcw())',)),
+    (0x23, 'inc{id}', 10, ('regw[{ID}] = (regw[{ID}] + 1) % 65536',)),
+    (0x2b, 'dec{id}', 10, ('regw[{ID}] = (regw[{ID}] - 1) % 65536',)),
+    (0xe5, 'push{id}', 15, ('pushw(regw[{ID}])',)),
+    (0xe1, 'pop{id}', 14, ('regw[{ID}] = popw()',)),
+    (0xe9, 'jp{id}', 8, ('regw[PC] = regw[{ID}]',)),
+    (0xf9, 'ldsp{id}', 10, ('regw[SP] = regw[{ID}]',)),
+    (0xe3, 'exfromsp{id}', 23, ('t = regw[{ID}]', 'sp = regw[SP]', 'regw[{ID}] = memory.peekw(sp)', 'memory.pokew(sp, t)')),
+)
+
+
+# ** Generator
+def handler(name, lines, tstates, flags=(), args=''):
+    head = [f'def {name}({args}):']
+    if flags:
+        head.append('    global ' + ', '.join(flags))
+    return name, '\n'.join(head + ['    ' + line for line in lines] + [f'    return {tstates}'])
+
+
+def uses_carry(expr):
+    return expr is not None and re.search(r'\bc\b', expr) is not None
+
+
+def source(operand):
+    ''' Name of an operand read by an instruction '''
+    name, _, kind = operand
+    return name if kind in (REG, HALF) else 'from' + name
+
+
+def address(operand):
+    ''' Lines leaving the address of a memory operand in addr '''
+    name, reg, kind = operand
+    if kind == HL:
+        return ['addr = regw[HL]']
+    return [f'addr = (regw[{reg}] + nxtpcsb()) % 65536']
+
+
+def read(operand, var):
+    if operand[2] in (REG, HALF):
+        return [f'{var} = regs[{operand[1]}]']
+    return address(operand) + [f'{var} = memory.mem[addr]']
+
+
+def write(operand, var):
+    if operand[2] in (REG, HALF):
+        return [f'regs[{operand[1]}] = {var}']
+    return [f'memory.pokeb(addr, {var})']
+
+
+def ld_handlers(operands, indexed=False):
+    for d in range(8):
+        for s in range(8):
+            if d == s == 6:
+                continue  # HALT
+            dst, src = operands[d], operands[s]
+            if indexed:
+                if 6 in (d, s):
+                    # The register next to (IX+d) is the real one
+                    dst = dst if d == 6 else OPERANDS[d]
+                    src = src if s == 6 else OPERANDS[s]
+                elif not {d, s} & {4, 5}:
+                    continue
+            tstates = LD_TSTATES[max(dst[2], src[2])]
+            if dst[2] in (HL, INDEXED):
+                name = f'ldto{dst[0]}{src[0]}'
+                lines = address(dst) + [f'memory.pokeb(addr, regs[{src[1]}])']
+            elif src[2] in (HL, INDEXED):
+                name = f'ld{dst[0]}{source(src)}'
+                lines = address(src) + [f'regs[{dst[1]}] = memory.mem[addr]']
+            elif d == s:
+                name, lines = f'ld{dst[0]}{src[0]}', []
+            else:
+                name, lines = f'ld{dst[0]}{src[0]}', [f'regs[{dst[1]}] = regs[{src[1]}]']
+            yield 0x40 + d * 8 + s, handler(name, lines, tstates)
+    for d, dst in enumerate(operands):
+        if indexed and d not in (4, 5, 6):
+            continue
+        if dst[2] in (HL, INDEXED):
+            name = f'ldto{dst[0]}n'
+            lines = address(dst) + ['memory.pokeb(addr, nxtpcb())']
+        else:
+            name, lines = f'ld{dst[0]}n', [f'regs[{dst[1]}] = nxtpcb()']
+        yield 0x06 + d * 8, handler(name, lines, LDN_TSTATES[dst[2]])
+
+
+def alu_handlers(operands, indexed=False):
+    for n, (op, result, flags) in enumerate(ALU):
+        for s, src in enumerate(operands):
+            if indexed and s not in (4, 5, 6):
+                continue
+            lines = ['a = regs[A]'] + read(src, 'b')
+            if uses_carry(result) or uses_carry(flags):
+                lines.append('c = 1 if _fC else 0')
+            if result is not None:
+                lines.append(f'ans = {result}')
+            lines += [
+                f'f = {flags}',
+                '_fZ = f & F_Z',
+                '_fC = f & F_C',
+                '_lf = _lf_table',
+                '_lf_f = f',
+            ]
+            if result is not None:
+                lines.append('regs[A] = ans')
+            yield 0x80 + n * 8 + s, handler(f'{op}a{source(src)}', lines, ALU_TSTATES[src[2]], ('_fZ', '_fC', '_lf', '_lf_f'))
+
+
+def incdec_handlers(operands, indexed=False):
+    for n, (op, result, table) in enumerate(INCDEC):
+        for s, src in enumerate(operands):
+            if indexed and s not in (4, 5, 6):
+                continue
+            lines = read(src, 'v') + [
+                f'ans = {result}',
+                '_fZ = not ans',
+                '_lf = _lf_table',
+                f'_lf_f = {table}[ans]',
+            ] + write(src, 'ans')
+            name = f'{op}{src[0]}' if src[2] in (REG, HALF) else f'{op}in{src[0]}'
+            yield 0x04 + s * 8 + n, handler(name, lines, INCDEC_TSTATES[src[2]], ('_fZ', '_lf', '_lf_f'))
+
+
+def shift_lines(result, carry):
+    lines = []
+    if uses_carry(result):
+        lines.append('c = 1 if _fC else 0')
+    return lines + [
+        f'ans = {result}',
+        '_fZ = not ans',
+        f'_fC = {carry}',
+        '_lf = _lf_table',
+        '_lf_f = sz53p[ans]',
+    ]
+
+
+def bit_lines(mask):
+    return [
+        f'_fZ = not (v & {mask})',
+        '_lf = _lf_bit',
+        '_lf_a = v',
+        f'_lf_b = {mask}',
+    ]
+
+
+def masks():
+    ''' (opcode row, mnemonic, bit, operator, mask) for RES and SET '''
+    for row, (op, operator, bit0) in enumerate(RES_SET):
+        for n in range(8):
+            yield 0x80 + row * 0x40 + n * 8, op, n, operator, f'0x{(bit0 << n | bit0 >> (8 - n)) % 256:02x}'
+
+
+def cb_handlers():
+    mnemonics = {op for op, _, _ in SHIFTS}
+    for n, (op, result, carry) in enumerate(SHIFTS):
+        for s, src in enumerate(OPERANDS):
+            suffix = '_a' if src[1] == 'A' else source(src)
+            name = f'{op}_{suffix}' if op + suffix in mnemonics else op + suffix
+            lines = read(src, 'v') + shift_lines(result, carry) + write(src, 'ans')
+            yield n * 8 + s, handler(name, lines, SHIFT_TSTATES[src[2]], ('_fZ', '_fC', '_lf', '_lf_f'))
+    for n in range(8):
+        for s, src in enumerate(OPERANDS):
+            lines = read(src, 'v') + bit_lines(f'0x{1 << n:02x}')
+            yield 0x40 + n * 8 + s, handler(f'bit{n}{source(src)}', lines, BIT_TSTATES[src[2]], ('_fZ', '_lf', '_lf_a', '_lf_b'))
+    for row, op, n, operator, mask in masks():
+        for s, src in enumerate(OPERANDS):
+            if src[2] == HL:
+                lines = ['addr = regw[HL]', f'memory.pokeb(addr, memory.mem[addr] {operator} {mask})']
+            else:
+                lines = [f'regs[{src[1]}] {operator}= {mask}']
+            yield row + s, handler(f'{op}{n}{source(src)}', lines, RES_SET_TSTATES[src[2]])
+
+
+def index_cb_handlers():
+    ''' The DDCB/FDCB page, working on the address in z '''
+    def name(op, src):
+        return f'cb{op}{"inhl" if src[2] == HL else src[0]}'
+
+    for n, (op, result, carry) in enumerate(SHIFTS):
+        for s, src in enumerate(OPERANDS):
+            lines = ['v = memory.mem[z]'] + shift_lines(result, carry)
+            if src[2] == REG:
+                lines.append(f'regs[{src[1]}] = ans')
+            lines.append('memory.pokeb(z, ans)')
+            yield n * 8 + s, handler(name(op, src), lines, INDEX_CB_TSTATES, ('_fZ', '_fC', '_lf', '_lf_f'), 'z')
+    for n in range(8):
+        lines = ['v = memory.mem[z]'] + bit_lines(f'0x{1 << n:02x}')
+        yield 0x40 + n * 8, handler(f'cbbit{n}', lines, INDEX_BIT_TSTATES, ('_fZ', '_lf', '_lf_a', '_lf_b'), 'z')
+    for row, op, n, operator, mask in masks():
+        for s, src in enumerate(OPERANDS):
+            lines = [f'ans = memory.mem[z] {operator} {mask}']
+            if src[2] == REG:
+                lines.append(f'regs[{src[1]}] = ans')
+            lines.append('memory.pokeb(z, ans)')
+            yield row + s, handler(name(f'{op}{n}', src), lines, INDEX_CB_TSTATES, args='z')
+
+
+def index_handlers(name, reg):
+    ''' The DD or FD page for one index register '''
+    operands = index_operands(name)
+    for family in (ld_handlers, alu_handlers, incdec_handlers):
+        yield from family(operands, indexed=True)
+    for opcode, template, tstates, lines in INDEX_OPS:
+        yield opcode, handler(template.format(id=name), [line.format(ID=reg) for line in lines], tstates)
+    # DDCB/FDCB prefix: the displacement comes before the opcode
+    lines = [f'z = (regw[{reg}] + nxtpcsb()) % 65536', 'return _idcbcmds[nxtpcb()](z)']
+    yield 0xcb, (f'{name}cb', '\n'.join([f'def {name}cb():'] + ['    ' + line for line in lines]))
+
+
+def generate():
+    ''' Source of the handler module '''
+    parts = ['# Generated by opgen.py from its instruction spec, do not edit']
+    for family in (ld_handlers, alu_handlers, incdec_handlers):
+        parts.extend(code for _, (_, code) in family(OPERANDS))
+    for family in (cb_handlers, index_cb_handlers):
+        parts.extend(code for _, (_, code) in family())
+    for name, reg in INDEX:
+        ops = sorted(index_handlers(name, reg))
+        parts.extend(code for _, (_, code) in ops)
+        parts.append(f'_{name}ops = {{\n' + ''.join(f'    0x{op:02x}: {fn},\n' for op, (fn, _) in ops) + '}')
+    return '\n\n\n'.join(parts) + '\n'
+
+
+# ** Cache
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+
+def cache_path():
+    with open(os.path.abspath(__file__), 'rb') as spec:
+        digest = hashlib.sha1(spec.read()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f'z80ops.{digest}.py')
+
+
+def load():
+    ''' Compiled handler module, from the cache if the spec has not changed '''
+    path = cache_path()
+    compiled = f'{path[:-3]}.{sys.implementation.cache_tag}.bin'
+    try:
+        with open(compiled, 'rb') as cache:
+            return marshal.load(cache)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    try:
+        with open(path) as cache:
+            source = cache.read()
+    except OSError:
+        source = generate()
+    code = compile(source, path, 'exec')
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        if not os.path.exists(path):
+            with open(path, 'w') as cache:
+                cache.write(source)
+        with open(compiled, 'wb') as cache:
+            marshal.dump(code, cache)
+        # Caches of earlier specs are of no more use
+        for stale in glob.glob(os.path.join(CACHE_DIR, 'z80ops.*')):
+            if not stale.startswith(path[:-3] + '.'):
+                os.remove(stale)
+    except OSError:
+        pass
+    return code
+
+
+if __name__ == '__main__':
+    print(generate(), end='')
@@ -1,27 +1,27 @@
 # -*- coding: utf-8 -*-
-import keyboard
+
+# Keyboard matrix, one byte per half-row, a pressed key clears its bit.
+# Filled in by keyboard.py from the pygame events, which calls
+# keys_changed() after every change
+keyboard = [0xff] * 8
+# Kempston joystick
+joy = [0]
+# Port 0xfe answer for each high address byte: the AND of the half-rows
+# whose address line is low. Bit 6 is EAR, a tape input would clear it here
+keyboard_response = bytearray(b'\xff' * 256)
+
+
+def keys_changed():
+    ''' Build keyboard_response again from the matrix '''
+    # A line set in high leaves its half-row out, so each entry is the one
+    # with its lowest low line set, ANDed with that line's half-row
+    for high in range(254, -1, -1):
+        line = ~high & (high + 1)
+        keyboard_response[high] = keyboard_response[high | line] & keyboard[8 - line.bit_length()]
 
 
 def xInFE(port: int) -> int:
-    res = 0xff
-    k = keyboard.keyboard
-    if (port & 0x8000) == 0:
-        res &= k[0]  # _B_SPC
-    if (port & 0x4000) == 0:
-        res &= k[1]  # _H_ENT
-    if (port & 0x2000) == 0:
-        res &= k[2]  # _Y_P
-    if (port & 0x1000) == 0:
-        res &= k[3]  # _6_0
-    if (port & 0x0800) == 0:
-        res &= k[4]  # _1_5
-    if (port & 0x0400) == 0:
-        res &= k[5]  # _Q_T
-    if (port & 0x0200) == 0:
-        res &= k[6]  # _A_G
-    if (port & 0x0100) == 0:
-        res &= k[7]  # _CAPS_V
-    return res
+    return keyboard_response[port >> 8]
 
 
 def xOutFE(port: int, value: int):
@@ -54,7 +54,7 @@ def xInFFDF(port: int) -> int:
 
 
 def spIn1F(port: int) -> int:
-    return keyboard.joy[0]
+    return joy[0]
 
 
 def spInFF(port: int) -> int:
@@ -74,17 +74,61 @@ PORTMAP = [
 
 current_border = 0
 
+
+def no_out(port: int, value: int):
+    pass
+
+
+# ** Decoding
+# PORTMAP is compiled into one handler per port and direction, the first
+# entry matching a port wins as before. While every mask fits in the low
+# byte the tables only have 256 slots, indexed by port & 0xff
+_in_table = []
+_out_table = []
+_decode_mask = 0xff
+
+
+def decode(port: int):
+    ''' PORTMAP entry handling given port, None if there is none '''
+    for entry in PORTMAP:
+        mask, value = entry[0], entry[1]
+        if port & mask == value & mask:
+            return entry
+    return None
+
+
+def rebuild():
+    ''' Compile PORTMAP again, after changing it by hand '''
+    global _decode_mask
+    _decode_mask = 0xff if all(entry[0] <= 0xff for entry in PORTMAP) else 0xffff
+    entries = [decode(port) for port in range(_decode_mask + 1)]
+    _in_table[:] = [(entry[5] or spInFF) if entry else spInFF for entry in entries]
+    _out_table[:] = [(entry[6] or no_out) if entry else no_out for entry in entries]
+
+
+def register(mask: int, value: int, fin=None, fout=None):
+    '''
+    Add a device answering the ports where port & mask == value & mask,
+    ahead of the catch-all entries. Returns its entry for unregister()
+    '''
+    entry = (mask, value, 2, 2, 2, fin, fout)
+    index = next((i for i, e in enumerate(PORTMAP) if not e[0]), len(PORTMAP))
+    PORTMAP.insert(index, entry)
+    rebuild()
+    return entry
+
+
+def unregister(entry):
+    PORTMAP.remove(entry)
+    rebuild()
+
+
 def port_in(portnum: int) -> int:
-    #print('port: ', portnum, type(portnum))
-    for mask, value, _, _, _, fin, _ in PORTMAP:
-        if portnum & mask == value & mask:
-            return fin(portnum) if fin else 0xff
-    return 0xff
+    return _in_table[portnum & _decode_mask](portnum)
 
 
 def port_out(portnum: int, data: int):
-    for mask, value, _, _, _, _, fout in PORTMAP:
-        if portnum & mask == value & mask:
-            if fout:
-                fout(portnum, data)
-            break
+    _out_table[portnum & _decode_mask](portnum, data)
+
+
+rebuild()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+'''
+Opcode profiler
+
+Counts how often each opcode handler runs, per prefix, and times one call
+in every SAMPLE of each handler with perf_counter_ns; the time spent in a
+handler is estimated from its samples. Nothing is hooked until enable()
+puts a counting wrapper into every slot of the opcode tables, disable()
+puts the handlers back, so a run without the profiler pays nothing for it.
+
+The prefix handlers (CB, ED, DD, FD and DD CB/FD CB) are not wrapped, the
+opcodes they dispatch to are counted instead, so a prefixed instruction
+counts once, under its prefix. Time spent fetching the prefix is not
+attributed to anything.
+
+Usage: call profiler.enable() before Z80.execute() starts (it keeps the
+main table in a local), report() for the sorted table as text, dump() to
+write it as JSON. The block cache bakes handlers into its blocks and
+judges them by their code, so profile with the interpreter.
+'''
+
+import functools
+import json
+import time
+import Z80
+
+
+SAMPLE = 16  # time one call in this many
+
+# Prefix shown in the report, opcode table
+TABLES = (('', 'main_cmds'), ('CB', '_cbcmds'), ('ED', '_edcmds'),
+          ('DD', '_ixcmds'), ('FD', '_iycmds'), ('DDCB/FDCB', '_idcbcmds'))
+
+# (prefix, opcode, handler name): [calls, timed calls, timed ns]
+stats = {}
+_handlers = []
+_overhead = 0  # ns a timed call adds to what it measures
+
+
+def profiled(stat, handler):
+    ''' Handler counting its calls in stat, timing one in SAMPLE '''
+    @functools.wraps(handler)
+    def run(*args):
+        n = stat[0]
+        stat[0] = n + 1
+        if n % SAMPLE:
+            return handler(*args)
+        start = time.perf_counter_ns()
+        t = handler(*args)
+        stat[2] += time.perf_counter_ns() - start
+        stat[1] += 1
+        return t
+    return run
+
+
+def timer_overhead():
+    ''' Least ns measured around nothing with perf_counter_ns '''
+    least = None
+    for _ in range(1000):
+        start = time.perf_counter_ns()
+        ns = time.perf_counter_ns() - start
+        least = ns if least is None else min(least, ns)
+    return least
+
+
+def enable():
+    global _overhead
+    if _handlers:
+        return
+    _overhead = timer_overhead()
+    prefixes = {Z80.cb, Z80.ed, Z80.ix, Z80.iy, Z80.ixcb, Z80.iycb}
+    for prefix, name in TABLES:
+        table = getattr(Z80, name)
+        for op, handler in enumerate(table):
+            if handler in prefixes:
+                continue
+            stat = stats.setdefault((prefix, op, handler.__name__), [0, 0, 0])
+            _handlers.append((table, op, handler))
+            table[op] = profiled(stat, handler)
+
+
+def disable():
+    for table, op, handler in _handlers:
+        table[op] = handler
+    _handlers.clear()
+
+
+def reset():
+    ''' Start counting again, the wrappers keep their stats lists '''
+    for stat in stats.values():
+        stat[:] = 0, 0, 0
+
+
+def results():
+    ''' One dict per handler run, most time first '''
+    found = []
+    for (prefix, op, name), (calls, timed, ns) in stats.items():
+        if not calls:
+            continue
+        per_call = max(ns / timed - _overhead, 0) if timed else 0
+        found.append({
+            'prefix': prefix,
+            'opcode': op,
+            'handler': name,
+            'calls': calls,
+            'timed_calls': timed,
+            'ns_per_call': round(per_call, 1),
+            'estimated_ms': round(per_call * calls / 1e6, 3),
+        })
+    found.sort(key=lambda r: (-r['estimated_ms'], -r['calls']))
+    return found
+
+
+def report(top=40):
+    ''' The top handlers by estimated time as a text table '''
+    found = results()
+    calls = sum(r['calls'] for r in found) or 1
+    ms = sum(r['estimated_ms'] for r in found) or 1
+    lines = [f'{calls} instructions, {ms:.1f} ms estimated in handlers, 1 call in {SAMPLE} timed',
+             f'{"opcode":14s} {"handler":14s} {"calls":>10s} {"calls%":>7s} {"ns/call":>8s} {"ms":>9s} {"time%":>6s}']
+    for r in found[:top]:
+        opcode = f'{r["prefix"]} {r["opcode"]:02X}'.strip()
+        lines.append(f'{opcode:14s} {r["handler"]:14s} {r["calls"]:10d} {r["calls"] / calls * 100:6.2f}% '
+                     f'{r["ns_per_call"]:8.0f} {r["estimated_ms"]:9.1f} {r["estimated_ms"] / ms * 100:5.1f}%')
+    return '\n'.join(lines)
+
+
+def dump(filename):
+    ''' Write every handler run as JSON '''
+    with open(filename, 'w') as output:
+        json.dump({'sample': SAMPLE, 'handlers': results()}, output, indent=2)
+        output.write('\n')
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# ZX Spectrum display file decoding, no pygame needed
+import Z80
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SCREEN_WIDTH = 256
+SCREEN_HEIGHT = 192
+FULL_SCREEN_WIDTH = 384
+FULL_SCREEN_HEIGHT = 256
+BORDER_LEFT = 64
+BORDER_TOP = 32
+
+COLOR_ON_NORMAL = 205
+COLOR_ON_BRIGHT = 255
+COLORS = [
+    (0, 0, 0),                                            # Black Bright Off
+    (0, 0, COLOR_ON_NORMAL),                              # Blue Bright Off
+    (COLOR_ON_NORMAL, 0, 0),                              # Red Bright Off
+    (COLOR_ON_NORMAL, 0, COLOR_ON_NORMAL),                # Magenta Bright Off
+    (0, COLOR_ON_NORMAL, 0),                              # Green Bright Off
+    (0, COLOR_ON_NORMAL, COLOR_ON_NORMAL),                # Cyan Bright Off
+    (COLOR_ON_NORMAL, COLOR_ON_NORMAL, 0),                # Yellow Bright Off
+    (COLOR_ON_NORMAL, COLOR_ON_NORMAL, COLOR_ON_NORMAL),  # White Bright Off
+
+    (0, 0, 0),                                            # Black Bright On
+    (0, 0, COLOR_ON_BRIGHT),                              # Blue Bright On
+    (COLOR_ON_BRIGHT, 0, 0),                              # Red Bright On
+    (COLOR_ON_BRIGHT, 0, COLOR_ON_BRIGHT),                # Magenta Bright On
+    (0, COLOR_ON_BRIGHT, 0),                              # Green Bright On
+    (0, COLOR_ON_BRIGHT, COLOR_ON_BRIGHT),                # Cyan Bright On
+    (COLOR_ON_BRIGHT, COLOR_ON_BRIGHT, 0),                # Yellow Bright On
+    (COLOR_ON_BRIGHT, COLOR_ON_BRIGHT, COLOR_ON_BRIGHT)   # White Bright On
+]
+
+# Инициализация таблицы адресов пиксельных и аттрибутных линий
+addr_pix = [(((line // 64) * 2048) + ((line % 8) * 256) + ((line & 56) * 4)) for line in range(192)]
+addr_attr = [(6144 + ((line // 8) * 32)) for line in range(192)]
+zxrowmap = [((coord_y & 0b111) << 3) + ((coord_y & 0b111000) >> 3) + (coord_y & 0b11000000) for coord_y in range(192)]
+colormap = [((attr % 8) + (8 if attr & 64 else 0), (attr & 0b1111000) >> 3) for attr in range(256)]
+# FLASH attributes with ink and paper swapped, used every other 16 frames
+flashmap = [((attr & 0xc0) | ((attr & 7) << 3) | ((attr >> 3) & 7)) if attr & 0x80 else attr for attr in range(256)]
+attrmap = list(range(256))
+flash = 0
+
+
+pixelmap = bytearray(256*256*8)
+pixelmap_m = memoryview(pixelmap)
+STRIDE = 256*8
+pixelmap_ready = False
+
+def init_pixelmap():
+    global pixelmap_ready
+    for i in range(256):
+        color_ink, color_paper = colormap[i]
+        pixellist = pixelmap_m[i*STRIDE : i*STRIDE+STRIDE]
+        for pix in range(256):
+            pixels = pixellist[pix*8 : pix*8+8]
+            for bit in range(8):
+                pixels[7-bit] = color_ink if (pix & (1 << bit)) else color_paper
+    pixelmap_ready = True
+
+
+# 256x192 image of palette indexes
+buffer = bytearray(SCREEN_WIDTH*SCREEN_HEIGHT)
+buffer_m = memoryview(buffer)
+
+def fill_buffer_python(first=0, last=24, screen=None):
+    if not pixelmap_ready:
+        init_pixelmap()
+    zx_videoram = Z80.memory.mem[16384:16384+6912] if screen is None else screen
+    offs = first*8*SCREEN_WIDTH
+
+    for coord_y in range(first*8, last*8):
+        pix_addr = addr_pix[coord_y]
+        attr_addr = addr_attr[coord_y]
+
+        for i in range(0, 32):
+            poffs = attrmap[zx_videoram[attr_addr+i]]*STRIDE+zx_videoram[pix_addr+i]*8
+            buffer_m[offs : offs+8] = pixelmap_m[poffs : poffs+8]
+            offs += 8
+
+
+if numpy is not None:
+    # Display file row of every screen line
+    np_rowmap = numpy.array([addr // 32 for addr in addr_pix])
+    # Colour for (attr << 1) | pixel: paper at even, ink at odd indexes
+    np_colors = numpy.array([colormap[i >> 1][1 - (i & 1)] for i in range(512)], numpy.uint8)
+    np_colors_flash = np_colors[[(flashmap[i >> 1] << 1) | (i & 1) for i in range(512)]]
+    np_palette = np_colors
+    np_buffer = numpy.frombuffer(buffer, numpy.uint8).reshape(SCREEN_HEIGHT, SCREEN_WIDTH)
+
+
+def fill_buffer_numpy(first=0, last=24, screen=None):
+    lines = slice(first*8, last*8)
+    if screen is None:
+        videoram = numpy.frombuffer(Z80.memory.mem, numpy.uint8, 6912, 16384)
+    else:
+        videoram = numpy.frombuffer(screen, numpy.uint8, 6912)
+    pixels = numpy.unpackbits(videoram[:6144].reshape(SCREEN_HEIGHT, 32)[np_rowmap[lines]], axis=1)
+    attrs = videoram[6144:].reshape(24, 32)[first:last].repeat(8, axis=0).repeat(8, axis=1).astype(numpy.uint16)
+    numpy.take(np_palette, (attrs << 1) | pixels, out=np_buffer[lines])
+
+
+# Decode character rows first to last of the display file into buffer,
+# NumPy backed when available. screen is a 6912 byte copy of the display
+# file to decode instead of memory
+fill_buffer = fill_buffer_numpy if numpy is not None else fill_buffer_python
+
+
+def update_flash(frame=None, screen=None, dirty=None):
+    '''
+    Swap FLASH ink and paper every 16 frames, marking the cells dirty. By
+    default for the current frame, memory and its dirty cells
+    '''
+    global flash, attrmap, np_palette
+    phase = ((Z80.video_update_time if frame is None else frame) >> 4) & 1
+    if phase != flash:
+        flash = phase
+        attrmap = flashmap if phase else list(range(256))
+        if numpy is not None:
+            np_palette = np_colors_flash if phase else np_colors
+        dirty = Z80.memory.dirty if dirty is None else dirty
+        attrs = Z80.memory.mem[0x5800:0x5b00] if screen is None else screen[6144:]
+        for cell, attr in enumerate(attrs):
+            if attr & 0x80:
+                dirty[cell] = 1
+
+
+def fill_dirty(screen=None, dirty=None):
+    '''
+    Re-render the character rows holding dirty cells, returns the changed
+    (x, y, width, height) screen rectangles, one per character row. By
+    default from memory and its dirty cells
+    '''
+    dirty = Z80.memory.dirty if dirty is None else dirty
+    if dirty.find(1) < 0:
+        return []
+    rects = []
+    for row in range(24):
+        cells = dirty[row*32 : row*32+32]
+        left = cells.find(1)
+        if left >= 0:
+            right = cells.rfind(1)
+            rects.append((left*8, row*8, (right-left+1)*8, 8))
+    fill_buffer(rects[0][1] // 8, rects[-1][1] // 8 + 1, screen)
+    dirty[:] = bytes(768)
+    return rects
+
+
+def full_frame(border):
+    ''' Current screen with border as FULL_SCREEN_WIDTH x FULL_SCREEN_HEIGHT palette indexes '''
+    update_flash()
+    fill_buffer()
+    frame = bytearray([border]) * (FULL_SCREEN_WIDTH*FULL_SCREEN_HEIGHT)
+    for coord_y in range(SCREEN_HEIGHT):
+        offs = (BORDER_TOP + coord_y) * FULL_SCREEN_WIDTH + BORDER_LEFT
+        frame[offs : offs+SCREEN_WIDTH] = buffer_m[coord_y*SCREEN_WIDTH : (coord_y+1)*SCREEN_WIDTH]
+    return frame
+
+
+if __name__ == '__main__':
+    # Check the NumPy renderer against the Python one and time both
+    import sys
+    import time
+    import random
+    import load
+
+    Z80.Z80(3.5)
+    with open('48.rom', 'rb') as rom:
+        rom.readinto(Z80.memory.mem)
+    rnd = random.Random(7)
+    screens = {'random': bytes(rnd.randrange(256) for _ in range(6912))}
+    for name in sys.argv[1:] or ['games/Exolon.sna']:
+        load.load_sna(name)
+        screens[name] = bytes(Z80.memory.mem[16384:16384+6912])
+
+    init_pixelmap()
+    for frame in (0, 16):
+        Z80.video_update_time = frame
+        update_flash()
+        for name, screen in screens.items():
+            Z80.memory.mem[16384:16384+6912] = screen
+            fill_buffer_python()
+            expected = bytes(buffer)
+            buffer[:] = bytes(len(buffer))
+            fill_buffer_numpy()
+            print(name, 'FLASH' if flash else '', 'identical' if buffer == expected else 'MISMATCH')
+
+    for fill in (fill_buffer_python, fill_buffer_numpy):
+        best = 1e9
+        for _ in range(10):
+            start = time.perf_counter()
+            for _ in range(20):
+                fill()
+            best = min(best, (time.perf_counter() - start) / 20)
+        print(f'{fill.__name__}: {best * 1000:.3f} ms per frame')
@@ -14,9 +14,12 @@ Simple fixes Bedazzle 2020
 '''
 
 import sys
+import argparse
 import Z80
-import video
 import load
+import jit
+import idle
+import profiler
 
 
 ROMFILE = '48.rom'
@@ -31,22 +34,75 @@ def load_rom(romfilename):
     print('Loaded ROM: %s' % romfilename)
 
 
-def run():
-    ''' Start the execution '''
-    try:
-        Z80.execute()
-    except KeyboardInterrupt:
-        return
-
-
-video.init()
+def load_snapshot(filename):
+    ''' Load .z80 or .sna snapshot '''
+    if filename.lower().endswith('.z80'):
+        load.load_z80(filename)
+    else:
+        load.load_sna(filename)
+
+
+def run(compiled=False):
+    ''' Start the execution, compiled uses the basic-block cache '''
+    execute = jit.execute if compiled else Z80.execute
+    if args.idle:
+        idle.enable()
+    if args.profile:
+        profiler.enable()
+    if args.trace:
+        Z80.run_loop = Z80.run_traced
+    elif args.breakpoint:
+        Z80.breakpoints.update(args.breakpoint)
+        Z80.run_loop = Z80.run_breakpoints
+    if args.headless:
+        frames, elapsed = headless.run(args.frames, args.dump, args.dump_dir, execute)
+        print(f'{frames} frames in {elapsed:.2f} s, {frames / elapsed:.1f} FPS')
+    else:
+        try:
+            execute()
+        except KeyboardInterrupt:
+            pass
+    if args.profile:
+        print(profiler.report())
+        profiler.dump(args.profile)
+
+
+parser = argparse.ArgumentParser(description='ZX Spectrum emulator')
+parser.add_argument('snapshot', nargs='?', help='.sna or .z80 snapshot to run')
+parser.add_argument('--jit', action='store_true', help='use the basic-block cache')
+parser.add_argument('--idle', action='store_true', help='skip idle loops up to the next interrupt')
+parser.add_argument('--headless', action='store_true', help='run without window, keyboard and pygame')
+parser.add_argument('--frames', type=int, default=0, help='headless: stop after this many frames')
+parser.add_argument('--dump', type=int, default=0, metavar='N', help='headless: save a PNG every N frames')
+parser.add_argument('--dump-dir', default='frames', help='headless: directory for the PNG files')
+parser.add_argument('--input-thread', action='store_true', help='sort key events on a separate thread')
+parser.add_argument('--max-skip', type=int, default=4, metavar='N', help='skip drawing up to N frames in a row when behind')
+parser.add_argument('--render-thread', action='store_true', help='draw frames on a separate thread')
+parser.add_argument('--profile', metavar='FILE', help='count and time the opcode handlers, JSON report to FILE')
+parser.add_argument('--trace', action='store_true', help='show the registers before every instruction')
+parser.add_argument('--break', dest='breakpoint', type=lambda addr: int(addr, 16), action='append', default=[],
+                    metavar='ADDR', help='show the registers whenever PC reaches this hex address')
+args = parser.parse_args()
+if args.jit and (args.profile or args.trace or args.breakpoint):
+    parser.error('--profile, --trace and --break need the interpreter, drop --jit')
+
+if args.headless:
+    import headless
+else:
+    import video
+    video.init(args.input_thread, args.render_thread)
+    video.max_skip = args.max_skip
+    Z80.frontend = video.frame
 Z80.Z80(3.5)  # MhZ
 
 load_rom(ROMFILE)
 Z80.reset()
 Z80.ports.port_out(254, 0xff)  # white border on startup
 
-sys.setswitchinterval(255)  # we don't use threads, kind of speed up
+if args.input_thread or args.render_thread:
+    sys.setswitchinterval(0.005)  # let the other thread in at the default rate
+else:
+    sys.setswitchinterval(255)  # we don't use threads, kind of speed up
 
 
 SNADIR = '../Perfect_SNA/'
@@ -81,7 +137,10 @@ SNADIR = '../Perfect_SNA/'
 # load.load_sna(SNADIR + 'Saboteur 2.sna')
 # load.load_sna(SNADIR + 'Scuba Dive.sna')
 # load.load_sna(SNADIR + 'Three Weeks In Paradise.sna')
-load.load_sna(SNADIR + 'Mask_3_Venom_strikes_back.sna')
+if args.snapshot:
+    load_snapshot(args.snapshot)
+else:
+    load.load_sna(SNADIR + 'Mask_3_Venom_strikes_back.sna')
 # load.load_sna(SNADIR + 'Yogi Bear.sna')
 # load.load_sna(SNADIR + 'Zynaps.sna')
 
@@ -96,4 +155,4 @@ load.load_sna(SNADIR + 'Mask_3_Venom_strikes_back.sna')
 # load.load_sna(SNADIR + 'bt_city.sna')
 # load.load_sna(SNADIR + 'bt.sna')
 # load.load_sna(SNADIR + 'z80full_with_pause.SNA')
-run()
+run(args.jit)
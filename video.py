@@ -1,67 +1,28 @@
+import math
+import time
+import threading
 import pygame
 import Z80
+import keyboard
+import render
+from render import SCREEN_WIDTH, SCREEN_HEIGHT, FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT, COLORS
 
 __show_fps__ = True
 
-SCREEN_WIDTH = 256
-SCREEN_HEIGHT = 192
-FULL_SCREEN_WIDTH = 384
-FULL_SCREEN_HEIGHT = 256
 CAPTION = 'PyZX'
 
-COLOR_ON_NORMAL = 205
-COLOR_ON_BRIGHT = 255
-COLORS = [
-    (0, 0, 0),                                            # Black Bright Off
-    (0, 0, COLOR_ON_NORMAL),                              # Blue Bright Off
-    (COLOR_ON_NORMAL, 0, 0),                              # Red Bright Off
-    (COLOR_ON_NORMAL, 0, COLOR_ON_NORMAL),                # Magenta Bright Off
-    (0, COLOR_ON_NORMAL, 0),                              # Green Bright Off
-    (0, COLOR_ON_NORMAL, COLOR_ON_NORMAL),                # Cyan Bright Off
-    (COLOR_ON_NORMAL, COLOR_ON_NORMAL, 0),                # Yellow Bright Off
-    (COLOR_ON_NORMAL, COLOR_ON_NORMAL, COLOR_ON_NORMAL),  # White Bright Off
-
-    (0, 0, 0),                                            # Black Bright On
-    (0, 0, COLOR_ON_BRIGHT),                              # Blue Bright On
-    (COLOR_ON_BRIGHT, 0, 0),                              # Red Bright On
-    (COLOR_ON_BRIGHT, 0, COLOR_ON_BRIGHT),                # Magenta Bright On
-    (0, COLOR_ON_BRIGHT, 0),                              # Green Bright On
-    (0, COLOR_ON_BRIGHT, COLOR_ON_BRIGHT),                # Cyan Bright On
-    (COLOR_ON_BRIGHT, COLOR_ON_BRIGHT, 0),                # Yellow Bright On
-    (COLOR_ON_BRIGHT, COLOR_ON_BRIGHT, COLOR_ON_BRIGHT)   # White Bright On
-]
-
-# Инициализация таблицы адресов пиксельных и аттрибутных линий
-addr_pix = [(((line // 64) * 2048) + ((line % 8) * 256) + ((line & 56) * 4)) for line in range(192)]
-addr_attr = [(6144 + ((line // 8) * 32)) for line in range(192)]
-zxrowmap = [((coord_y & 0b111) << 3) + ((coord_y & 0b111000) >> 3) + (coord_y & 0b11000000) for coord_y in range(192)]
-colormap = [((attr % 8) + (8 if attr & 64 else 0), (attr & 0b1111000) >> 3) for attr in range(256)]
-
-
-pixelmap = bytearray(256*256*8)
-pixelmap_m = memoryview(pixelmap)
-STRIDE = 256*8
-
-def init_pixelmap():
-    for i in range(256):
-        color_ink, color_paper = colormap[i]
-        pixellist = pixelmap_m[i*STRIDE : i*STRIDE+STRIDE]
-        for pix in range(256):
-            pixels = pixellist[pix*8 : pix*8+8]
-            for bit in range(8):
-                pixels[7-bit] = color_ink if (pix & (1 << bit)) else color_paper
-
 
 zx_screen = None
 zx_screen_with_border = None
 screen = None
 ratio = 2
 
-def init():
-    global screen, zx_screen, zx_screen_with_border
+def init(threaded_input=False, threaded_render=False):
+    global screen, zx_screen, zx_screen_with_border, _rendering
 
-    init_pixelmap()
     pygame.init()
+    keyboard.init(threaded_input)
+    keyboard.exposed = repaint
     icon = pygame.image.load('icon.png')
     zx_screen = pygame.surface.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.HWSURFACE, 8)
     zx_screen.set_palette(COLORS)
@@ -72,44 +33,204 @@ def init():
     pygame.display.set_caption(CAPTION)
     pygame.display.set_icon(icon)
     pygame.display.flip()
-
-    return
+    if threaded_render:
+        _rendering = True
+        threading.Thread(target=render_frames, name='render', daemon=True).start()
 
 
 clock = pygame.time.Clock()
-old_border = -1
-
-def update():
-    global __show_fps__, clock, old_border
-
-    if __show_fps__:
-        clock.tick()
-        pygame.display.set_caption(f'{CAPTION} - {clock.get_fps():.2f} FPS')
+old_border = -1  # border of the last decoded frame
+_repaint = False
 
-    if Z80.ports.current_border != old_border:
-        zx_screen_with_border.fill(Z80.ports.current_border)
-        old_border = Z80.ports.current_border
 
-    fill_screen_map()
-    zx_screen_with_border.blit(zx_screen, (64, 32))
-    pygame.transform.scale(zx_screen_with_border, (FULL_SCREEN_WIDTH*ratio, FULL_SCREEN_HEIGHT*ratio), screen)
-    pygame.display.flip()
-
-buffer = bytearray(SCREEN_WIDTH*SCREEN_HEIGHT)
-buffer_m = memoryview(buffer)
-
-def fill_screen_map():
-    zx_videoram = Z80.memory.mem[16384:16384+6912]
-    offs = 0
-
-    for coord_y in range(SCREEN_HEIGHT):
-        pix_addr = addr_pix[coord_y]
-        attr_addr = addr_attr[coord_y]
+def repaint():
+    ''' Draw the whole window with the next frame, after it was exposed '''
+    global _repaint
+    _repaint = True
 
-        for i in range(0, 32):
-            poffs = zx_videoram[attr_addr+i]*STRIDE+zx_videoram[pix_addr+i]*8
-            buffer_m[offs : offs+8] = pixelmap_m[poffs : poffs+8]
-            offs += 8
 
-    buf = zx_screen.get_buffer()
-    buf.write(buffer_m.tobytes())
+def update():
+    ''' Draw the frame in memory '''
+    present(*decode(Z80.video_update_time, Z80.memory.mem[16384:16384+6912], Z80.ports.current_border, Z80.memory.dirty))
+
+
+def decode(n, videoram, border, dirty):
+    '''
+    Decode frame n from a copy of the display file, clearing dirty. Returns
+    the changed rectangles, None when the border changed too, the border and
+    the decoded screen. No pygame calls, so it can run on the render thread
+    '''
+    global old_border
+    render.update_flash(n, videoram, dirty)
+    full = border != old_border
+    if full:
+        old_border = border
+        dirty[:] = b'\1' * 768
+    rects = render.fill_dirty(videoram, dirty)
+    return None if full else rects, border, render.buffer_m.tobytes()
+
+
+def present(rects, border, pixels):
+    ''' Show a decoded screen, the whole window when rects is None '''
+    global __show_fps__, clock, _repaint, _shown
+
+    _shown += 1
+    if __show_fps__:
+        clock.tick()
+        pygame.display.set_caption(f'{CAPTION} - {clock.get_fps():.2f} FPS, 1 in {shown_every:.1f} drawn, {speed:.0f}% speed')
+
+    if rects is None or _repaint:
+        _repaint = False
+        zx_screen.get_buffer().write(pixels)
+        zx_screen_with_border.fill(border)
+        zx_screen_with_border.blit(zx_screen, (render.BORDER_LEFT, render.BORDER_TOP))
+        pygame.transform.scale(zx_screen_with_border, (FULL_SCREEN_WIDTH*ratio, FULL_SCREEN_HEIGHT*ratio), screen)
+        pygame.display.flip()
+        return
+    if not rects:
+        return
+
+    # Only the changed character rows are blitted, scaled and sent out
+    zx_screen.get_buffer().write(pixels)
+    updated = []
+    for x, y, w, h in rects:
+        zx_screen_with_border.blit(zx_screen, (render.BORDER_LEFT+x, render.BORDER_TOP+y), (x, y, w, h))
+        rect = pygame.Rect((render.BORDER_LEFT+x)*ratio, (render.BORDER_TOP+y)*ratio, w*ratio, h*ratio)
+        pygame.transform.scale(zx_screen_with_border.subsurface((render.BORDER_LEFT+x, render.BORDER_TOP+y, w, h)),
+                               rect.size, screen.subsurface(rect))
+        updated.append(rect)
+    pygame.display.update(updated)
+
+
+# ** Render thread
+# With init(threaded_render=True) the CPU only copies the display file,
+# border and dirty cells into _next at a frame boundary and carries on.
+# The render thread decodes them meanwhile, NumPy letting go of the GIL
+# for most of it, and leaves the result in _decoded; pygame is only ever
+# called from the main thread, which shows it at the next frame boundary.
+# A frame the thread has not picked up yet is replaced by the next one,
+# keeping its dirty cells, and a decoded frame not shown yet by the next
+# one, shown whole
+_next = None  # (frame, display file, border, dirty cells) waiting to be decoded
+_next_ready = threading.Condition()
+_decoded = None  # (rects, border, screen) waiting to be shown
+_rendering = False
+
+
+def hand_over(n):
+    global _next
+    dirty = Z80.memory.dirty
+    with _next_ready:
+        if _next is not None:
+            dirty = (int.from_bytes(dirty, 'little') | int.from_bytes(_next[3], 'little')).to_bytes(768, 'little')
+        _next = (n, bytes(Z80.memory.mem[16384:16384+6912]), Z80.ports.current_border, bytearray(dirty))
+        _next_ready.notify()
+    Z80.memory.dirty[:] = bytes(768)
+
+
+def render_frames():
+    global _next, _decoded, _decode_time
+    while True:
+        with _next_ready:
+            while _next is None:
+                _next_ready.wait()
+            job, _next = _next, None
+        start = time.perf_counter()
+        rects, border, pixels = decode(*job)
+        _decode_time += (time.perf_counter() - start - _decode_time) * SMOOTHING
+        with _next_ready:
+            if _decoded is not None:
+                rects = None
+            _decoded = rects, border, pixels
+
+
+def show_decoded():
+    ''' Show what the render thread decoded since the last frame boundary '''
+    global _decoded
+    with _next_ready:
+        decoded, _decoded = _decoded, None
+    if decoded is not None:
+        present(*decoded)
+
+
+# ** Frame skip and pacing
+# A frame lasts FRAME_TIME of real time. The host time spent emulating a
+# frame and drawing one are kept as moving averages, and one frame in
+# skip + 1 is drawn, skip the least that keeps the average frame within
+# FRAME_TIME, up to max_skip. With the render thread drawing is what the
+# main thread spends handing frames over and showing them, plus the
+# thread's decoding. When there is time left, frame() sleeps it off so
+# emulation keeps to real time
+FRAME_TIME = 1 / 50
+MAX_SKIP = 4
+SMOOTHING = 0.1  # weight of the latest frame in the averages
+max_skip = MAX_SKIP
+pace = True  # hold emulation to 50 frames a second
+skip = 0
+speed = 100.0  # emulated time in percent of real time
+shown_every = 1.0  # emulated frames per frame shown, over the last second
+_emulate_time = 0.0
+_draw_time = 0.0
+_decode_time = 0.0  # on the render thread
+_showing_time = 0.0  # showing decoded frames since the last one drawn
+_frame_time = FRAME_TIME
+_frame_start = None  # host time the last frame hook was called
+_hook_end = None  # and returned
+_deadline = None  # host time the current frame should end
+_countdown = 0
+_frames = 0
+_shown = 0
+
+
+def choose_skip():
+    spare = FRAME_TIME - _emulate_time
+    if spare <= 0:
+        return max_skip
+    return min(max_skip, max(0, math.ceil((_draw_time + _decode_time) / spare) - 1))
+
+
+def keep_pace(now):
+    ''' Sleep until the end of the frame in real time '''
+    global _deadline
+    _deadline = (now if _deadline is None else _deadline) + FRAME_TIME
+    if _deadline > now:
+        time.sleep(_deadline - now)
+    elif now - _deadline > FRAME_TIME:
+        _deadline = now  # too far behind to catch up
+
+
+def frame(n):
+    ''' Z80 frontend hook, called on every interrupt with the frame number '''
+    global skip, speed, shown_every, _emulate_time, _draw_time, _showing_time, _frame_time
+    global _frame_start, _hook_end, _countdown, _frames, _shown
+    now = time.perf_counter()
+    if _hook_end is not None:
+        _emulate_time += (now - _hook_end - _emulate_time) * SMOOTHING
+        _frame_time += (now - _frame_start - _frame_time) * SMOOTHING
+        speed = FRAME_TIME / _frame_time * 100
+    _frame_start = now
+    _frames += 1
+    if _frames == 50:
+        shown_every = _frames / max(_shown, 1)
+        _frames = _shown = 0
+
+    keyboard.do_keys()
+    if _rendering:
+        start = time.perf_counter()
+        show_decoded()
+        _showing_time += time.perf_counter() - start
+    if _countdown:
+        _countdown -= 1
+    else:
+        start = time.perf_counter()
+        if _rendering:
+            hand_over(n)
+        else:
+            update()
+        drawing = time.perf_counter() - start + _showing_time
+        _draw_time += (drawing - _draw_time) * SMOOTHING
+        _showing_time = 0.0
+        skip = _countdown = choose_skip()
+    if pace:
+        keep_pace(time.perf_counter())
+    _hook_end = time.perf_counter()